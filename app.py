@@ -1,9 +1,57 @@
 import re
-from flask import Flask, jsonify, render_template, request, Response
-from neo4j import GraphDatabase
+import click
+from flask import Flask, jsonify, render_template, request, Response, has_request_context, stream_template, \
+    stream_with_context
+from neo4j import GraphDatabase, READ_ACCESS, unit_of_work
+from neo4j.exceptions import ConstraintError, Neo4jError
 import json
+import csv
+import io
+import zlib
 from dotenv import load_dotenv
 import os
+import threading
+import time
+import hashlib
+import heapq
+import sqlite3
+import tempfile
+import mmap
+import struct
+from array import array
+from itertools import islice
+from bisect import bisect_left
+from collections import Counter, OrderedDict, deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+from werkzeug.http import http_date
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # Load environment variables from .env file
 load_dotenv()
@@ -15,8 +63,92 @@ app = Flask(__name__)
 NEO4J_URI = os.getenv("NEO4J_URI")
 NEO4J_USER = os.getenv("NEO4J_USER")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
+NEO4J_DATABASE = os.getenv("NEO4J_DATABASE") or None
 print(f"Connecting to Neo4j at {NEO4J_URI} with user {NEO4J_USER}")
-driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+
+def driver_config():
+    # Pool settings shared by the sync driver and the async one in asgi.py
+    config = {
+        "max_connection_pool_size": int(os.getenv("NEO4J_MAX_POOL_SIZE", "100")),
+        "connection_acquisition_timeout": float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "60")),
+        "connection_timeout": float(os.getenv("NEO4J_CONNECTION_TIMEOUT", "30")),
+        "max_connection_lifetime": float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", "3600")),
+        "max_transaction_retry_time": float(os.getenv("NEO4J_MAX_RETRY_TIME", "30")),
+    }
+    # Pooled connections idle for longer than this are pinged before being handed out
+    if os.getenv("NEO4J_LIVENESS_CHECK"):
+        config["liveness_check_timeout"] = float(os.getenv("NEO4J_LIVENESS_CHECK"))
+    return config
+
+class ProcessDriver:
+    # Creates the driver on first use in each process, so a driver (and its pooled
+    # sockets) inherited across a gunicorn --preload fork is never shared with the
+    # parent. Sessions default to NEO4J_DATABASE.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.target = None
+
+    def get(self):
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.target = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD), **driver_config())
+                    self.pid = os.getpid()
+        return self.target
+
+    def session(self, **kwargs):
+        kwargs.setdefault("database", NEO4J_DATABASE)
+        return self.get().session(**kwargs)
+
+    def close(self):
+        if self.pid == os.getpid():
+            self.target.close()
+            self.pid = self.target = None
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+driver = ProcessDriver()
+
+# Reads go through managed read transactions: retried on transient errors and, against a
+# cluster, routed to followers. Writes go through managed write transactions on the leader.
+def read_table(query, **params):
+    # (keys, rows as dicts) of a read-only query
+    with driver.session() as session:
+        return session.execute_read(lambda tx: result_table(tx.run(query, params)))
+
+def read_query(query, **params):
+    return read_table(query, **params)[1]
+
+def write_query(query, **params):
+    with driver.session() as session:
+        return session.execute_write(lambda tx: result_table(tx.run(query, params))[1])
+
+def result_table(result):
+    return result.keys(), [dict(record) for record in result]
+
+def read_session():
+    # For reads streamed straight off the cursor, which cannot be buffered for a retry:
+    # auto-commit transactions in a read-access session, still routed to followers
+    return driver.session(default_access_mode=READ_ACCESS)
+
+# Callbacks run after every successful write route, each with a change dict such as
+# {"op": "rel_added", "from": ..., "to": ..., "rel_type": ..., "notes": ...}.
+# Ops: node_added, node_updated, node_deleted, rel_added, rel_updated, rel_deleted, bulk
+GRAPH_LISTENERS = []
+# Bumped on every write made through this worker; caches of derived data key on it
+graph_version = 0
+
+def graph_changed(op, **change):
+    global graph_version
+    graph_version += 1
+    change["op"] = op
+    for listener in GRAPH_LISTENERS:
+        try:
+            listener(change)
+        except Exception as e:
+            app.logger.warning("Graph change listener failed: %s", e)
 
 # Predefined queries for the web interface
 QUERIES = {
@@ -28,6 +160,13 @@ QUERIES = {
             RETURN p.name AS Name, p.title AS Title, r.notes AS Notes
         """,
         "params": ["identifier"],
+        # Stable order for paging: a display column, then a unique tiebreak
+        "order_by": "p.name, elementId(r)",
+        # The same lookup in snapshot mode: the node matched on $identifier by id or name,
+        # its relationships of these types to nodes with the other label, and the columns
+        # as fields of the other node (or the relationship's "notes")
+        "snapshot": {"label": "Company", "rel_types": ["formerly_employed"], "other": "Person",
+                     "columns": {"Name": "name", "Title": "title", "Notes": "notes"}},
     },
     "former_gov_employees": {
         "description": "Find former employees of a government body",
@@ -37,6 +176,9 @@ QUERIES = {
             RETURN p.name AS Name, p.title AS Title, r.notes AS Notes
         """,
         "params": ["identifier"],
+        "order_by": "p.name, elementId(r)",
+        "snapshot": {"label": "Government Body", "rel_types": ["formerly_employed"], "other": "Person",
+                     "columns": {"Name": "name", "Title": "title", "Notes": "notes"}},
     },
     "people_who_know": {
         "description": "Return all people who know a person",
@@ -47,6 +189,9 @@ QUERIES = {
             RETURN other.name AS Name, other.title AS Title, r.notes AS Notes 
         """,
         "params": ["identifier"],
+        "order_by": "other.name, elementId(r)",
+        "snapshot": {"label": "Person", "rel_types": ["knows", "works_with"], "other": "Person",
+                     "columns": {"Name": "name", "Title": "title", "Notes": "notes"}},
     },
     "Gov_contracts": {
         "description": "Return all Companies that work with a Government Body",
@@ -57,21 +202,518 @@ QUERIES = {
             RETURN c.name AS Company, r.notes AS Notes
         """,
         "params": ["identifier"],
+        "order_by": "c.name, elementId(r)",
+        "snapshot": {"label": "Government Body", "rel_types": ["contracts"], "other": "Company",
+                     "columns": {"Company": "name", "Notes": "notes"}},
     },
-    # Add more queries here as needed
+    # Add more queries here as needed; order_by must give a stable order for paging
 }
 
+# Schema bootstrap: id uniqueness (which also gives a range index on id) and a range
+# index on name for every entity label. Idempotent, so it runs at startup by default
+SCHEMA_BOOTSTRAP = os.getenv("SCHEMA_BOOTSTRAP", "1") == "1"
+ENTITY_LABELS = ["Person", "Company", "Government Body"]
+
+def schema_statements(label):
+    slug = label.lower().replace(" ", "_")
+    return [
+        (f"CREATE CONSTRAINT {slug}_id IF NOT EXISTS FOR (n:`{label}`) REQUIRE n.id IS UNIQUE",
+         f"CREATE INDEX {slug}_id IF NOT EXISTS FOR (n:`{label}`) ON (n.id)"),
+        (f"CREATE INDEX {slug}_name IF NOT EXISTS FOR (n:`{label}`) ON (n.name)", None),
+    ]
+
+def ensure_schema():
+    # Create the constraints and indexes; returns one status line per statement. If
+    # existing duplicate ids block a uniqueness constraint, fall back to a plain index
+    report = []
+    with driver.session() as session:
+        for label in ENTITY_LABELS:
+            for statement, fallback in schema_statements(label):
+                try:
+                    session.run(statement).consume()
+                    report.append(f"ok: {statement}")
+                except Exception as e:
+                    if fallback is None:
+                        report.append(f"failed: {statement}: {e}")
+                        continue
+                    session.run(fallback).consume()
+                    report.append(f"fallback: {fallback} ({e})")
+    return report
+
+def bootstrap_schema():
+    try:
+        report = ensure_schema()
+    except Exception as e:
+        app.logger.warning("Schema bootstrap skipped: %s", e)
+        return
+    for line in report:
+        if not line.startswith("ok"):
+            app.logger.warning("Schema bootstrap %s", line)
+
+if SCHEMA_BOOTSTRAP:
+    # In the background so an unreachable database doesn't hold up worker start
+    threading.Thread(target=bootstrap_schema, daemon=True).start()
+
+def match_entity(var, key, imports=()):
+    # Label-aware MATCH of an entity node by id: one index seek per label through a
+    # UNION subquery instead of an all-nodes scan. `imports` lists outer variables
+    # used by `key`, e.g. match_entity("a", "row.from", ["row"])
+    head = f"WITH {', '.join(imports)} " if imports else ""
+    branches = [f"{head}MATCH ({var}:`{label}` {{id: {key}}}) RETURN {var}" for label in ENTITY_LABELS]
+    return "CALL { " + " UNION ".join(branches) + " }"
+
+class TTLCache:
+    # Thread-safe LRU cache with a per-entry time to live
+    def __init__(self, maxsize=128, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = (time.monotonic() + self.ttl, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+# Entity lists behind the dropdowns and autocompletes, cached per kind. Each kind has a
+# version that write routes bump through graph_changed(); a fill that raced with a
+# write is not stored. The TTL bounds staleness from writes made by other workers.
+CATALOG_QUERIES = {
+    "people": "MATCH (p:Person) RETURN p.id AS id, p.name AS name",
+    "companies": "MATCH (c:Company) RETURN c.id AS id, c.name AS name",
+    "governments": "MATCH (g:`Government Body`) RETURN g.id AS id, g.name AS name",
+    "nodes": """
+        MATCH (n) WHERE n:Person OR n:Company OR n:`Government Body`
+        RETURN n.id AS id, n.name AS name, labels(n)[0] AS type
+    """,
+}
+CATALOG_KINDS_BY_LABEL = {
+    "Person": ("people", "nodes"),
+    "Company": ("companies", "nodes"),
+    "Government Body": ("governments", "nodes"),
+}
+catalog_cache = TTLCache(maxsize=len(CATALOG_QUERIES), ttl=int(os.getenv("CATALOG_TTL", "60")))
+catalog_versions = dict.fromkeys(CATALOG_QUERIES, 0)
+
+def entity_catalog(kind):
+    # Return (rows, etag) for a catalog kind, loading it from Neo4j on a miss
+    entry = catalog_cache.get(kind)
+    if entry is not None:
+        return entry
+    version = catalog_versions[kind]
+    return store_catalog(kind, version, read_query(CATALOG_QUERIES[kind]))
+
+def store_catalog(kind, version, rows):
+    # Cache freshly loaded rows with a content etag, unless a write bumped the version meanwhile
+    digest = hashlib.blake2b(json.dumps(rows, sort_keys=True).encode(), digest_size=12).hexdigest()
+    entry = (rows, f"{kind}-{digest}")
+    if catalog_versions[kind] == version:
+        catalog_cache.set(kind, entry)
+    return entry
+
+def invalidate_catalog(change):
+    if change["op"] in ("node_added", "node_updated") and change.get("type") in CATALOG_KINDS_BY_LABEL:
+        kinds = CATALOG_KINDS_BY_LABEL[change["type"]]
+    elif change["op"] in ("node_added", "node_updated", "node_deleted", "bulk"):
+        kinds = CATALOG_QUERIES.keys()
+    else:
+        # Relationship changes never alter the entity lists
+        return
+    for kind in kinds:
+        catalog_versions[kind] += 1
+        catalog_cache.pop(kind)
+
+GRAPH_LISTENERS.append(invalidate_catalog)
+
+def catalog_response(kind, fields):
+    # JSON list of the given fields for a catalog kind, with ETag / If-None-Match support
+    rows, etag = entity_catalog(kind)
+    response = jsonify([{field: row[field] for field in fields} for row in rows])
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+# Typeahead search over the entity catalog: a sorted token list for prefix lookups plus
+# trigram postings for substring/fuzzy matches, rebuilt whenever a catalog kind changes
+SEARCH_KINDS = {"person": "people", "company": "companies", "government": "governments"}
+SEARCH_KIND_LABELS = {"people": "Person", "companies": "Company", "governments": "Government Body"}
+SEARCH_MAX_LIMIT = 50
+
+def trigrams(text):
+    text = f"  {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class SearchIndex:
+    def __init__(self, rows, label):
+        self.label = label
+        self.ids = [row["id"] for row in rows]
+        self.names = [row["name"] or "" for row in rows]
+        self.by_key = {}
+        tokens = []
+        grams = {}
+        for i, (node_id, name) in enumerate(zip(self.ids, self.names)):
+            self.by_key.setdefault(name, i)
+            self.by_key.setdefault(node_id, i)
+            lowered = name.lower()
+            tokens.append((lowered, i))
+            tokens.append(((node_id or "").lower(), i))
+            tokens.extend((word, i) for word in lowered.split()[1:])
+            for gram in trigrams(lowered):
+                grams.setdefault(gram, array("i")).append(i)
+        tokens.sort()
+        self.tokens = tokens
+        self.grams = grams
+
+    def exact(self, value):
+        # Case-sensitive name or id lookup, as the old `p.name = $val OR p.id = $val`
+        i = self.by_key.get(value)
+        return self.ids[i] if i is not None else None
+
+    def search(self, query, limit):
+        query = query.lower()
+        scores = {}
+        # Prefix matches on the whole name, the id, or any later word of the name
+        start = bisect_left(self.tokens, (query,))
+        for token, i in self.tokens[start:start + limit * 20]:
+            if not token.startswith(query):
+                break
+            name = self.names[i].lower()
+            if name == query or (self.ids[i] or "").lower() == query:
+                score = 1.0
+            elif name.startswith(query):
+                score = 0.9
+            else:
+                score = 0.8
+            scores[i] = max(scores.get(i, 0), score)
+        # Trigram overlap for substrings and misspellings
+        query_grams = trigrams(query)
+        if len(query) >= 3:
+            counts = {}
+            for gram in query_grams:
+                for i in self.grams.get(gram, ()):
+                    counts[i] = counts.get(i, 0) + 1
+            for i, shared in counts.items():
+                similarity = shared / len(query_grams)
+                if similarity >= 0.5:
+                    scores[i] = max(scores.get(i, 0), 0.7 * similarity)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], len(self.names[item[0]]), self.names[item[0]]))
+        return [
+            {"id": self.ids[i], "name": self.names[i], "type": self.label, "score": round(score, 3)}
+            for i, score in ranked[:limit]
+        ]
+
+search_indexes = {}
+search_lock = threading.Lock()
+
+def search_index(kind):
+    rows, etag = entity_catalog(kind)
+    with search_lock:
+        entry = search_indexes.get(kind)
+        if entry is None or entry[0] != etag:
+            entry = (etag, SearchIndex(rows, SEARCH_KIND_LABELS[kind]))
+            search_indexes[kind] = entry
+    return entry[1]
+
+# --- Metrics ---
+# Request latency per Flask endpoint and Neo4j round trips per Cypher statement, exposed
+# in Prometheus text format at /metrics. Statements are keyed by their QUERIES id or
+# module constant name when they match one, otherwise by a fingerprint of the query text
+# with literals stripped. Counters are per worker process.
+METRICS_ENABLED = os.getenv("METRICS", "1") == "1"
+SLOW_QUERY_MS = int(os.getenv("SLOW_QUERY_MS", "0"))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ROUND_TRIP_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+QUERY_LITERAL_PATTERN = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|\b\d+(?:\.\d+)?\b")
+
+# Callables returning extra exposition lines, for components that keep their own counters
+METRICS_COLLECTORS = []
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        total = cumulative + self.counts[-1]
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {total}'
+        yield f"{name}_sum{{{labels}}} {self.sum}"
+        yield f"{name}_count{{{labels}}} {total}"
+
+def label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.request_latency = {}
+        self.request_counts = {}
+        self.round_trips = {}
+        self.query_latency = {}
+        self.query_rows = {}
+        self.query_errors = {}
+        self.query_names = None
+        self.fingerprints = {}
+
+    def fingerprint(self, text):
+        key = self.fingerprints.get(text)
+        if key is None:
+            if self.query_names is None:
+                self.query_names = named_queries()
+            normalised = " ".join(text.split())
+            key = self.query_names.get(normalised)
+            if key is None:
+                stripped = QUERY_LITERAL_PATTERN.sub("?", normalised)
+                key = "q_" + hashlib.blake2b(stripped.encode(), digest_size=4).hexdigest()
+            if len(self.fingerprints) < 10000:
+                self.fingerprints[text] = key
+        return key
+
+    def observe_request(self, endpoint, method, status, seconds, round_trips):
+        with self.lock:
+            key = (endpoint, method)
+            if key not in self.request_latency:
+                self.request_latency[key] = Histogram(LATENCY_BUCKETS)
+                self.round_trips[key] = Histogram(ROUND_TRIP_BUCKETS)
+            self.request_latency[key].observe(seconds)
+            self.round_trips[key].observe(round_trips)
+            count_key = (endpoint, method, status)
+            self.request_counts[count_key] = self.request_counts.get(count_key, 0) + 1
+
+    def observe_query(self, key, text, seconds, rows, error):
+        with self.lock:
+            if key not in self.query_latency:
+                self.query_latency[key] = Histogram(LATENCY_BUCKETS)
+                self.query_rows[key] = 0
+                self.query_errors[key] = 0
+            self.query_latency[key].observe(seconds)
+            self.query_rows[key] += rows
+            self.query_errors[key] += error
+        if SLOW_QUERY_MS and seconds * 1000 >= SLOW_QUERY_MS:
+            endpoint = request.endpoint if has_request_context() else None
+            app.logger.warning("Slow query %s: %.0f ms, %d rows, endpoint %s: %s",
+                               key, seconds * 1000, rows, endpoint, " ".join(text.split())[:1000])
+
+    def render(self):
+        lines = []
+        with self.lock:
+            lines.append("# HELP http_request_duration_seconds Request latency per Flask endpoint")
+            lines.append("# TYPE http_request_duration_seconds histogram")
+            for (endpoint, method), histogram in sorted(self.request_latency.items()):
+                lines.extend(histogram.lines("http_request_duration_seconds",
+                                             f'endpoint="{label_value(endpoint)}",method="{method}"'))
+            lines.append("# HELP http_requests_total Requests per Flask endpoint and status")
+            lines.append("# TYPE http_requests_total counter")
+            for (endpoint, method, status), count in sorted(self.request_counts.items()):
+                lines.append(f'http_requests_total{{endpoint="{label_value(endpoint)}",method="{method}",'
+                             f'status="{status}"}} {count}')
+            lines.append("# HELP neo4j_round_trips_per_request Cypher statements run per request")
+            lines.append("# TYPE neo4j_round_trips_per_request histogram")
+            for (endpoint, method), histogram in sorted(self.round_trips.items()):
+                lines.extend(histogram.lines("neo4j_round_trips_per_request",
+                                             f'endpoint="{label_value(endpoint)}",method="{method}"'))
+            lines.append("# HELP neo4j_query_duration_seconds Time from run() until the result was consumed")
+            lines.append("# TYPE neo4j_query_duration_seconds histogram")
+            for key, histogram in sorted(self.query_latency.items()):
+                lines.extend(histogram.lines("neo4j_query_duration_seconds", f'query="{label_value(key)}"'))
+            lines.append("# HELP neo4j_query_rows_total Result rows returned per query")
+            lines.append("# TYPE neo4j_query_rows_total counter")
+            for key, rows in sorted(self.query_rows.items()):
+                lines.append(f'neo4j_query_rows_total{{query="{label_value(key)}"}} {rows}')
+            lines.append("# HELP neo4j_query_errors_total Failed runs per query")
+            lines.append("# TYPE neo4j_query_errors_total counter")
+            for key, errors in sorted(self.query_errors.items()):
+                lines.append(f'neo4j_query_errors_total{{query="{label_value(key)}"}} {errors}')
+        for collect in METRICS_COLLECTORS:
+            lines.extend(collect())
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+def named_queries():
+    # Normalised query text -> metric key, from QUERIES and the module's *_QUERY/*_QUERIES constants
+    names = {}
+    def add(text, key):
+        names.setdefault(" ".join(text.split()), key)
+    for query_id, query in QUERIES.items():
+        add(query["cypher"], query_id)
+        add(paged_cypher(query), f"{query_id}:page")
+        add(ordered_cypher(query), f"{query_id}:all")
+        add(streamed_cypher(query), f"{query_id}:stream")
+    for name, value in list(globals().items()):
+        if name.endswith("_QUERY") and isinstance(value, str):
+            add(value, name[:-len("_QUERY")].lower())
+        elif name.endswith("_QUERIES") and name != "QUERIES":
+            prefix = name[:-len("_QUERIES")].lower()
+            items = value.items() if isinstance(value, dict) else ((entry[-2], entry[-1]) for entry in value)
+            for part, text in items:
+                add(text, f"{prefix}:{str(part).lower().replace(' ', '_')}")
+    return names
+
+class InstrumentedResult:
+    # Counts rows as they are consumed and records the statement once the result is exhausted
+    def __init__(self, result, key, text, started):
+        self.result = result
+        self.key = key
+        self.text = text
+        self.started = started
+        self.rows = 0
+        self.done = False
+
+    def __iter__(self):
+        try:
+            for record in self.result:
+                self.rows += 1
+                yield record
+        except Exception:
+            self.finish(error=True)
+            raise
+        self.finish()
+
+    def single(self, *args, **kwargs):
+        record = self.result.single(*args, **kwargs)
+        self.rows += record is not None
+        self.finish()
+        return record
+
+    def data(self, *args, **kwargs):
+        rows = self.result.data(*args, **kwargs)
+        self.rows += len(rows)
+        self.finish()
+        return rows
+
+    def consume(self):
+        summary = self.result.consume()
+        self.finish()
+        return summary
+
+    def finish(self, error=False):
+        if not self.done:
+            self.done = True
+            metrics.observe_query(self.key, self.text, time.perf_counter() - self.started, self.rows, error)
+
+    def __getattr__(self, name):
+        return getattr(self.result, name)
+
+    def __del__(self):
+        # Results abandoned part-way are still recorded with the rows read so far
+        self.finish()
+
+class InstrumentedRunner:
+    # Wraps a session or transaction so every run() is timed and counted
+    def __init__(self, target):
+        self.target = target
+
+    def run(self, query, parameters=None, **kwargs):
+        text = getattr(query, "text", query)
+        key = metrics.fingerprint(text)
+        stats = request_stats.get()
+        if stats is not None:
+            stats["round_trips"] += 1
+        started = time.perf_counter()
+        try:
+            result = self.target.run(query, parameters, **kwargs)
+        except Exception:
+            metrics.observe_query(key, text, time.perf_counter() - started, 0, True)
+            raise
+        return InstrumentedResult(result, key, text, started)
+
+    def __getattr__(self, name):
+        return getattr(self.target, name)
+
+class InstrumentedSession(InstrumentedRunner):
+    def __enter__(self):
+        self.target.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self.target.__exit__(*exc)
+
+    def execute_read(self, fn, *args, **kwargs):
+        return self.target.execute_read(lambda tx, *a, **k: fn(InstrumentedRunner(tx), *a, **k), *args, **kwargs)
+
+    def execute_write(self, fn, *args, **kwargs):
+        return self.target.execute_write(lambda tx, *a, **k: fn(InstrumentedRunner(tx), *a, **k), *args, **kwargs)
+
+class InstrumentedDriver:
+    def __init__(self, target):
+        self.target = target
+
+    def session(self, **kwargs):
+        return InstrumentedSession(self.target.session(**kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self.target, name)
+
+# Stats of the request being served by this thread. A context variable rather than
+# flask.g so statements run while a streamed body is generated still count.
+request_stats = ContextVar("request_stats", default=None)
+
+def start_request_timer():
+    request_stats.set({"started": time.perf_counter(), "round_trips": 0})
+
+def record_request(response):
+    # Streamed responses are timed until the body has been sent
+    stats = request_stats.get()
+    if stats is None:
+        return response
+    endpoint, method = request.endpoint or "unmatched", request.method
+    def observe():
+        request_stats.set(None)
+        metrics.observe_request(endpoint, method, response.status_code,
+                                time.perf_counter() - stats["started"], stats["round_trips"])
+    response.call_on_close(observe)
+    return response
+
+if METRICS_ENABLED:
+    driver = InstrumentedDriver(driver)
+    app.before_request(start_request_timer)
+    app.after_request(record_request)
+
+@app.route("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route('/')
 def index():
     # Render the main index page with available queries
     return render_template('index.html', queries=QUERIES)
 
-@app.route('/query', methods=['POST'])
-def run_query():
-    # Run a selected query from the web interface
-    query_id = request.form.get('query_id')
+def plan_query(form):
+    # (query_info, params, error) for a predefined query submitted from the web interface
+    query_id = form.get('query_id')
     if not query_id or query_id not in QUERIES:
-        return "Invalid query selected", 400
+        return None, None, "Invalid query selected"
 
     query_info = QUERIES[query_id]
     params = {}
@@ -79,273 +721,2335 @@ def run_query():
     # Determine which identifier to use based on the query type
     identifier = None
     if "person" in query_id:
-        identifier = request.form.get("person_identifier")
+        identifier = form.get("person_identifier")
     elif "company" in query_id:
-        identifier = request.form.get("company_identifier")
+        identifier = form.get("company_identifier")
     elif "gov" in query_id or "government" in query_id:
         # Try both, fallback to person/company if not present
         identifier = (
-            request.form.get("company_identifier")
-            or request.form.get("person_identifier")
-            or request.form.get("government_identifier")
+            form.get("company_identifier")
+            or form.get("person_identifier")
+            or form.get("government_identifier")
         )
     else:
         # Fallback: try both
-        identifier = request.form.get("person_identifier") or request.form.get("company_identifier")
+        identifier = form.get("person_identifier") or form.get("company_identifier")
+
+    # For queries that require 'identifier'
+    if "identifier" in query_info["params"]:
+        if not identifier:
+            return None, None, "Missing identifier parameter."
+        params["identifier"] = identifier
+
+    # If you add queries with other params, handle them here
+    return query_info, params, None
+
+# Results of the predefined QUERIES, cached by (query id, params, graph version) under a
+# byte budget. With QUERY_CACHE_PATH set, the entries and the graph version live in a
+# SQLite file shared by every worker on the host, so a write through any worker
+# invalidates them for all; otherwise each worker keeps its own LRU keyed on its own
+# graph_version. QUERY_CACHE_TTL bounds staleness from writes made outside this app.
+QUERY_CACHE_BYTES = int(os.getenv("QUERY_CACHE_BYTES", str(64 * 1024 * 1024)))
+QUERY_CACHE_TTL = int(os.getenv("QUERY_CACHE_TTL", "300"))
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH")
+
+class ByteLRU:
+    # Thread-safe LRU of bytes values bounded by their total size, with a time to live
+    def __init__(self, budget, ttl):
+        self.budget = budget
+        self.ttl = ttl
+        self.data = OrderedDict()
+        self.size = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def version(self):
+        return graph_version
+
+    def get(self, key):
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                self.size -= len(self.data.pop(key)[1])
+                return None
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.budget:
+            return
+        with self.lock:
+            old = self.data.pop(key, None)
+            if old is not None:
+                self.size -= len(old[1])
+            self.data[key] = (time.monotonic() + self.ttl, value)
+            self.size += len(value)
+            while self.size > self.budget:
+                _, (_, evicted) = self.data.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def invalidate(self):
+        with self.lock:
+            self.data.clear()
+            self.size = 0
+
+    def usage(self):
+        with self.lock:
+            return len(self.data), self.size
+
+class SQLiteStore:
+    # A SQLite file shared between worker processes: WAL journalling, one connection per
+    # thread and process, and the subclass's SCHEMA statements run on first open
+    SCHEMA = ()
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        conn = self.connection()
+        for statement in self.SCHEMA:
+            conn.execute(statement)
+
+    def connection(self):
+        local = self.local
+        if getattr(local, "pid", None) != os.getpid():
+            local.conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            local.conn.execute("PRAGMA journal_mode=WAL")
+            local.conn.execute("PRAGMA synchronous=NORMAL")
+            local.pid = os.getpid()
+        return local.conn
+
+class SharedResultStore(SQLiteStore):
+    # The ByteLRU interface on a SQLite file, with least recently used rows evicted past
+    # the budget. The graph version is a row in the same file, bumped in the transaction
+    # that drops the entries.
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, size INTEGER, expires REAL, used REAL)",
+        "CREATE INDEX IF NOT EXISTS entries_used ON entries (used)",
+        "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)",
+        "INSERT OR IGNORE INTO meta VALUES ('graph_version', 0)",
+    )
+
+    def __init__(self, path, budget, ttl):
+        super().__init__(path)
+        self.budget = budget
+        self.ttl = ttl
+        self.evictions = 0
+
+    def version(self):
+        return self.connection().execute("SELECT value FROM meta WHERE name = 'graph_version'").fetchone()[0]
+
+    def get(self, key):
+        conn = self.connection()
+        row = conn.execute("SELECT value, expires FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row[1] < now:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE entries SET used = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def set(self, key, value):
+        if len(value) > self.budget:
+            return
+        conn = self.connection()
+        now = time.time()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                         (key, value, len(value), now + self.ttl, now))
+            excess = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0] - self.budget
+            while excess > 0:
+                evicted_key, size = conn.execute("SELECT key, size FROM entries ORDER BY used LIMIT 1").fetchone()
+                conn.execute("DELETE FROM entries WHERE key = ?", (evicted_key,))
+                excess -= size
+                self.evictions += 1
+
+    def invalidate(self):
+        conn = self.connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'graph_version'")
+            conn.execute("DELETE FROM entries")
+
+    def usage(self):
+        return self.connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+
+class QueryCache:
+    # Hit/miss accounting and (de)serialisation around a result store. Store errors are
+    # logged and treated as misses, so a locked or missing cache file never fails a query
+    def __init__(self, store):
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get(self, query_id, params):
+        # (key, (columns, rows) or None); key is None when the result should not be cached
+        if self.store is None:
+            return None, None
+        try:
+            key = json.dumps([query_id, params, self.store.version()], sort_keys=True)
+            value = self.store.get(key)
+        except sqlite3.Error as e:
+            self.errors += 1
+            app.logger.warning("Query cache lookup failed: %s", e)
+            return None, None
+        if value is None:
+            self.misses += 1
+            return key, None
+        self.hits += 1
+        columns, rows = json.loads(value)
+        return key, (columns, rows)
+
+    def put(self, key, columns, rows):
+        if key is None:
+            return
+        try:
+            value = json.dumps([list(columns), rows]).encode()
+        except TypeError:
+            # Temporal and spatial values are not JSON; such results are not cached
+            return
+        try:
+            self.store.set(key, value)
+        except sqlite3.Error as e:
+            self.errors += 1
+            app.logger.warning("Query cache store failed: %s", e)
+
+    def on_change(self, change):
+        try:
+            self.store.invalidate()
+        except sqlite3.Error as e:
+            self.errors += 1
+            app.logger.warning("Query cache invalidation failed: %s", e)
+
+    def metric_lines(self):
+        try:
+            entries, size = self.store.usage()
+        except sqlite3.Error:
+            entries = size = 0
+        return [
+            "# HELP query_cache_requests_total Predefined query lookups by cache result",
+            "# TYPE query_cache_requests_total counter",
+            f'query_cache_requests_total{{result="hit"}} {self.hits}',
+            f'query_cache_requests_total{{result="miss"}} {self.misses}',
+            f'query_cache_requests_total{{result="error"}} {self.errors}',
+            "# HELP query_cache_evictions_total Entries evicted to stay within QUERY_CACHE_BYTES",
+            "# TYPE query_cache_evictions_total counter",
+            f"query_cache_evictions_total {self.store.evictions}",
+            "# HELP query_cache_entries Entries currently cached",
+            "# TYPE query_cache_entries gauge",
+            f"query_cache_entries {entries}",
+            "# HELP query_cache_bytes Size of the cached results",
+            "# TYPE query_cache_bytes gauge",
+            f"query_cache_bytes {size}",
+        ]
+
+if QUERY_CACHE_BYTES <= 0:
+    query_cache = QueryCache(None)
+else:
+    if QUERY_CACHE_PATH:
+        query_cache = QueryCache(SharedResultStore(QUERY_CACHE_PATH, QUERY_CACHE_BYTES, QUERY_CACHE_TTL))
+    else:
+        query_cache = QueryCache(ByteLRU(QUERY_CACHE_BYTES, QUERY_CACHE_TTL))
+    GRAPH_LISTENERS.append(query_cache.on_change)
+    METRICS_COLLECTORS.append(query_cache.metric_lines)
+
+def query_lookup(query_id, query_info, params):
+    # (cache key, (columns, rows) or None) for a predefined query: answered from the graph
+    # snapshot when it is current (with no key, as there is nothing to cache), else the cache
+    table = snapshot_query_table(query_info, params)
+    if table is not None:
+        return None, table
+    return query_cache.get(query_id, params)
+
+def cached_query_table(query_id, query_info, cypher, params):
+    # (columns, rows) for a predefined query, from the snapshot or cache when possible
+    key, cached = query_lookup(query_id, query_info, params)
+    if cached is not None:
+        return cached
+    columns, rows = read_table(cypher, **params)
+    query_cache.put(key, columns, rows)
+    return columns, rows
+
+# /query results come a page at a time: each query's stable ORDER BY plus SKIP/LIMIT,
+# with the page size capped. ?stream=1 renders every row (up to QUERY_STREAM_LIMIT) as it
+# is read off the cursor, and /query/download streams them all as CSV or NDJSON
+QUERY_PAGE_SIZE = int(os.getenv("QUERY_PAGE_SIZE", "100"))
+QUERY_MAX_PAGE_SIZE = int(os.getenv("QUERY_MAX_PAGE_SIZE", "1000"))
+QUERY_STREAM_LIMIT = int(os.getenv("QUERY_STREAM_LIMIT", "100000"))
+QUERY_FORM_FIELDS = ("query_id", "person_identifier", "company_identifier", "government_identifier")
+QUERY_DOWNLOAD_MIMETYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+def ordered_cypher(query_info):
+    return f"{query_info['cypher'].rstrip()}\nORDER BY {query_info['order_by']}"
+
+def paged_cypher(query_info):
+    return ordered_cypher(query_info) + "\nSKIP $skip LIMIT $limit"
+
+def streamed_cypher(query_info):
+    return ordered_cypher(query_info) + "\nLIMIT $limit"
+
+def parse_query_page(values):
+    # (page, page_size, error) from the /query arguments
+    page = values.get("page", 1, type=int)
+    page_size = values.get("page_size", QUERY_PAGE_SIZE, type=int)
+    if page < 1 or page_size < 1:
+        return page, page_size, "page and page_size must be positive"
+    return page, min(page_size, QUERY_MAX_PAGE_SIZE), None
+
+def query_link(path, values, **extra):
+    # GET link to the same query, e.g. for another page or a download
+    args = {field: values[field] for field in QUERY_FORM_FIELDS if values.get(field)}
+    return f"{path}?{urlencode({**args, **extra})}"
+
+def query_links(values):
+    return {
+        "stream_url": query_link("/query", values, stream=1),
+        "download_urls": {fmt: query_link("/query/download", values, format=fmt) for fmt in QUERY_DOWNLOAD_MIMETYPES},
+    }
+
+def query_page_context(query_info, values, columns, rows, page, page_size):
+    # results.html context for one page; rows holds one extra row when there is a next page
+    context = {
+        "title": query_info["description"],
+        "columns": columns,
+        "results": rows[:page_size],
+        "first_row": (page - 1) * page_size + 1,
+        "prev_url": query_link("/query", values, page=page - 1, page_size=page_size) if page > 1 else None,
+        "next_url": query_link("/query", values, page=page + 1, page_size=page_size) if len(rows) > page_size else None,
+    }
+    context.update(query_links(values))
+    return context
+
+def query_error_context(error):
+    return {"title": "Query Error", "results": [{"Error": str(error)}], "columns": ["Error"]}
+
+@app.route('/query', methods=['GET', 'POST'])
+def run_query():
+    # Run a selected query from the web interface, one page at a time; the page links
+    # are GETs carrying the same form fields
+    query_info, params, error = plan_query(request.values)
+    if error:
+        return error, 400
+    if request.values.get("stream") == "1":
+        return stream_query_results(query_info, params)
+    page, page_size, error = parse_query_page(request.values)
+    if error:
+        return error, 400
+
+    page_params = dict(params, skip=(page - 1) * page_size, limit=page_size + 1)
+    try:
+        columns, results = cached_query_table(request.values["query_id"], query_info, paged_cypher(query_info),
+                                              page_params)
+    except Exception as e:
+        # Render error if query fails
+        return render_template("results.html", **query_error_context(e))
+
+    return render_template("results.html", **query_page_context(query_info, request.values, columns, results,
+                                                                 page, page_size))
+
+def stream_query_results(query_info, params):
+    # The whole result rendered while it is read off the cursor, so the worker holds
+    # one buffered chunk of HTML rather than every row
+    values = request.values
+
+    def generate():
+        with read_session() as session:
+            result = session.run(streamed_cypher(query_info), dict(params, limit=QUERY_STREAM_LIMIT))
+            rows = (record.data() for record in result)
+            yield from buffered(stream_template("results.html", title=query_info["description"],
+                                                columns=result.keys(), results=rows, streamed=True,
+                                                **query_links(values)))
+
+    return Response(stream_with_context(generate()), mimetype="text/html")
+
+def query_csv_chunks(columns, records):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    # The header goes out on its own, so a query with no rows still downloads as a header-only file
+    yield buf.getvalue()
+    buf.seek(0)
+    buf.truncate()
+    for record in records:
+        writer.writerow([record[column] for column in columns])
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+
+def query_ndjson_chunks(columns, records):
+    for record in records:
+        yield json.dumps(record.data(), default=str) + "\n"
+
+@app.route("/query/download")
+def download_query():
+    # Every row of a predefined query as ?format=csv (default) or ndjson, streamed off the cursor
+    query_info, params, error = plan_query(request.args)
+    if error:
+        return error, 400
+    fmt = request.args.get("format", "csv")
+    if fmt not in QUERY_DOWNLOAD_MIMETYPES:
+        return "Unsupported format", 400
+    encode = query_csv_chunks if fmt == "csv" else query_ndjson_chunks
+
+    def generate():
+        with read_session() as session:
+            result = session.run(ordered_cypher(query_info), params)
+            yield from buffered(encode(result.keys(), result))
+
+    filename = f"{request.args['query_id']}.{fmt}"
+    return Response(generate(), mimetype=QUERY_DOWNLOAD_MIMETYPES[fmt],
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+# JSON API over QUERIES for services: POST /api/query with {"queries": [{"query_id": ...,
+# "params": {...}, "skip": 0, "limit": 100}, ...]}. Params must match the entry's declared
+# params exactly; cache hits are answered directly and every miss runs in one managed read
+# transaction, so a batch costs one session instead of one request and session per lookup.
+QUERY_BATCH_MAX = int(os.getenv("QUERY_BATCH_MAX", "100"))
+
+def plan_query_batch(payload):
+    # ([(query_id, query_info, params)], errors) for a batch request body
+    items = payload.get("queries") if isinstance(payload, dict) else payload
+    if not isinstance(items, list) or not items:
+        return [], ["Body must be a non-empty list of queries, or {\"queries\": [...]}"]
+    if len(items) > QUERY_BATCH_MAX:
+        return [], [f"At most {QUERY_BATCH_MAX} queries per request"]
+    planned, errors = [], []
+    for position, item in enumerate(items):
+        if not isinstance(item, dict) or item.get("query_id") not in QUERIES:
+            errors.append(f"queries[{position}]: unknown query_id")
+            continue
+        query_info = QUERIES[item["query_id"]]
+        params = item.get("params") or {}
+        if not isinstance(params, dict):
+            errors.append(f"queries[{position}]: params must be an object")
+            continue
+        missing = [name for name in query_info["params"] if name not in params]
+        unexpected = [name for name in params if name not in query_info["params"]]
+        if missing or unexpected:
+            errors.append(f"queries[{position}]: expected params {query_info['params']}")
+            continue
+        if not all(isinstance(value, (str, int, float, bool)) for value in params.values()):
+            errors.append(f"queries[{position}]: param values must be strings, numbers or booleans")
+            continue
+        skip, limit = item.get("skip", 0), item.get("limit", QUERY_PAGE_SIZE)
+        if not isinstance(skip, int) or not isinstance(limit, int) or skip < 0 or limit < 1:
+            errors.append(f"queries[{position}]: skip and limit must be non-negative integers, limit at least 1")
+            continue
+        limit = min(limit, QUERY_MAX_PAGE_SIZE)
+        # One extra row tells whether there is more after this page
+        planned.append((item["query_id"], query_info, dict(params, skip=skip, limit=limit + 1)))
+    return planned, errors
+
+def query_batch_result(query_id, params, columns, rows):
+    limit = params["limit"] - 1
+    more = len(rows) > limit
+    return {
+        "query_id": query_id,
+        "columns": list(columns),
+        "rows": rows[:limit],
+        "next_skip": params["skip"] + limit if more else None,
+    }
+
+def run_query_batch(tx, misses):
+    return [result_table(tx.run(paged_cypher(query_info), params)) for _, query_info, params in misses]
+
+@app.route("/api/query", methods=["POST"])
+def api_query():
+    planned, errors = plan_query_batch(request.get_json(silent=True))
+    if errors:
+        return jsonify({"errors": errors}), 400
+    lookups = [query_lookup(query_id, query_info, params) for query_id, query_info, params in planned]
+    misses = [item for item, (_, cached) in zip(planned, lookups) if cached is None]
+    try:
+        if misses:
+            with driver.session() as session:
+                fetched = iter(session.execute_read(run_query_batch, misses))
+        else:
+            fetched = iter(())
+    except Exception as e:
+        return jsonify({"errors": [str(e)]}), 500
+    results = []
+    for (query_id, _, params), (key, cached) in zip(planned, lookups):
+        if cached is None:
+            cached = next(fetched)
+            query_cache.put(key, *cached)
+        results.append(query_batch_result(query_id, params, *cached))
+    return jsonify({"results": results})
+
+@app.route("/schema-data")
+def schema_data():
+    # Return a static schema graph (node types and relationship types)
+    nodes = [
+        {"id": "Person", "label": "Person", "group": "Person"},
+        {"id": "Company", "label": "Company", "group": "Company"},
+        {"id": "GovernmentBody", "label": "Government Body", "group": "GovernmentBody"},
+    ]
+    edges = [
+        {"from": "Person", "to": "Person", "label": "knows"},
+        {"from": "Person", "to": "Person", "label": "works_with"},
+        {"from": "Person", "to": "Company", "label": "formerly_employed"},
+        {"from": "Person", "to": "Company", "label": "employed"},
+        {"from": "Company", "to": "Company", "label": "contracts"},
+        {"from": "Company", "to": "Company", "label": "known_collaborator"},
+        {"from": "Person", "to": "GovernmentBody", "label": "formerly_employed"},
+        {"from": "Person", "to": "GovernmentBody", "label": "employed"},
+        {"from": "GovernmentBody", "to": "Company", "label": "contracts"},
+        {"from": "GovernmentBody", "to": "GovernmentBody", "label": "known_collaborator"},
+    ]
+    return jsonify({"nodes": nodes, "edges": edges})
+
+# Node labels exposed in the graph views, mapped to their vis.js group
+GRAPH_GROUPS = {"Person": "Person", "Company": "Company", "Government Body": "GovernmentBody"}
+FULL_GRAPH_MAX_LIMIT = int(os.getenv("FULL_GRAPH_MAX_LIMIT", "5000"))
+
+FULL_GRAPH_NODE_QUERIES = [
+    ("Person", "MATCH (p:Person) RETURN p.id AS id, p.name AS name, p.title AS title"),
+    ("Company", "MATCH (c:Company) RETURN c.id AS id, c.name AS name, null AS title"),
+    ("Government Body", "MATCH (g:`Government Body`) RETURN g.id AS id, g.name AS name, null AS title"),
+]
+FULL_GRAPH_EDGE_QUERY = """
+    MATCH (a)-[r]->(b)
+    RETURN a.id AS from_id, b.id AS to_id, type(r) AS label, r.notes AS title
+"""
+# One keyset page: the next `limit` entity nodes by id, each with its outgoing edges
+def full_graph_page_query(condition):
+    # One keyset page: each label is read in id order off its id index, at most $limit
+    # nodes per label, and the merged branches are cut back to $limit
+    branches = [f"MATCH (n:`{label}`) WHERE {condition} RETURN n ORDER BY n.id LIMIT $limit" for label in ENTITY_LABELS]
+    return f"""
+    CALL {{ {" UNION ".join(branches)} }}
+    WITH n ORDER BY n.id LIMIT $limit
+    OPTIONAL MATCH (n)-[r]->(m)
+    RETURN n.id AS id, n.name AS name, n.title AS title, labels(n) AS labels,
+           collect(CASE WHEN r IS NULL THEN null ELSE {{to_id: m.id, label: type(r), title: r.notes}} END) AS out
+    ORDER BY id
+"""
+
+FULL_GRAPH_FIRST_PAGE_QUERY = full_graph_page_query("n.id IS NOT NULL")
+FULL_GRAPH_PAGE_QUERY = full_graph_page_query("n.id > $after")
+
+def full_graph_page_cypher(after):
+    return FULL_GRAPH_FIRST_PAGE_QUERY if after is None else FULL_GRAPH_PAGE_QUERY
+
+def vis_node(node_id, name, title, label):
+    # Shape a node the way the vis.js explorer expects it
+    group = GRAPH_GROUPS.get(label, label)
+    return {
+        "id": node_id,
+        "label": name,
+        "group": group,
+        "title": (title or "") if label == "Person" else f"ID: {node_id}"
+    }
+
+def vis_edge(from_id, to_id, label, title):
+    return {"from": from_id, "to": to_id, "label": label, "title": title, "arrows": "to"}
+
+def primary_label(labels):
+    for label in labels:
+        if label in GRAPH_GROUPS:
+            return label
+    return labels[0] if labels else None
+
+def full_graph_items(node_sections, edge_records):
+    # Yield ("node", dict) then ("edge", dict) items from (label, records) node sections
+    # and the edge records
+    seen_nodes = set()
+    for label, records in node_sections:
+        for record in records:
+            if record["id"] not in seen_nodes:
+                seen_nodes.add(record["id"])
+                yield "node", vis_node(record["id"], record["name"], record["title"], label)
+    for record in edge_records:
+        yield "edge", vis_edge(record["from_id"], record["to_id"], record["label"], record["title"])
+
+def iter_full_graph(session):
+    # Items read straight off the Neo4j cursors, one query after another
+    # Each query only starts once the previous cursor is drained
+    node_sections = ((label, session.run(cypher)) for label, cypher in FULL_GRAPH_NODE_QUERIES)
+
+    def edge_records():
+        yield from session.run(FULL_GRAPH_EDGE_QUERY)
+
+    yield from full_graph_items(node_sections, edge_records())
+
+def iter_full_graph_page(session, after, limit, cursor):
+    return full_graph_page_items(session.run(full_graph_page_cypher(after), after=after, limit=limit), limit, cursor)
+
+def full_graph_page_items(records, limit, cursor):
+    # Yield one keyset page of nodes, then their outgoing edges; cursor["next"] is set
+    # to the last id of the page, or left as None when the graph is exhausted
+    count = 0
+    last_id = None
+    edges = []
+    for record in records:
+        count += 1
+        last_id = record["id"]
+        yield "node", vis_node(record["id"], record["name"], record["title"], primary_label(record["labels"]))
+        for rel in record["out"]:
+            edges.append(vis_edge(record["id"], rel["to_id"], rel["label"], rel["title"]))
+    for edge in edges:
+        yield "edge", edge
+    if count == limit:
+        cursor["next"] = last_id
+
+def full_graph_json(items, cursor=None, layout=None, changes=None):
+    # Chunked JSON encoding of {"nodes": [...], "edges": [...]}; items arrive nodes first
+    yield '{"nodes": ['
+    section = "nodes"
+    first = True
+    for kind, item in items:
+        if kind == "edge" and section == "nodes":
+            yield '], "edges": ['
+            section = "edges"
+            first = True
+        yield ("" if first else ",") + json.dumps(item)
+        first = False
+    if section == "nodes":
+        yield '], "edges": ['
+    yield "]"
+    if cursor is not None:
+        yield ', "next": ' + json.dumps(cursor["next"])
+    if layout is not None:
+        yield ', "layout": ' + json.dumps(layout)
+    if changes is not None:
+        yield ', "changes": ' + json.dumps(changes)
+    yield "}"
+
+def buffered(chunks, size=65536):
+    # Coalesce many small string chunks into fewer, larger writes
+    buf = []
+    length = 0
+    for chunk in chunks:
+        buf.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield "".join(buf)
+            buf = []
+            length = 0
+    if buf:
+        yield "".join(buf)
+
+def full_graph_ndjson(items, cursor=None, layout=None, changes=None):
+    # One {"type": "node"|"edge", "data": {...}} object per line
+    for kind, item in items:
+        yield json.dumps({"type": kind, "data": item}) + "\n"
+    if cursor is not None:
+        yield json.dumps({"type": "page", "next": cursor["next"]}) + "\n"
+    if layout is not None:
+        yield json.dumps({"type": "layout", **layout}) + "\n"
+    if changes is not None:
+        yield json.dumps({"type": "changes", **changes}) + "\n"
+
+# Server-side layout for /full-graph, so the browser can skip the force simulation
+LAYOUT_ENABLED = np is not None and os.getenv("LAYOUT", "1") == "1"
+LAYOUT_TTL = int(os.getenv("LAYOUT_TTL", "300"))
+LAYOUT_EDGE_LENGTH = 150.0
+# Minimum median distance between a node and its nearest neighbour, in pixels
+LAYOUT_NODE_SPACING = 40.0
+LAYOUT_PIVOTS = 50
+# Graphs up to this size get a force-directed refinement pass with exact repulsion
+LAYOUT_REFINE_MAX = 2000
+LAYOUT_REFINE_ITERATIONS = 60
+# Incremental updates move changed nodes with exact repulsion against every node; above
+# this many (moved nodes x all nodes) pair evaluations the whole layout is recomputed
+LAYOUT_INCREMENTAL_BUDGET = 5e7
+
+def graph_snapshot():
+    # The entity graph as arrays: (ids in order, labels, names, src, dst, rel_types), with
+    # edges as positions in ids and only those between entity nodes kept
+    with read_session() as session:
+        nodes = {}
+        for label, cypher in FULL_GRAPH_NODE_QUERIES:
+            for record in session.run(cypher):
+                nodes.setdefault(record["id"], (label, record["name"]))
+        ids = sorted(nodes)
+        index = {node_id: i for i, node_id in enumerate(ids)}
+        src, dst, rel_types = [], [], []
+        for record in session.run(FULL_GRAPH_EDGE_QUERY):
+            a, b = index.get(record["from_id"]), index.get(record["to_id"])
+            if a is not None and b is not None:
+                src.append(a)
+                dst.append(b)
+                rel_types.append(record["label"])
+    labels = [nodes[node_id][0] for node_id in ids]
+    names = [nodes[node_id][1] for node_id in ids]
+    return ids, labels, names, np.array(src, dtype=np.int64), np.array(dst, dtype=np.int64), rel_types
+
+def csr_adjacency(n, src, dst):
+    # Undirected adjacency as (offsets, targets) arrays
+    heads = np.concatenate([src, dst])
+    tails = np.concatenate([dst, src])
+    order = np.argsort(heads, kind="stable")
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(heads, minlength=n), out=offsets[1:])
+    return offsets, tails[order]
+
+def frontier_edges(offsets, targets, frontier):
+    # (heads, tails) of every adjacency entry leaving the frontier nodes
+    starts = offsets[frontier]
+    counts = offsets[frontier + 1] - starts
+    positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+    return np.repeat(frontier, counts), targets[positions]
+
+def bfs_distances(offsets, targets, source):
+    # Hop distance from source to every node (-1 when unreachable), one frontier per step
+    n = len(offsets) - 1
+    dist = np.full(n, -1, dtype=np.int64)
+    dist[source] = 0
+    frontier = np.array([source])
+    level = 0
+    while frontier.size:
+        level += 1
+        _, reached = frontier_edges(offsets, targets, frontier)
+        reached = np.unique(reached)
+        frontier = reached[dist[reached] < 0]
+        dist[frontier] = level
+    return dist
+
+def pivot_mds(offsets, targets, pivots=LAYOUT_PIVOTS):
+    # Pivot MDS (Brandes & Pich): classical MDS on hop distances to a few pivots picked
+    # by max-min distance, starting from the highest-degree node. O(pivots * edges)
+    n = len(offsets) - 1
+    degree = np.diff(offsets)
+    columns = []
+    nearest = np.full(n, np.inf)
+    pivot = int(np.argmax(degree))
+    for _ in range(min(pivots, n)):
+        dist = bfs_distances(offsets, targets, pivot).astype(float)
+        # Other components sit one hop beyond the farthest reachable node
+        dist[dist < 0] = dist.max() + 1
+        columns.append(dist)
+        nearest = np.minimum(nearest, dist)
+        pivot = int(np.argmax(nearest))
+        if nearest[pivot] == 0:
+            break
+    squared = np.column_stack(columns) ** 2
+    centred = squared - squared.mean(axis=0) - squared.mean(axis=1)[:, None] + squared.mean()
+    u, s, _ = np.linalg.svd(-0.5 * centred, full_matrices=False)
+    pos = u[:, :2] * s[:2]
+    if pos.shape[1] < 2:
+        pos = np.column_stack([pos, np.zeros(n)])
+    return pos
+
+def force_refine(pos, src, dst, rows, iterations, temperature):
+    # Fruchterman-Reingold steps for the given rows (exact repulsion against every node),
+    # with step sizes cooling linearly from `temperature`
+    k = LAYOUT_EDGE_LENGTH
+    for i in range(iterations):
+        x, y = pos[:, 0].astype(np.float32), pos[:, 1].astype(np.float32)
+        disp = np.zeros_like(pos)
+        for start in range(0, len(rows), 1024):
+            chunk = rows[start:start + 1024]
+            dx = x[chunk, None] - x[None, :]
+            dy = y[chunk, None] - y[None, :]
+            weight = k * k / np.maximum(dx * dx + dy * dy, 1.0)
+            disp[chunk, 0] = (dx * weight).sum(axis=1)
+            disp[chunk, 1] = (dy * weight).sum(axis=1)
+        delta = pos[src] - pos[dst]
+        pull = delta * (np.sqrt((delta ** 2).sum(axis=1)) / k)[:, None]
+        np.subtract.at(disp, src, pull)
+        np.add.at(disp, dst, pull)
+        step = disp[rows]
+        length = np.maximum(np.sqrt((step ** 2).sum(axis=1)), 1e-9)
+        limit = temperature * (1 - i / iterations) + 1.0
+        pos[rows] += step * (np.minimum(length, limit) / length)[:, None]
+    return pos
+
+def align_layout(pos, previous, known):
+    # Rotate/reflect and translate pos onto the previous coordinates of the known rows
+    # (orthogonal Procrustes), so a full recompute does not spin the picture around
+    if known.sum() < 3:
+        return pos
+    a = pos[known] - pos[known].mean(axis=0)
+    b = previous[known] - previous[known].mean(axis=0)
+    u, _, vt = np.linalg.svd(a.T @ b)
+    return (pos - pos[known].mean(axis=0)) @ (u @ vt) + previous[known].mean(axis=0)
+
+def full_layout(offsets, targets, src, dst):
+    # Coordinates for the whole graph, and the factor they were scaled up by
+    n = len(offsets) - 1
+    if n == 0:
+        return np.zeros((0, 2)), 1.0
+    pos = pivot_mds(offsets, targets) * LAYOUT_EDGE_LENGTH
+    # Nodes with identical pivot distances (leaves of one hub) coincide; a small
+    # deterministic jitter separates them before refinement
+    pos += np.random.default_rng(n).normal(0, LAYOUT_EDGE_LENGTH / 4, pos.shape)
+    if n <= LAYOUT_REFINE_MAX:
+        force_refine(pos, src, dst, np.arange(n), LAYOUT_REFINE_ITERATIONS, LAYOUT_EDGE_LENGTH * 2)
+    # Scale so the median edge has the target length, or further when that would leave
+    # nodes on top of each other, then pull in far outliers (isolated nodes and small
+    # components) to the edge of the main picture
+    pos -= np.median(pos, axis=0)
+    sample = np.random.default_rng(0).choice(n, min(n, 200), replace=False)
+    gaps = np.sqrt(((pos[sample, None] - pos[None]) ** 2).sum(axis=2))
+    gaps[np.arange(len(sample)), sample] = np.inf
+    scale = LAYOUT_NODE_SPACING / max(np.median(gaps.min(axis=1)), 1e-9)
+    if len(src):
+        median_edge = np.median(np.sqrt(((pos[src] - pos[dst]) ** 2).sum(axis=1)))
+        scale = max(scale, LAYOUT_EDGE_LENGTH / max(median_edge, 1e-9))
+    pos *= scale
+    radius = np.sqrt((pos ** 2).sum(axis=1))
+    limit = np.percentile(radius, 99) * 1.2
+    pos *= (np.minimum(radius, limit) / np.maximum(radius, 1e-9))[:, None]
+    return pos, scale
+
+class GraphLayout:
+    # Node coordinates computed by a background thread and cached against graph_version
+    # (and LAYOUT_TTL, which bounds staleness from other workers' writes). A refresh
+    # reloads the graph and only moves nodes that are new or whose neighbour set changed,
+    # plus their neighbours; everything else keeps its coordinates, so the picture stays
+    # stable between visits. Until the first run finishes, no coordinates are served.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.positions = {}
+        self.signatures = {}
+        # Factor between stored coordinates and the force model's natural scale
+        self.scale = 1.0
+        self.version = None
+        self.computed_at = None
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def coordinates(self):
+        # (positions, layout info) for the cached layout, possibly a graph version behind;
+        # schedules a refresh when it is out of date
+        self.start()
+        with self.lock:
+            positions, version, computed_at = self.positions, self.version, self.computed_at
+        if version != graph_version or computed_at is None or time.monotonic() - computed_at > LAYOUT_TTL:
+            self.wakeup.set()
+        if computed_at is None:
+            return None, None
+        return positions, {"version": version, "current": version == graph_version}
+
+    def on_change(self, change):
+        self.wakeup.set()
+
+    def run(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            try:
+                self.refresh()
+            except Exception:
+                app.logger.exception("Graph layout refresh failed")
+            # Coalesce bursts of writes into one refresh
+            time.sleep(5)
+
+    def load(self):
+        ids, _, _, src, dst, _ = graph_snapshot()
+        loops = src == dst
+        return ids, src[~loops], dst[~loops]
+
+    def refresh(self):
+        version = graph_version
+        started = time.monotonic()
+        ids, src, dst = self.load()
+        n = len(ids)
+        offsets, targets = csr_adjacency(n, src, dst)
+        signatures = {node_id: hash(tuple(sorted(ids[j] for j in targets[offsets[i]:offsets[i + 1]])))
+                      for i, node_id in enumerate(ids)}
+
+        previous = np.zeros((n, 2))
+        known = np.zeros(n, dtype=bool)
+        for i, node_id in enumerate(ids):
+            if node_id in self.positions:
+                previous[i] = self.positions[node_id]
+                known[i] = True
+        dirty = np.array([i for i, node_id in enumerate(ids)
+                          if not known[i] or self.signatures.get(node_id) != signatures[node_id]], dtype=np.int64)
+
+        scale = self.scale
+        if n and not dirty.size:
+            pos = previous
+            moved = 0
+        else:
+            rows = np.unique(np.concatenate([dirty] + [targets[offsets[i]:offsets[i + 1]] for i in dirty]))
+            if known.any() and rows.size * n <= LAYOUT_INCREMENTAL_BUDGET:
+                # New nodes start next to their placed neighbours, then the changed region
+                # relaxes in the force model's own units
+                pos = previous / scale
+                rng = np.random.default_rng(n)
+                for i in dirty[~known[dirty]]:
+                    anchors = [j for j in targets[offsets[i]:offsets[i + 1]] if known[j]]
+                    centre = pos[anchors].mean(axis=0) if anchors else pos[known].mean(axis=0)
+                    pos[i] = centre + rng.normal(0, LAYOUT_EDGE_LENGTH / 2, 2)
+                force_refine(pos, src, dst, rows, LAYOUT_REFINE_ITERATIONS // 2, LAYOUT_EDGE_LENGTH)
+                pos *= scale
+                moved = rows.size
+            else:
+                pos, scale = full_layout(offsets, targets, src, dst)
+                pos = align_layout(pos, previous, known)
+                moved = n
+
+        positions = {node_id: (round(float(x), 1), round(float(y), 1)) for node_id, (x, y) in zip(ids, pos)}
+        with self.lock:
+            self.positions = positions
+            self.signatures = signatures
+            self.scale = scale
+            self.version = version
+            self.computed_at = time.monotonic()
+        app.logger.info("Graph layout for version %s: %d nodes, %d moved, %.1fs",
+                        version, n, moved, time.monotonic() - started)
+
+graph_layout = GraphLayout()
+if LAYOUT_ENABLED:
+    GRAPH_LISTENERS.append(graph_layout.on_change)
+
+def with_positions(items, positions):
+    for kind, item in items:
+        if kind == "node" and item["id"] in positions:
+            item["x"], item["y"] = positions[item["id"]]
+        yield kind, item
+
+def full_graph_layout(items):
+    # Attach cached coordinates to the node items; returns (items, layout info or None)
+    if not LAYOUT_ENABLED:
+        return items, None
+    positions, layout = graph_layout.coordinates()
+    if positions is None:
+        return items, None
+    return with_positions(items, positions), layout
+
+def parse_full_graph_args(args):
+    # (format, after, limit, error) from the /full-graph query string
+    fmt = args.get("format", "json")
+    after = args.get("after") or None
+    limit = args.get("limit", type=int)
+    if fmt not in ("json", "ndjson"):
+        return fmt, after, limit, "Unsupported format"
+    if limit is not None and limit <= 0:
+        return fmt, after, limit, "limit must be positive"
+    if limit is not None:
+        limit = min(limit, FULL_GRAPH_MAX_LIMIT)
+    return fmt, after, limit, None
+
+def full_graph_body(fmt, items, cursor, layout=None, changes=None):
+    encode = full_graph_ndjson if fmt == "ndjson" else full_graph_json
+    return buffered(encode(items, cursor, layout, changes))
+
+def change_position():
+    # The change feed position a response reflects, taken before its data is read, so a
+    # client can replay /api/changes from it and catch anything the response missed
+    return {"log": change_log.log_id, "version": change_log.latest()}
+
+def full_graph_chunks(fmt, after, limit):
+    # The encoded /full-graph body, from the snapshot when it is current, else read off Neo4j
+    cursor = {"next": None} if limit is not None else None
+    changes = change_position()
+    snapshot = current_snapshot()
+    if snapshot is not None:
+        items = snapshot.items() if cursor is None else snapshot.page_items(after, limit, cursor)
+        items, layout = full_graph_layout(items)
+        yield from full_graph_body(fmt, items, cursor, layout, changes)
+        return
+    with read_session() as session:
+        if cursor is None:
+            items = iter_full_graph(session)
+        else:
+            items = iter_full_graph_page(session, after, limit, cursor)
+        items, layout = full_graph_layout(items)
+        yield from full_graph_body(fmt, items, cursor, layout, changes)
+
+FULL_GRAPH_MIMETYPES = {"json": "application/json", "ndjson": "application/x-ndjson"}
+
+# Encoded /full-graph responses, kept per worker and compressed ahead of time for a fixed
+# set of variants: the unpaged body in each format and the first page the graph page
+# loads. A request that finds its variant out of date (after a change, or once older than
+# FULL_GRAPH_CACHE_TTL) gets the previous body and queues that variant for a rebuild in a
+# background thread; the body carries the change position it was built at, so the page
+# can replay what it is missing from /api/changes. Variants nobody asks for are not rebuilt,
+# and a body over FULL_GRAPH_CACHE_BYTES is not kept.
+FULL_GRAPH_CACHE_ENABLED = os.getenv("FULL_GRAPH_CACHE", "1") == "1"
+FULL_GRAPH_CACHE_BYTES = int(os.getenv("FULL_GRAPH_CACHE_BYTES", str(128 * 1024 * 1024)))
+FULL_GRAPH_CACHE_TTL = int(os.getenv("FULL_GRAPH_CACHE_TTL", "300"))
+# Nodes per request when the graph page loads the graph
+FULL_GRAPH_PAGE_SIZE = 1000
+FULL_GRAPH_CACHE_VARIANTS = (("json", None, None), ("ndjson", None, None), ("json", None, FULL_GRAPH_PAGE_SIZE))
+
+class FullGraphCache:
+    def __init__(self, budget, ttl):
+        self.budget = budget
+        self.ttl = ttl
+        # (fmt, after, limit) -> entry dict; an entry without bodies records a body that
+        # was over budget for that state
+        self.entries = {}
+        self.pending = set()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.results = {"hit": 0, "stale": 0, "miss": 0}
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def state(self):
+        # What a body depends on: the change feed position and the layout it was built with
+        layout = graph_layout.computed_at if LAYOUT_ENABLED else None
+        return change_log.log_id, change_log.latest(), layout
+
+    def fresh(self, entry, state):
+        return entry is not None and entry["state"] == state and time.monotonic() - entry["built"] <= self.ttl
+
+    def get(self, key):
+        # The latest built entry for this variant, current or not, or None; schedules a
+        # rebuild of this variant when it is out of date
+        if key not in FULL_GRAPH_CACHE_VARIANTS:
+            return None
+        self.start()
+        state = self.state()
+        with self.lock:
+            entry = self.entries.get(key)
+            if self.fresh(entry, state):
+                result = "hit" if entry["bodies"] is not None else "miss"
+            else:
+                result = "stale" if entry is not None and entry["bodies"] is not None else "miss"
+                self.pending.add(key)
+                self.wakeup.set()
+            self.results[result] += 1
+        return entry if entry is not None and entry["bodies"] is not None else None
+
+    def run(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            try:
+                self.refresh()
+            except Exception:
+                app.logger.exception("Full graph cache rebuild failed")
+            # Coalesce bursts of writes into one rebuild
+            time.sleep(1)
+
+    def refresh(self):
+        # Rebuild the variants requested since the last run that are still out of date
+        state = self.state()
+        with self.lock:
+            keys = [key for key in self.pending if not self.fresh(self.entries.get(key), state)]
+            self.pending.clear()
+        for key in keys:
+            entry = self.build(key, state)
+            with self.lock:
+                old = self.entries.get(key)
+                others = self.size - (old["size"] if old is not None else 0)
+                if others + entry["size"] > self.budget:
+                    entry.update(bodies=None, size=0)
+                self.size = others + entry["size"]
+                self.entries[key] = entry
+
+    def build(self, key, state):
+        body = "".join(full_graph_chunks(*key)).encode()
+        bodies = {None: body}
+        for encoding in ("gzip", "zstd") if zstandard is not None else ("gzip",):
+            bodies[encoding] = b"".join(compress_chunks([body], encoding))
+        return {
+            "state": state,
+            "built": time.monotonic(),
+            "modified": datetime.now(timezone.utc).replace(microsecond=0),
+            "digest": hashlib.blake2b(body, digest_size=16).hexdigest(),
+            "bodies": bodies,
+            "size": sum(len(data) for data in bodies.values()),
+        }
+
+    def metric_lines(self):
+        lines = [
+            "# HELP full_graph_cache_requests_total /full-graph requests by cache result (stale bodies are served)",
+            "# TYPE full_graph_cache_requests_total counter",
+        ]
+        lines.extend(f'full_graph_cache_requests_total{{result="{result}"}} {count}'
+                     for result, count in self.results.items())
+        lines.extend([
+            "# HELP full_graph_cache_bytes Size of the cached /full-graph bodies, all encodings",
+            "# TYPE full_graph_cache_bytes gauge",
+            f"full_graph_cache_bytes {self.size}",
+        ])
+        return lines
+
+full_graph_cache = FullGraphCache(FULL_GRAPH_CACHE_BYTES, FULL_GRAPH_CACHE_TTL)
+if FULL_GRAPH_CACHE_ENABLED:
+    METRICS_COLLECTORS.append(full_graph_cache.metric_lines)
+
+def cached_full_graph(fmt, after, limit, req):
+    # (body, status, headers) for a /full-graph request from the cache, with a 304 when
+    # the client's copy matches; None when the live path has to answer
+    entry = full_graph_cache.get((fmt, after, limit)) if FULL_GRAPH_CACHE_ENABLED else None
+    if entry is None:
+        return None
+    encoding = negotiate_encoding(None, req.accept_encodings)
+    # One entity tag per content coding, the same in every worker for the same body
+    etag = f"{entry['digest']}-{encoding or 'identity'}"
+    headers = {
+        "ETag": f'"{etag}"',
+        "Last-Modified": http_date(entry["modified"]),
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if req.if_none_match:
+        not_modified = req.if_none_match.contains_weak(etag)
+    else:
+        not_modified = req.if_modified_since is not None and req.if_modified_since >= entry["modified"]
+    if not_modified:
+        return "", 304, headers
+    headers["Content-Type"] = FULL_GRAPH_MIMETYPES[fmt]
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return entry["bodies"][encoding], 200, headers
+
+@app.route("/full-graph")
+def full_graph():
+    # Return the full graph (all nodes and relationships), streamed as it is read.
+    # ?format=ndjson streams one item per line; ?limit=N[&after=<id>] returns one
+    # keyset page of nodes (with their outgoing edges) and the cursor for the next one
+    fmt, after, limit, error = parse_full_graph_args(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    cached = cached_full_graph(fmt, after, limit, request)
+    if cached is not None:
+        return cached
+    return Response(full_graph_chunks(fmt, after, limit), mimetype=FULL_GRAPH_MIMETYPES[fmt])
+
+@app.route("/graph")
+def graph_view():
+    # Render the full graph visualization page
+    return render_template("full_graph.html", page_size=FULL_GRAPH_PAGE_SIZE)
+
+@app.route("/schema")
+def schema_view():
+    # Render the schema visualization page
+    return render_template("schema.html")
+
+# Optional in-process path engine for network analysis. Neo4j stays the source of truth:
+# the index is loaded from it on first use, patched by graph_changed() for writes made
+# through this worker, and rebuilt after PATH_INDEX_TTL seconds to pick up the rest
+PATH_ENGINE_ENABLED = os.getenv("PATH_ENGINE", "0") == "1"
+PATH_INDEX_TTL = int(os.getenv("PATH_INDEX_TTL", "300"))
+PATH_MAX_HOPS = 6
+PATH_MAX_RESULTS = int(os.getenv("PATH_MAX_RESULTS", "50"))
+ORG_CONNECTIVITY_ENABLED = os.getenv("ORG_CONNECTIVITY", "0") == "1"
+SOCIAL_REL_TYPES = ("knows", "works_with")
+EMPLOYMENT_REL_TYPES = ("employed", "formerly_employed")
+# Form fields naming the two organisations of each organisation-to-organisation analysis
+ORG_ANALYSIS_PARAMS = {
+    "gov_company": ("government_id", "company_id"),
+    "company_company": ("company1_id", "company2_id"),
+    "gov_gov": ("government1_id", "government2_id"),
+}
+
+PATH_INDEX_PEOPLE_QUERY = "MATCH (p:Person) RETURN p.id AS id, p.name AS name, p.title AS title"
+PATH_INDEX_ORGS_QUERY = """
+    MATCH (o) WHERE o:Company OR o:`Government Body`
+    RETURN o.id AS id, o.name AS name, o.title AS title, labels(o) AS labels
+"""
+PATH_INDEX_SOCIAL_QUERY = """
+    MATCH (a:Person)-[r:knows|works_with]->(b:Person)
+    RETURN a.id AS from_id, b.id AS to_id, type(r) AS type, r.notes AS notes
+"""
+PATH_INDEX_EMPLOYMENT_QUERY = """
+    MATCH (p:Person)-[r:employed|formerly_employed]-(o)
+    WHERE o:Company OR o:`Government Body`
+    RETURN p.id AS person_id, o.id AS org_id, type(r) AS type, r.notes AS notes
+"""
+
+class PathIndex:
+    # Person-to-person adjacency in compressed sparse row form. Node i's neighbours are
+    # targets[offsets[i]:offsets[i + 1]], and edge_refs holds the matching row of the edge
+    # table (edge_from/edge_to/edge_type/edge_notes). Writes made after the build go to a
+    # small overlay (extra adjacency plus removed edges/people) until the next rebuild.
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.build_lock = threading.Lock()
+        self.built_at = None
+        self.stale = True
+        # Changes seen while a build is reading Neo4j, replayed onto its result
+        self.building = None
+
+    def build(self, session):
+        with self.lock:
+            self.building = []
+        person_ids, names, titles = [], [], []
+        for record in session.run(PATH_INDEX_PEOPLE_QUERY):
+            person_ids.append(record["id"])
+            names.append(record["name"])
+            titles.append(record["title"])
+        index = {person_id: i for i, person_id in enumerate(person_ids)}
+
+        orgs = {}
+        for record in session.run(PATH_INDEX_ORGS_QUERY):
+            orgs[record["id"]] = {"name": record["name"], "title": record["title"], "label": primary_label(record["labels"])}
+
+        edge_from, edge_to, edge_type, edge_notes = array("i"), array("i"), array("b"), []
+        degree = array("i", [0]) * (len(person_ids) + 1)
+        for record in session.run(PATH_INDEX_SOCIAL_QUERY):
+            a, b = index.get(record["from_id"]), index.get(record["to_id"])
+            if a is None or b is None:
+                continue
+            edge_from.append(a)
+            edge_to.append(b)
+            edge_type.append(SOCIAL_REL_TYPES.index(record["type"]))
+            edge_notes.append(record["notes"])
+            degree[a] += 1
+            degree[b] += 1
+
+        # Counting sort of both edge directions into the CSR arrays
+        offsets = array("i", [0]) * (len(person_ids) + 1)
+        for i in range(len(person_ids)):
+            offsets[i + 1] = offsets[i] + degree[i]
+        fill = array("i", offsets)
+        targets = array("i", [0]) * offsets[-1]
+        edge_refs = array("i", [0]) * offsets[-1]
+        for e in range(len(edge_from)):
+            for u, v in ((edge_from[e], edge_to[e]), (edge_to[e], edge_from[e])):
+                targets[fill[u]] = v
+                edge_refs[fill[u]] = e
+                fill[u] += 1
+
+        employees = {}
+        for record in session.run(PATH_INDEX_EMPLOYMENT_QUERY):
+            person = index.get(record["person_id"])
+            if person is not None:
+                employees.setdefault(record["org_id"], {})[person] = (record["type"], record["notes"])
+
+        with self.lock:
+            self.person_ids, self.names, self.titles, self.index = person_ids, names, titles, index
+            self.orgs, self.employees = orgs, employees
+            self.offsets, self.targets, self.edge_refs = offsets, targets, edge_refs
+            self.edge_from, self.edge_to, self.edge_type, self.edge_notes = edge_from, edge_to, edge_type, edge_notes
+            self.edge_lookup = {
+                (person_ids[edge_from[e]], person_ids[edge_to[e]], SOCIAL_REL_TYPES[edge_type[e]]): e
+                for e in range(len(edge_from))
+            }
+            self.base_edges = len(edge_from)
+            self.base_people = len(person_ids)
+            self.extra = {}
+            self.removed_edges = set()
+            self.removed_people = set()
+            self.built_at = time.monotonic()
+            self.stale = False
+            changes, self.building = self.building, None
+            for change in changes:
+                self.apply_change(change)
+
+    def ensure_fresh(self):
+        # The rebuild reads Neo4j without holding self.lock, so searches go on meanwhile.
+        # A request waits for it only when there is no usable index (none built yet, or
+        # marked stale); one that is merely past PATH_INDEX_TTL uses the current index
+        # while another thread rebuilds
+        if not self.is_expired():
+            return
+        if not self.build_lock.acquire(blocking=self.stale or self.built_at is None):
+            return
+        try:
+            if self.is_expired():
+                with read_session() as session:
+                    self.build(session)
+        finally:
+            with self.lock:
+                self.building = None
+            self.build_lock.release()
+
+    def neighbours(self, u):
+        if u < self.base_people:
+            for k in range(self.offsets[u], self.offsets[u + 1]):
+                e = self.edge_refs[k]
+                if e not in self.removed_edges:
+                    yield self.targets[k], e
+        for v, e in self.extra.get(u, ()):
+            if e not in self.removed_edges:
+                yield v, e
+
+    # --- Incremental maintenance, driven by graph_changed() ---
+
+    def apply_change(self, change):
+        with self.lock:
+            if self.building is not None:
+                self.building.append(change)
+            if self.built_at is None or self.stale:
+                return
+            op = change["op"]
+            if op in ("node_added", "node_updated"):
+                self._upsert_node(change)
+            elif op == "node_deleted":
+                self._delete_node(change["id"])
+            elif op in ("rel_added", "rel_updated"):
+                self._upsert_rel(change)
+            elif op == "rel_deleted":
+                self._delete_rel(change)
+            else:
+                self.stale = True
+            overlay = len(self.removed_edges) + len(self.edge_from) - self.base_edges
+            if overlay > max(1000, self.base_edges // 10):
+                self.stale = True
+
+    def _upsert_node(self, change):
+        node_id = change["id"]
+        if change.get("type") == "Person":
+            i = self.index.get(node_id)
+            if i is None or i in self.removed_people:
+                self.index[node_id] = len(self.person_ids)
+                self.person_ids.append(node_id)
+                self.names.append(change.get("name"))
+                self.titles.append(change.get("title"))
+            else:
+                self.names[i] = change.get("name")
+                if change.get("title") is not None:
+                    self.titles[i] = change.get("title")
+        elif change.get("type") in GRAPH_GROUPS:
+            org = self.orgs.setdefault(node_id, {"title": None, "label": change["type"]})
+            org["name"] = change.get("name")
+
+    def _delete_node(self, node_id):
+        i = self.index.pop(node_id, None)
+        if i is not None:
+            self.removed_people.add(i)
+            self.removed_edges.update(e for _, e in self.neighbours(i))
+            for staff in self.employees.values():
+                staff.pop(i, None)
+        self.orgs.pop(node_id, None)
+        self.employees.pop(node_id, None)
+
+    def _upsert_rel(self, change):
+        rel_type = change["rel_type"]
+        a, b = self.index.get(change["from_id"]), self.index.get(change["to_id"])
+        if rel_type in SOCIAL_REL_TYPES and a is not None and b is not None:
+            key = (change["from_id"], change["to_id"], rel_type)
+            e = self.edge_lookup.get(key)
+            if e is not None and e not in self.removed_edges:
+                self.edge_notes[e] = change.get("notes")
+                return
+            e = len(self.edge_from)
+            self.edge_from.append(a)
+            self.edge_to.append(b)
+            self.edge_type.append(SOCIAL_REL_TYPES.index(rel_type))
+            self.edge_notes.append(change.get("notes"))
+            self.edge_lookup[key] = e
+            self.extra.setdefault(a, []).append((b, e))
+            self.extra.setdefault(b, []).append((a, e))
+        elif rel_type in EMPLOYMENT_REL_TYPES:
+            for person_id, org_id in ((change["from_id"], change["to_id"]), (change["to_id"], change["from_id"])):
+                person = self.index.get(person_id)
+                if person is not None and org_id in self.orgs:
+                    self.employees.setdefault(org_id, {})[person] = (rel_type, change.get("notes"))
+
+    def _delete_rel(self, change):
+        rel_type = change["rel_type"]
+        if rel_type in SOCIAL_REL_TYPES:
+            e = self.edge_lookup.pop((change["from_id"], change["to_id"], rel_type), None)
+            if e is not None:
+                self.removed_edges.add(e)
+        elif rel_type in EMPLOYMENT_REL_TYPES:
+            # The person may still hold the other employment type with this organisation
+            self.stale = True
+
+    # --- Search ---
+
+    def connect(self, sources, targets, max_hops=PATH_MAX_HOPS, max_paths=PATH_MAX_RESULTS):
+        # Multi-source/multi-target bidirectional BFS. Returns the shortest connections
+        # between the two sets as (node list, edge list) pairs, one per distinct
+        # (source, target) pair that meets at the minimal length
+        sources = {s for s in sources if s not in self.removed_people}
+        targets = {t for t in targets if t not in self.removed_people}
+        if not sources or not targets:
+            return []
+        common = sources & targets
+        if common:
+            return [([s], []) for s in sorted(common)[:max_paths]]
+
+        parents = ({s: None for s in sources}, {t: None for t in targets})
+        depth = [0, 0]
+        frontiers = [list(sources), list(targets)]
+        while frontiers[0] and frontiers[1] and depth[0] + depth[1] < max_hops:
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            mine, other = parents[side], parents[1 - side]
+            meetings = []
+            next_frontier = []
+            for u in frontiers[side]:
+                for v, e in self.neighbours(u):
+                    if v in self.removed_people:
+                        continue
+                    if v in other:
+                        meetings.append((u, v, e))
+                    if v not in mine:
+                        mine[v] = (u, e)
+                        next_frontier.append(v)
+            depth[side] += 1
+            frontiers[side] = next_frontier
+            if meetings:
+                return self._assemble(side, meetings, parents, max_paths)
+        return []
+
+    def bfs_from(self, sources, max_hops=PATH_MAX_HOPS):
+        # Level-synchronous BFS from a set of people; returns ({person: (parent, edge) or None}, {person: hops})
+        parents = {s: None for s in sources if s not in self.removed_people}
+        hops = dict.fromkeys(parents, 0)
+        frontier = list(parents)
+        for level in range(1, max_hops + 1):
+            next_frontier = []
+            for u in frontier:
+                for v, e in self.neighbours(u):
+                    if v not in parents and v not in self.removed_people:
+                        parents[v] = (u, e)
+                        hops[v] = level
+                        next_frontier.append(v)
+            if not next_frontier:
+                break
+            frontier = next_frontier
+        return parents, hops
+
+    def _walk(self, node, parents):
+        nodes, edges = [node], []
+        while parents[node] is not None:
+            node, e = parents[node]
+            nodes.append(node)
+            edges.append(e)
+        return nodes, edges
+
+    def _assemble(self, side, meetings, parents, max_paths):
+        # Candidates found in the same level can differ in length by the depth at which the
+        # other side first reached v; keep only the shortest ones
+        paths = []
+        for u, v, e in meetings:
+            near_nodes, near_edges = self._walk(u, parents[side])
+            far_nodes, far_edges = self._walk(v, parents[1 - side])
+            nodes = list(reversed(near_nodes)) + far_nodes
+            edges = list(reversed(near_edges)) + [e] + far_edges
+            if side == 1:
+                nodes.reverse()
+                edges.reverse()
+            paths.append((nodes, edges))
+        shortest = min(len(edges) for _, edges in paths)
+        seen = set()
+        result = []
+        for nodes, edges in paths:
+            key = (nodes[0], nodes[-1])
+            if len(edges) == shortest and key not in seen:
+                seen.add(key)
+                result.append((nodes, edges))
+                if len(result) >= max_paths:
+                    break
+        return result
+
+    # --- Result rows in the same shape as the Cypher analyses ---
+
+    def person_node(self, i):
+        return {"id": self.person_ids[i], "label": self.names[i] or self.person_ids[i], "group": "Person",
+                "title": self.titles[i] or self.names[i] or self.person_ids[i]}
+
+    def org_node(self, org_id):
+        org = self.orgs[org_id]
+        return {"id": org_id, "label": org["name"] or org_id, "group": org["label"],
+                "title": org["title"] or org["name"] or org_id}
+
+    def path_edge(self, e):
+        return {"from": self.person_ids[self.edge_from[e]], "to": self.person_ids[self.edge_to[e]],
+                "label": SOCIAL_REL_TYPES[self.edge_type[e]], "title": self.edge_notes[e] or ""}
+
+    def org_row(self, org1_id, org2_id, nodes, edges):
+        # A path between two employees wrapped in the employment edges to each organisation
+        p1, p2 = nodes[0], nodes[-1]
+        type1, notes1 = self.employees[org1_id][p1]
+        type2, notes2 = self.employees[org2_id][p2]
+        return {
+            "Path_Nodes": [self.org_node(org1_id)] + [self.person_node(n) for n in nodes] + [self.org_node(org2_id)],
+            "Path_Edges": [{"from": self.person_ids[p1], "to": org1_id, "label": type1, "title": notes1 or ""}] +
+                          [self.path_edge(e) for e in edges] +
+                          [{"from": self.person_ids[p2], "to": org2_id, "label": type2, "title": notes2 or ""}],
+        }
+
+    def org_rows(self, org1_id, org2_id):
+        with self.lock:
+            if org1_id not in self.orgs or org2_id not in self.orgs:
+                return []
+            staff1 = self.employees.get(org1_id, {})
+            staff2 = self.employees.get(org2_id, {})
+            return [self.org_row(org1_id, org2_id, nodes, edges) for nodes, edges in self.connect(staff1.keys(), staff2.keys())]
+
+    def person_rows(self, person1_id, person2_id):
+        with self.lock:
+            p1, p2 = self.index.get(person1_id), self.index.get(person2_id)
+            if p1 is None or p2 is None:
+                return []
+            return [
+                {"Path_Nodes": [self.person_node(n) for n in nodes], "Path_Edges": [self.path_edge(e) for e in edges]}
+                for nodes, edges in self.connect([p1], [p2])
+            ]
+
+    def analysis_rows(self, analysis_type, params):
+        self.ensure_fresh()
+        if analysis_type in ORG_ANALYSIS_PARAMS:
+            org1_field, org2_field = ORG_ANALYSIS_PARAMS[analysis_type]
+            return self.org_rows(params[org1_field], params[org2_field])
+        return self.person_rows(params["person1_id"], params["person2_id"])
+
+    def is_expired(self):
+        return self.stale or self.built_at is None or time.monotonic() - self.built_at > PATH_INDEX_TTL
+
+class OrgConnectivity:
+    # Organisation-to-organisation connectivity table kept by a background thread: for each
+    # pair of organisations with employees, the hop count and one bridging path between
+    # their staff. One BFS per organisation fills that organisation's row; employment
+    # changes recompute only the affected rows, while person-to-person edge changes and
+    # PathIndex rebuilds recompute everything. Lookups return None whenever the table is
+    # behind the index, so callers fall back to a live search.
+
+    def __init__(self, index):
+        self.index = index
+        self.table = {}
+        self.built_for = None
+        self.full_pending = True
+        self.dirty_orgs = set()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def on_change(self, change):
+        op, rel_type = change["op"], change.get("rel_type")
+        with self.lock:
+            if op in ("rel_added", "rel_updated", "rel_deleted") and rel_type in EMPLOYMENT_REL_TYPES:
+                self.dirty_orgs.update(
+                    node_id for node_id in (change["from_id"], change["to_id"]) if node_id in self.index.orgs
+                )
+            elif op in ("rel_added", "rel_deleted") and rel_type in SOCIAL_REL_TYPES:
+                self.full_pending = True
+            elif op in ("node_deleted", "bulk"):
+                self.full_pending = True
+            else:
+                # Renames and note edits are read from the index when a row is rendered
+                return
+        self.wakeup.set()
+
+    def run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                app.logger.exception("Organisation connectivity refresh failed")
+                time.sleep(30)
+                self.wakeup.set()
+            self.wakeup.wait(timeout=PATH_INDEX_TTL)
+            self.wakeup.clear()
+
+    def refresh(self):
+        index = self.index
+        index.ensure_fresh()
+        with self.lock:
+            full = self.full_pending or self.built_for != index.built_at
+            orgs = set(self.dirty_orgs)
+            self.full_pending = False
+            self.dirty_orgs.clear()
+        built_at = index.built_at
+        if full:
+            table = {}
+            with index.lock:
+                orgs = [org for org, staff in index.employees.items() if staff]
+        else:
+            table = {pair: path for pair, path in self.table.items() if not orgs.intersection(pair)}
+        for org in orgs:
+            self.fill_row(org, table)
+        with self.lock:
+            self.table = table
+            self.built_for = built_at
+
+    def fill_row(self, org, table):
+        # One BFS from the organisation's staff gives its distance to every other organisation
+        index = self.index
+        with index.lock:
+            staff = index.employees.get(org, {})
+            parents, hops = index.bfs_from(staff.keys())
+            for other, other_staff in index.employees.items():
+                if other == org:
+                    continue
+                reached = [person for person in other_staff if person in hops]
+                if not reached:
+                    continue
+                end = min(reached, key=hops.__getitem__)
+                nodes, edges = index._walk(end, parents)
+                nodes.reverse()
+                edges.reverse()
+                # Stored oriented from the lexically smaller organisation id
+                if org < other:
+                    table[(org, other)] = (nodes, edges)
+                else:
+                    table[(other, org)] = (nodes[::-1], edges[::-1])
+
+    def lookup(self, org1_id, org2_id):
+        # Rows for the pair from the table, [] when they are not connected, or None when stale
+        self.start()
+        index = self.index
+        with self.lock:
+            fresh = (not self.full_pending and not self.dirty_orgs and not index.is_expired()
+                     and self.built_for == index.built_at)
+            table = self.table
+        if not fresh:
+            return None
+        with index.lock:
+            if org1_id not in index.orgs or org2_id not in index.orgs:
+                return []
+            if org1_id == org2_id:
+                return index.org_rows(org1_id, org2_id)
+            key = (org1_id, org2_id) if org1_id < org2_id else (org2_id, org1_id)
+            if key not in table:
+                return []
+            nodes, edges = table[key]
+            if key[0] != org1_id:
+                nodes, edges = nodes[::-1], edges[::-1]
+            return [index.org_row(org1_id, org2_id, nodes, edges)]
+
+path_index = PathIndex()
+org_connectivity = OrgConnectivity(path_index)
+if PATH_ENGINE_ENABLED or ORG_CONNECTIVITY_ENABLED:
+    GRAPH_LISTENERS.append(path_index.apply_change)
+if ORG_CONNECTIVITY_ENABLED:
+    GRAPH_LISTENERS.append(org_connectivity.on_change)
+
+# Live shortest-path Cypher per analysis type, used when no in-process index answers it
+# The organisation analyses run one shortestPath per pair of employees, so they take the
+# pairs to try as $pairs ([person id, person id] lists) and are run in batches by PathSearch
+def network_analysis_queries(path_function):
+    # The network analysis queries with `path_function` (shortestPath or allShortestPaths)
+    # as the path search between the two employees
+    return {
+        "gov_company": f"""
+            UNWIND $pairs AS pair
+            MATCH (gov:`Government Body` {{id: $government_id}})
+            MATCH (comp:Company {{id: $company_id}})
+            MATCH (p1:Person {{id: pair[0]}})-[:employed|formerly_employed]-(gov)
+            MATCH (p2:Person {{id: pair[1]}})-[:employed|formerly_employed]-(comp)
+            MATCH path = {path_function}((p1)-[:knows|works_with*0..6]-(p2))
+            WHERE all(n IN nodes(path)[1..-2] WHERE "Person" IN labels(n))
+            RETURN
+                [{{id: gov.id, label: coalesce(gov.name, gov.id), group: head(labels(gov)), title: coalesce(gov.title, gov.name, gov.id)}}] +
+                [n IN nodes(path) | {{id: n.id, label: coalesce(n.name, n.id), group: head(labels(n)), title: coalesce(n.title, n.name, n.id)}}] +
+                [{{id: comp.id, label: coalesce(comp.name, comp.id), group: head(labels(comp)), title: coalesce(comp.title, comp.name, comp.id)}}] AS Path_Nodes,
+                [{{from: p1.id, to: gov.id, label: 'employed', title: ''}}] +
+                [r IN relationships(path) | {{from: startNode(r).id, to: endNode(r).id, label: type(r), title: coalesce(r.notes, '')}}] +
+                [{{from: p2.id, to: comp.id, label: 'employed', title: ''}}] AS Path_Edges
+        """,
+        "company_company": f"""
+            UNWIND $pairs AS pair
+            MATCH (c1:Company {{id: $company1_id}})
+            MATCH (c2:Company {{id: $company2_id}})
+            MATCH (p1:Person {{id: pair[0]}})-[r1:employed|formerly_employed]-(c1)
+            MATCH (p2:Person {{id: pair[1]}})-[r2:employed|formerly_employed]-(c2)
+            MATCH path = {path_function}((p1)-[:knows|works_with*0..6]-(p2))
+            WHERE all(n IN nodes(path)[1..-2] WHERE "Person" IN labels(n))
+            RETURN
+                [{{id: c1.id, label: coalesce(c1.name, c1.id), group: head(labels(c1)), title: coalesce(c1.title, c1.name, c1.id)}}] +
+                [n IN nodes(path) | {{id: n.id, label: coalesce(n.name, n.id), group: head(labels(n)), title: coalesce(n.title, n.name, n.id)}}] +
+                [{{id: c2.id, label: coalesce(c2.name, c2.id), group: head(labels(c2)), title: coalesce(c2.title, c2.name, c2.id)}}] AS Path_Nodes,
+                [{{from: p1.id, to: c1.id, label: type(r1), title: coalesce(r1.notes, '')}}] +
+                [r IN relationships(path) | {{from: startNode(r).id, to: endNode(r).id, label: type(r), title: coalesce(r.notes, '')}}] +
+                [{{from: p2.id, to: c2.id, label: type(r2), title: coalesce(r2.notes, '')}}] AS Path_Edges
+        """,
+        "gov_gov": f"""
+            UNWIND $pairs AS pair
+            MATCH (g1:`Government Body` {{id: $government1_id}})
+            MATCH (g2:`Government Body` {{id: $government2_id}})
+            MATCH (p1:Person {{id: pair[0]}})-[r1:employed|formerly_employed]-(g1)
+            MATCH (p2:Person {{id: pair[1]}})-[r2:employed|formerly_employed]-(g2)
+            MATCH path = {path_function}((p1)-[:knows|works_with*0..6]-(p2))
+            WHERE all(n IN nodes(path)[1..-2] WHERE "Person" IN labels(n))
+            RETURN
+                [{{id: g1.id, label: coalesce(g1.name, g1.id), group: head(labels(g1)), title: coalesce(g1.title, g1.name, g1.id)}}] +
+                [n IN nodes(path) | {{id: n.id, label: coalesce(n.name, n.id), group: head(labels(n)), title: coalesce(n.title, n.name, n.id)}}] +
+                [{{id: g2.id, label: coalesce(g2.name, g2.id), group: head(labels(g2)), title: coalesce(g2.title, g2.name, g2.id)}}] AS Path_Nodes,
+                [{{from: p1.id, to: g1.id, label: type(r1), title: coalesce(r1.notes, '')}}] +
+                [r IN relationships(path) | {{from: startNode(r).id, to: endNode(r).id, label: type(r), title: coalesce(r.notes, '')}}] +
+                [{{from: p2.id, to: g2.id, label: type(r2), title: coalesce(r2.notes, '')}}] AS Path_Edges
+        """,
+        "person_person": f"""
+            MATCH (p1:Person {{id: $person1_id}})
+            MATCH (p2:Person {{id: $person2_id}})
+            MATCH path = {path_function}((p1)-[:knows|works_with*0..6]-(p2))
+            WHERE all(n IN nodes(path)[1..-2] WHERE "Person" IN labels(n))
+            RETURN
+                [n IN nodes(path) | {{id: n.id, label: coalesce(n.name, n.id), group: head(labels(n)), title: coalesce(n.title, n.name, n.id)}}] AS Path_Nodes,
+                [r IN relationships(path) | {{from: startNode(r).id, to: endNode(r).id, label: type(r), title: coalesce(r.notes, '')}}] AS Path_Edges
+        """,
+    }
+
+NETWORK_ANALYSIS_QUERIES = network_analysis_queries("shortestPath")
+# Used by the all_shortest and k_shortest result modes
+NETWORK_ALL_SHORTEST_QUERIES = network_analysis_queries("allShortestPaths")
+NETWORK_ANALYSIS_FORM_FIELDS = {
+    "gov_company": {"government_id": "selected_gov", "company_id": "selected_company"},
+    "company_company": {"company1_id": "selected_company1", "company2_id": "selected_company2"},
+    "gov_gov": {"government1_id": "selected_gov1", "government2_id": "selected_gov2"},
+}
+
+# Result modes: "pairs" keeps one shortest connection per endpoint pair, in the order
+# found. "all_shortest" and "k_shortest" run allShortestPaths instead and rank the distinct
+# connections (by node sequence) by hops, then by the summed NETWORK_EDGE_WEIGHTS of their
+# edges, where closer ties weigh less; "k_shortest" keeps the best `top_k`
+NETWORK_PATH_MODES = ("pairs", "all_shortest", "k_shortest")
+NETWORK_TOP_K = int(os.getenv("NETWORK_TOP_K", "10"))
+NETWORK_MAX_TOP_K = 100
+NETWORK_EDGE_WEIGHTS = {"works_with": 1.0, "employed": 1.0, "knows": 1.5, "formerly_employed": 2.0}
+NETWORK_DEFAULT_EDGE_WEIGHT = 2.0
+
+def ranked_paths_available(analysis_type):
+    # The ranked modes need the live Cypher search; the path engine and the connectivity
+    # table keep only one path per pair
+    if PATH_ENGINE_ENABLED:
+        return False
+    return not (ORG_CONNECTIVITY_ENABLED and analysis_type in ORG_ANALYSIS_PARAMS)
+
+def compact_paths(rows, mode, top_k):
+    # Path rows as {"nodes": [...], "edges": [...], "paths": [{"nodes", "edges", "hops",
+    # "weight"}]}: every node and edge stored once, and paths as positions in those lists
+    nodes, node_index, edges, edge_index = [], {}, [], {}
+    paths, seen = [], set()
+    for row in rows:
+        path_nodes, path_edges = row["Path_Nodes"] or [], row["Path_Edges"] or []
+        key = tuple(node["id"] for node in path_nodes)
+        if mode != "pairs":
+            if key in seen:
+                continue
+            seen.add(key)
+        path = {"nodes": [], "edges": [], "hops": len(path_edges),
+                "weight": sum(NETWORK_EDGE_WEIGHTS.get(edge["label"], NETWORK_DEFAULT_EDGE_WEIGHT)
+                              for edge in path_edges)}
+        for node in path_nodes:
+            if node["id"] not in node_index:
+                node_index[node["id"]] = len(nodes)
+                nodes.append(node)
+            path["nodes"].append(node_index[node["id"]])
+        for edge in path_edges:
+            edge_key = (edge["from"], edge["to"], edge["label"])
+            if edge_key not in edge_index:
+                edge_index[edge_key] = len(edges)
+                edges.append(edge)
+            path["edges"].append(edge_index[edge_key])
+        paths.append(path)
+    if mode != "pairs":
+        paths.sort(key=lambda path: (path["hops"], path["weight"]))
+        if mode == "k_shortest":
+            paths = paths[:top_k]
+    return {"nodes": nodes, "edges": edges, "paths": paths}
+
+def compact_analysis_results(context):
+    # Swap the path rows in a finished analysis context for the compact payload
+    if context["columns"] == ["Path_Nodes", "Path_Edges"]:
+        context["paths"] = compact_paths(context["results"], context["path_mode"], context["top_k"])
+        context["results"] = context["paths"]["paths"]
+
+def plan_network_analysis(form):
+    # Template context for a submitted analysis form, plus the query and parameters to run.
+    # The query is "" when there is nothing to run (the context then carries an error)
+    context = {
+        "results": None,
+        "columns": [],
+        "analysis_type": form.get("analysis_type", "gov_company"),
+        "selected_company": None, "selected_company1": None, "selected_company2": None,
+        "selected_gov": None, "selected_gov1": None, "selected_gov2": None,
+        "selected_person1_name": None, "selected_person2_name": None,
+        "include_companies": form.get("include_companies") == "on",
+        "partial": None,
+        "path_mode": form.get("path_mode") if form.get("path_mode") in NETWORK_PATH_MODES else "pairs",
+        "top_k": NETWORK_TOP_K,
+        "paths": None,
+        "ranked_types": [kind for kind in NETWORK_ANALYSIS_QUERIES if ranked_paths_available(kind)],
+    }
+    if str(form.get("top_k", "")).isdigit():
+        context["top_k"] = max(1, min(int(form["top_k"]), NETWORK_MAX_TOP_K))
+    analysis_type = context["analysis_type"]
+    cypher = ""
+    params = {}
+
+    if analysis_type in NETWORK_ANALYSIS_FORM_FIELDS:
+        for field, selected in NETWORK_ANALYSIS_FORM_FIELDS[analysis_type].items():
+            params[field] = context[selected] = form.get(field)
+        cypher = NETWORK_ANALYSIS_QUERIES[analysis_type]
+
+    elif analysis_type == "person_person":
+        person1_input = form.get("person1_name", "").strip()
+        person2_input = form.get("person2_name", "").strip()
+        context["selected_person1_name"] = person1_input
+        context["selected_person2_name"] = person2_input
+
+        def extract_id(val):
+            match = re.match(r".*\[([^\[\]]+)\]$", val)
+            if match:
+                return match.group(1)
+            return None
+
+        person1_id = extract_id(person1_input)
+        person2_id = extract_id(person2_input)
+
+        if not person1_id and person1_input:
+            person1_id = search_index("people").exact(person1_input)
+        if not person2_id and person2_input:
+            person2_id = search_index("people").exact(person2_input)
+
+        if person1_id and person2_id:
+            cypher = NETWORK_ANALYSIS_QUERIES["person_person"]
+            params = {"person1_id": person1_id, "person2_id": person2_id}
+        else:
+            context["results"] = [{"Error": "One or both persons not found."}]
+            context["columns"] = ["Error"]
+
+    if cypher and context["path_mode"] != "pairs":
+        if not ranked_paths_available(analysis_type):
+            context["results"] = [{"Error": "Ranked path modes are not available while the path engine "
+                                            "or the connectivity table answers this analysis."}]
+            context["columns"] = ["Error"]
+            return context, "", params
+        cypher = NETWORK_ALL_SHORTEST_QUERIES[analysis_type]
+    return context, cypher, params
+
+# Work limits for the live Cypher searches. An organisation analysis tries at most
+# NETWORK_MAX_PAIRS employee pairs, best-connected employees first, in batches of
+# NETWORK_PAIR_BATCH, and each analysis gets a time budget that every transaction is
+# bounded by (NETWORK_ANALYSIS_TIMEOUT, or NETWORK_ANALYSIS_TIMEOUT_<TYPE> per type).
+# When a limit is hit the paths found so far are returned, marked as partial.
+NETWORK_ANALYSIS_TIMEOUT = float(os.getenv("NETWORK_ANALYSIS_TIMEOUT", "10"))
+NETWORK_ANALYSIS_TIMEOUTS = {
+    analysis_type: float(os.getenv(f"NETWORK_ANALYSIS_TIMEOUT_{analysis_type.upper()}", NETWORK_ANALYSIS_TIMEOUT))
+    for analysis_type in NETWORK_ANALYSIS_QUERIES
+}
+NETWORK_MAX_PAIRS = int(os.getenv("NETWORK_MAX_PAIRS", "2500"))
+NETWORK_PAIR_BATCH = 100
+NETWORK_ENDPOINT_LABELS = {
+    "gov_company": ("Government Body", "Company"),
+    "company_company": ("Company", "Company"),
+    "gov_gov": ("Government Body", "Government Body"),
+}
+# An organisation's employees, most connected first
+NETWORK_ENDPOINTS_QUERY = """
+    MATCH (p:Person)-[:employed|formerly_employed]-(org:`{label}` {{id: $id}})
+    WITH DISTINCT p
+    RETURN p.id AS id, COUNT {{ (p)-[:knows|works_with]-() }} AS degree
+    ORDER BY degree DESC, id
+"""
+# Budget-exceeded events by (analysis type, reason), exported at /metrics
+path_budget_events = {}
+
+def top_pairs(left, right, limit):
+    # Up to `limit` (left id, right id) pairs with the largest combined degree, best first,
+    # from two lists of {"id", "degree"} rows sorted by degree descending
+    if not left or not right:
+        return []
+    heap = [(-(left[0]["degree"] + right[0]["degree"]), 0, 0)]
+    seen = {(0, 0)}
+    pairs = []
+    while heap and len(pairs) < limit:
+        _, i, j = heapq.heappop(heap)
+        pairs.append([left[i]["id"], right[j]["id"]])
+        for a, b in ((i + 1, j), (i, j + 1)):
+            if a < len(left) and b < len(right) and (a, b) not in seen:
+                seen.add((a, b))
+                heapq.heappush(heap, (-(left[a]["degree"] + right[b]["degree"]), a, b))
+    return pairs
+
+def is_timeout(error):
+    return isinstance(error, Neo4jError) and "TransactionTimedOut" in (error.code or "")
+
+class PathSearch:
+    # One live /network-analysis search under its budget. The caller runs the queries it
+    # hands out (endpoint_queries, then batches) with timeout() as the transaction
+    # timeout, feeds the rows back, and stops when running() turns false or a
+    # transaction times out (timed_out). Sync and async routes share it that way.
+    def __init__(self, analysis_type, cypher, params):
+        self.analysis_type = analysis_type
+        self.cypher = cypher
+        self.params = params
+        self.deadline = time.monotonic() + NETWORK_ANALYSIS_TIMEOUTS[analysis_type]
+        self.results = []
+        self.exceeded = None
+        self.pair_count = 0
+
+    def timeout(self):
+        return max(self.deadline - time.monotonic(), 0.001)
+
+    def running(self):
+        if time.monotonic() >= self.deadline:
+            self.exceeded = "timeout"
+        return self.exceeded != "timeout"
+
+    def timed_out(self):
+        self.exceeded = "timeout"
+
+    def endpoint_queries(self):
+        if self.analysis_type not in ORG_ANALYSIS_PARAMS:
+            return []
+        return [(NETWORK_ENDPOINTS_QUERY.format(label=label), {"id": self.params[field]})
+                for label, field in zip(NETWORK_ENDPOINT_LABELS[self.analysis_type],
+                                        ORG_ANALYSIS_PARAMS[self.analysis_type])]
+
+    def batches(self, endpoints):
+        # (cypher, params) reads for the path queries, given the endpoint_queries rows
+        if self.analysis_type not in ORG_ANALYSIS_PARAMS:
+            return [(self.cypher, self.params)]
+        left, right = endpoints
+        pairs = top_pairs(left, right, NETWORK_MAX_PAIRS)
+        self.pair_count = len(left) * len(right)
+        if self.pair_count > len(pairs):
+            self.exceeded = "pairs"
+        return [(self.cypher, dict(self.params, pairs=pairs[start:start + NETWORK_PAIR_BATCH]))
+                for start in range(0, len(pairs), NETWORK_PAIR_BATCH)]
+
+    def add(self, rows):
+        self.results.extend(rows)
+
+    def finish(self):
+        # (results shortest first, partial-result message or None)
+        self.results.sort(key=lambda row: len(row["Path_Edges"] or []))
+        if self.exceeded is None:
+            return self.results, None
+        key = (self.analysis_type, self.exceeded)
+        path_budget_events[key] = path_budget_events.get(key, 0) + 1
+        app.logger.warning("Network analysis %s %s budget exceeded: %s", self.analysis_type, self.exceeded,
+                           self.params)
+        if self.exceeded == "pairs":
+            message = f"Partial result: searched the {NETWORK_MAX_PAIRS} best-connected of {self.pair_count} employee pairs."
+        else:
+            message = (f"Partial result: the search stopped after "
+                       f"{NETWORK_ANALYSIS_TIMEOUTS[self.analysis_type]:g} seconds; these are the paths found so far.")
+        return self.results, message
+
+def path_budget_metric_lines():
+    lines = [
+        "# HELP network_analysis_budget_exceeded_total Live path searches cut short, by limit hit",
+        "# TYPE network_analysis_budget_exceeded_total counter",
+    ]
+    lines.extend(f'network_analysis_budget_exceeded_total{{analysis="{analysis_type}",reason="{reason}"}} {count}'
+                 for (analysis_type, reason), count in sorted(path_budget_events.items()))
+    return lines
+
+METRICS_COLLECTORS.append(path_budget_metric_lines)
+
+def timed_read(query, params, timeout):
+    # Rows of a read-only query in a managed read transaction that Neo4j aborts after
+    # `timeout` seconds
+    @unit_of_work(timeout=timeout)
+    def work(tx):
+        return result_table(tx.run(query, params))[1]
+
+    with driver.session() as session:
+        return session.execute_read(work)
+
+def search_paths(analysis_type, cypher, params):
+    # (results, partial-result message or None) of a live Cypher search, within its budget
+    search = PathSearch(analysis_type, cypher, params)
+    try:
+        endpoints = [timed_read(query, query_params, search.timeout())
+                     for query, query_params in search.endpoint_queries()]
+        for query, query_params in search.batches(endpoints):
+            if not search.running():
+                break
+            search.add(timed_read(query, query_params, search.timeout()))
+    except Neo4jError as e:
+        if not is_timeout(e):
+            raise
+        search.timed_out()
+    return search.finish()
+
+def indexed_paths(analysis_type, params):
+    # (results, columns) from the connectivity table or the path engine, or None when the
+    # live Cypher has to run
+    if ORG_CONNECTIVITY_ENABLED and analysis_type in ORG_ANALYSIS_PARAMS:
+        org1_field, org2_field = ORG_ANALYSIS_PARAMS[analysis_type]
+        results = org_connectivity.lookup(params[org1_field], params[org2_field])
+        if results is not None:
+            return results, ["Path_Nodes", "Path_Edges"]
+    if PATH_ENGINE_ENABLED:
+        try:
+            return path_index.analysis_rows(analysis_type, params), ["Path_Nodes", "Path_Edges"]
+        except Exception as e:
+            return [{"Error": str(e)}], ["Error"]
+    return None
+
+@app.route("/network-analysis", methods=["GET", "POST"])
+def network_analysis():
+    companies, _ = entity_catalog("companies")
+    governments, _ = entity_catalog("governments")
+    context, cypher, params = plan_network_analysis(request.form if request.method == "POST" else {})
+
+    if request.method == "POST" and cypher:
+        indexed = indexed_paths(context["analysis_type"], params)
+        if indexed is not None:
+            context["results"], context["columns"] = indexed
+        else:
+            try:
+                context["results"], context["partial"] = search_paths(context["analysis_type"], cypher, params)
+                context["columns"] = ["Path_Nodes", "Path_Edges"]
+            except Exception as e:
+                context["results"] = [{"Error": str(e)}]
+                context["columns"] = ["Error"]
+        compact_analysis_results(context)
+
+    return render_template("network_analysis.html", companies=companies, governments=governments, **context)
+
+# Graph analytics: degree, PageRank, betweenness and communities for every entity node,
+# computed in bulk with numpy on a snapshot of the graph, written back as node properties
+# (degree, pagerank, betweenness, community) and served from memory
+ANALYTICS_ENABLED = np is not None and os.getenv("ANALYTICS", "1") == "1"
+ANALYTICS_TTL = int(os.getenv("ANALYTICS_TTL", "900"))
+# Brandes sources sampled for betweenness; graphs with no more nodes than this get exact values
+ANALYTICS_BETWEENNESS_SAMPLES = int(os.getenv("ANALYTICS_BETWEENNESS_SAMPLES", "256"))
+# Off by default on web workers, where every worker would write the same values; the
+# `flask compute-analytics` command writes them back
+ANALYTICS_WRITE_BACK = os.getenv("ANALYTICS_WRITE_BACK", "0") == "1"
+ANALYTICS_WRITE_BATCH = 5000
+ANALYTICS_MAX_LIMIT = 200
+ANALYTICS_METRICS = ("degree", "pagerank", "betweenness")
+PAGERANK_DAMPING = 0.85
+PAGERANK_TOLERANCE = 1e-10
+LABEL_PROPAGATION_ROUNDS = 30
+
+ANALYTICS_WRITE_QUERIES = {
+    label: f"""
+        UNWIND $rows AS row
+        MATCH (n:`{label}` {{id: row.id}})
+        SET n.degree = row.degree, n.pagerank = row.pagerank,
+            n.betweenness = row.betweenness, n.community = row.community
+    """
+    for label in ENTITY_LABELS
+}
+
+def undirected_pairs(n, src, dst):
+    # Distinct unordered node pairs without self loops, as (low, high) index arrays
+    low, high = np.minimum(src, dst), np.maximum(src, dst)
+    keys = np.unique(low[low != high] * n + high[low != high])
+    return keys // n, keys % n
+
+def pagerank(n, src, dst):
+    # Power iteration over the directed edges; rank of nodes without out-edges is spread evenly
+    out_degree = np.bincount(src, minlength=n)
+    share = 1.0 / np.maximum(out_degree, 1)
+    dangling = out_degree == 0
+    if n == 0:
+        return np.zeros(0)
+    rank = np.full(n, 1.0 / n)
+    for _ in range(100):
+        flow = np.bincount(dst, weights=(rank * share)[src], minlength=n)
+        updated = (1 - PAGERANK_DAMPING) / n + PAGERANK_DAMPING * (flow + rank[dangling].sum() / n)
+        converged = np.abs(updated - rank).sum() < PAGERANK_TOLERANCE
+        rank = updated
+        if converged:
+            break
+    return rank
+
+def source_dependencies(offsets, targets, source):
+    # Brandes' dependency of `source` on every other node, one BFS level at a time:
+    # shortest-path counts forward, then dependencies back over the same level edges
+    n = len(offsets) - 1
+    dist = np.full(n, -1, dtype=np.int64)
+    dist[source] = 0
+    paths = np.zeros(n)
+    paths[source] = 1
+    frontier = np.array([source])
+    levels = []
+    level = 0
+    while frontier.size:
+        level += 1
+        heads, tails = frontier_edges(offsets, targets, frontier)
+        dist[tails[dist[tails] < 0]] = level
+        forward = dist[tails] == level
+        heads, tails = heads[forward], tails[forward]
+        np.add.at(paths, tails, paths[heads])
+        levels.append((heads, tails))
+        frontier = np.unique(tails)
+    dependency = np.zeros(n)
+    for heads, tails in reversed(levels):
+        np.add.at(dependency, heads, paths[heads] / paths[tails] * (1 + dependency[tails]))
+    dependency[source] = 0
+    return dependency
+
+def betweenness(offsets, targets, samples, seed=0):
+    # Normalised betweenness; estimated from `samples` random sources on larger graphs
+    n = len(offsets) - 1
+    if n < 3:
+        return np.zeros(n), n
+    if n <= samples:
+        sources = np.arange(n)
+    else:
+        sources = np.random.default_rng(seed).choice(n, samples, replace=False)
+    total = np.zeros(n)
+    for source in sources:
+        total += source_dependencies(offsets, targets, source)
+    # Undirected: each pair is counted from both ends
+    return total * (n / len(sources)) / ((n - 1) * (n - 2)), len(sources)
+
+def label_propagation(n, low, high, seed=0):
+    # Communities by semi-synchronous label propagation: each round a random half of the
+    # nodes takes the most common label among its neighbours (ties to the smallest label).
+    # Returns community numbers ordered by size, largest first
+    heads = np.concatenate([low, high])
+    tails = np.concatenate([high, low])
+    labels = np.arange(n)
+    rng = np.random.default_rng(seed)
+    for _ in range(LABEL_PROPAGATION_ROUNDS):
+        keys, counts = np.unique(heads * n + labels[tails], return_counts=True)
+        node, label = keys // n, keys % n
+        order = np.lexsort((label, -counts, node))
+        node, label = node[order], label[order]
+        first = np.ones(len(node), dtype=bool)
+        first[1:] = node[1:] != node[:-1]
+        best = labels.copy()
+        best[node[first]] = label[first]
+        if (best == labels).all():
+            break
+        update = rng.random(n) < 0.5
+        labels[update] = best[update]
+    _, community, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+    rank = np.empty(len(sizes), dtype=np.int64)
+    rank[np.argsort(-sizes, kind="stable")] = np.arange(len(sizes))
+    return rank[community]
+
+def graph_metrics(ids, labels, names, src, dst, rel_types):
+    # Per-node rows plus graph-level summaries for one snapshot
+    started = time.monotonic()
+    n = len(ids)
+    low, high = undirected_pairs(n, src, dst)
+    offsets, targets = csr_adjacency(n, low, high)
+    in_degree = np.bincount(dst, minlength=n)
+    out_degree = np.bincount(src, minlength=n)
+    rank = pagerank(n, src, dst)
+    between, sources = betweenness(offsets, targets, ANALYTICS_BETWEENNESS_SAMPLES)
+    community = label_propagation(n, low, high)
+
+    # Brokers: people employed (now or formerly) by both a company and a government body
+    employment = np.isin(np.array(rel_types, dtype=object), EMPLOYMENT_REL_TYPES).astype(bool)
+    targets_label = np.array(labels, dtype=object)[dst]
+    companies = np.bincount(src[employment & (targets_label == "Company")], minlength=n)
+    governments = np.bincount(src[employment & (targets_label == "Government Body")], minlength=n)
+    # Distinct communities among each node's neighbours
+    spanned = np.bincount(np.unique(np.concatenate([low, high]) * n + community[np.concatenate([high, low])]) // n,
+                          minlength=n)
+
+    nodes = {}
+    for i, node_id in enumerate(ids):
+        nodes[node_id] = {
+            "id": node_id,
+            "name": names[i],
+            "type": labels[i],
+            "degree": int(in_degree[i] + out_degree[i]),
+            "in_degree": int(in_degree[i]),
+            "out_degree": int(out_degree[i]),
+            "pagerank": float(rank[i]),
+            "betweenness": float(between[i]),
+            "community": int(community[i]),
+            "communities_spanned": int(spanned[i]),
+        }
+        if labels[i] == "Person":
+            nodes[node_id].update(companies=int(companies[i]), government_bodies=int(governments[i]))
+    ranked = {metric: [ids[i] for i in np.argsort(-values, kind="stable")] for metric, values in
+              (("degree", in_degree + out_degree), ("pagerank", rank), ("betweenness", between))}
+    brokers = [node_id for node_id in ranked["betweenness"]
+               if nodes[node_id].get("companies") and nodes[node_id].get("government_bodies")]
+    summary = {
+        "nodes": n,
+        "edges": len(src),
+        "communities": int(community.max()) + 1 if n else 0,
+        "betweenness_sources": sources,
+        "betweenness_exact": sources == n,
+        "seconds": round(time.monotonic() - started, 2),
+    }
+    return nodes, ranked, brokers, summary
+
+class GraphAnalytics:
+    # Results of graph_metrics kept by a background thread. Like the layout, a refresh is
+    # scheduled on this worker's writes and at least every ANALYTICS_TTL seconds, so
+    # other workers' writes show up too; requests always read the last finished run.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.results = None
+        self.version = None
+        self.computed_at = None
+        self.wakeup = threading.Event()
+        self.thread = None
+        # id -> the values last written back by this process
+        self.written = {}
 
-    # For queries that require 'identifier'
-    if "identifier" in query_info["params"]:
-        if not identifier:
-            return "Missing identifier parameter.", 400
-        params["identifier"] = identifier
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
 
-    # If you add queries with other params, handle them here
+    def current(self):
+        # (results, status) of the last run, or (None, None) before the first one finishes
+        self.start()
+        with self.lock:
+            results, version, computed_at = self.results, self.version, self.computed_at
+        if version != graph_version or computed_at is None or time.monotonic() - computed_at > ANALYTICS_TTL:
+            self.wakeup.set()
+        if results is None:
+            return None, None
+        status = dict(results["summary"], version=version, current=version == graph_version,
+                      computed_at=results["computed_at"])
+        return results, status
 
-    with driver.session() as session:
-        try:
-            result = session.run(query_info["cypher"], **params)
-            columns = result.keys()
-            results = [dict(record) for record in result]
-        except Exception as e:
-            # Render error if query fails
-            return render_template("results.html", title="Query Error", results=[[str(e)]], columns=["Error"])
+    def on_change(self, change):
+        self.wakeup.set()
 
-    return render_template("results.html", title=query_info["description"], results=results, columns=columns)
+    def run(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            try:
+                self.refresh(write_back=ANALYTICS_WRITE_BACK)
+            except Exception:
+                app.logger.exception("Graph analytics refresh failed")
+            # Analytics are heavier than the layout, so bursts of writes are coalesced longer
+            time.sleep(60)
 
-@app.route("/schema-data")
-def schema_data():
-    # Return a static schema graph (node types and relationship types)
-    nodes = [
-        {"id": "Person", "label": "Person", "group": "Person"},
-        {"id": "Company", "label": "Company", "group": "Company"},
-        {"id": "GovernmentBody", "label": "Government Body", "group": "GovernmentBody"},
-    ]
-    edges = [
-        {"from": "Person", "to": "Person", "label": "knows"},
-        {"from": "Person", "to": "Person", "label": "works_with"},
-        {"from": "Person", "to": "Company", "label": "formerly_employed"},
-        {"from": "Person", "to": "Company", "label": "employed"},
-        {"from": "Company", "to": "Company", "label": "contracts"},
-        {"from": "Company", "to": "Company", "label": "known_collaborator"},
-        {"from": "Person", "to": "GovernmentBody", "label": "formerly_employed"},
-        {"from": "Person", "to": "GovernmentBody", "label": "employed"},
-        {"from": "GovernmentBody", "to": "Company", "label": "contracts"},
-        {"from": "GovernmentBody", "to": "GovernmentBody", "label": "known_collaborator"},
-    ]
-    return jsonify({"nodes": nodes, "edges": edges})
+    def refresh(self, write_back=False):
+        version = graph_version
+        nodes, ranked, brokers, summary = graph_metrics(*graph_snapshot())
+        communities = {}
+        for node_id in ranked["pagerank"]:
+            communities.setdefault(nodes[node_id]["community"], []).append(node_id)
+        results = {
+            "nodes": nodes,
+            "ranked": ranked,
+            "brokers": brokers,
+            "communities": communities,
+            "summary": summary,
+            "computed_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+        with self.lock:
+            self.results = results
+            self.version = version
+            self.computed_at = time.monotonic()
+        app.logger.info("Graph analytics for version %s: %d nodes in %.1fs",
+                        version, summary["nodes"], summary["seconds"])
+        if write_back:
+            self.write_back(nodes)
+        return summary
 
-@app.route("/full-graph")
-def full_graph():
-    # Return the full graph (all nodes and relationships)
-    nodes = []
-    edges = []
-    seen_nodes = set()
-    with driver.session() as session:
-        # Person nodes
-        for record in session.run("MATCH (p:Person) RETURN p.id AS id, p.name AS name, p.title AS title"):
-            if record["id"] not in seen_nodes:
-                nodes.append({
-                    "id": record["id"],
-                    "label": record["name"],
-                    "group": "Person",
-                    "title": record["title"] or ""
-                })
-                seen_nodes.add(record["id"])
-        # Company nodes
-        for record in session.run("MATCH (c:Company) RETURN c.id AS id, c.name AS name"):
-            if record["id"] not in seen_nodes:
-                nodes.append({
-                    "id": record["id"],
-                    "label": record["name"],
-                    "group": "Company",
-                    "title": f"ID: {record['id']}"
-                })
-                seen_nodes.add(record["id"])
-        # Government Body nodes
-        for record in session.run("MATCH (g:`Government Body`) RETURN g.id AS id, g.name AS name"):
-            if record["id"] not in seen_nodes:
-                nodes.append({
-                    "id": record["id"],
-                    "label": record["name"],
-                    "group": "GovernmentBody",
-                    "title": f"ID: {record['id']}"
-                })
-                seen_nodes.add(record["id"])
-        # Relationships
-        for record in session.run("""
-            MATCH (a)-[r]->(b)
-            RETURN a.id AS from_id, b.id AS to_id, type(r) AS label, r.notes AS title
-        """):
-            edges.append({
-                "from": record["from_id"],
-                "to": record["to_id"],
-                "label": record["label"],
-                "title": record.get("title", ""),
-                "arrows": "to"
-            })
-    return jsonify({"nodes": nodes, "edges": edges})
+    def write_back(self, nodes):
+        # Batched SETs per label, through the id uniqueness constraints, of the nodes whose
+        # values differ from what this process last wrote. Not a graph change: no listener
+        # cares about these properties
+        by_label = {}
+        for node in nodes.values():
+            row = {
+                "id": node["id"],
+                "degree": node["degree"],
+                "pagerank": node["pagerank"],
+                "betweenness": node["betweenness"],
+                "community": node["community"],
+            }
+            if self.written.get(node["id"]) != row:
+                by_label.setdefault(node["type"], []).append(row)
+        for label, rows in by_label.items():
+            for start in range(0, len(rows), ANALYTICS_WRITE_BATCH):
+                batch = rows[start:start + ANALYTICS_WRITE_BATCH]
+                write_query(ANALYTICS_WRITE_QUERIES[label], rows=batch)
+                self.written.update((row["id"], row) for row in batch)
 
-@app.route("/graph")
-def graph_view():
-    # Render the full graph visualization page
-    return render_template("full_graph.html")
+graph_analytics = GraphAnalytics()
+if ANALYTICS_ENABLED:
+    GRAPH_LISTENERS.append(graph_analytics.on_change)
 
-@app.route("/schema")
-def schema_view():
-    # Render the schema visualization page
-    return render_template("schema.html")
+def analytics_results():
+    # (results, status, error response) for the analytics routes
+    if not ANALYTICS_ENABLED:
+        return None, None, (jsonify({"error": "Analytics are disabled (set ANALYTICS=1 and install numpy)"}), 404)
+    results, status = graph_analytics.current()
+    if results is None:
+        return None, None, (jsonify({"error": "Analytics are still being computed"}), 503)
+    return results, status, None
 
-@app.route("/network-analysis", methods=["GET", "POST"])
-def network_analysis():
-    results = None
-    columns = []
-    analysis_type = request.form.get("analysis_type", "gov_company")
-    selected_company = selected_company1 = selected_company2 = None
-    selected_gov = selected_gov1 = selected_gov2 = None
-    selected_person1_name = selected_person2_name = None
-    include_companies = request.form.get("include_companies") == "on"
+def analytics_limit():
+    return max(1, min(request.args.get("limit", 20, type=int), ANALYTICS_MAX_LIMIT))
 
-    with driver.session() as session:
-        companies = [dict(record) for record in session.run("MATCH (c:Company) RETURN c.id AS id, c.name AS name")]
-        governments = [dict(record) for record in session.run("MATCH (g:`Government Body`) RETURN g.id AS id, g.name AS name")]
-        people = [dict(record) for record in session.run("MATCH (p:Person) RETURN p.id AS id, p.name AS name")]
+@app.route("/api/analytics")
+def api_analytics():
+    # Status of the last run and the top 10 nodes by each metric
+    results, status, error = analytics_results()
+    if error:
+        return error
+    nodes = results["nodes"]
+    top = {metric: [nodes[node_id] for node_id in ranked[:10]] for metric, ranked in results["ranked"].items()}
+    top["brokers"] = [nodes[node_id] for node_id in results["brokers"][:10]]
+    return jsonify({"status": status, "top": top})
 
-    if request.method == "POST":
-        cypher = ""
-        params = {}
-
-        if analysis_type == "gov_company":
-            government_id = request.form.get("government_id")
-            company_id = request.form.get("company_id")
-            selected_gov = government_id
-            selected_company = company_id
-            cypher = """
-                MATCH (gov:`Government Body` {id: $government_id})
-                MATCH (comp:Company {id: $company_id})
-                MATCH (p1:Person)-[:employed|formerly_employed]-(gov)
-                MATCH (p2:Person)-[:employed|formerly_employed]-(comp)
-                MATCH path = shortestPath((p1)-[:knows|works_with*0..6]-(p2))
-                WHERE all(n IN nodes(path)[1..-2] WHERE "Person" IN labels(n))
-                RETURN
-                    [{id: gov.id, label: coalesce(gov.name, gov.id), group: head(labels(gov)), title: coalesce(gov.title, gov.name, gov.id)}] +
-                    [n IN nodes(path) | {id: n.id, label: coalesce(n.name, n.id), group: head(labels(n)), title: coalesce(n.title, n.name, n.id)}] +
-                    [{id: comp.id, label: coalesce(comp.name, comp.id), group: head(labels(comp)), title: coalesce(comp.title, comp.name, comp.id)}] AS Path_Nodes,
-                    [{from: p1.id, to: gov.id, label: 'employed', title: ''}] +
-                    [r IN relationships(path) | {from: startNode(r).id, to: endNode(r).id, label: type(r), title: coalesce(r.notes, '')}] +
-                    [{from: p2.id, to: comp.id, label: 'employed', title: ''}] AS Path_Edges
-            """
-            params = {"government_id": government_id, "company_id": company_id}
-
-        elif analysis_type == "company_company":
-            company1_id = request.form.get("company1_id")
-            company2_id = request.form.get("company2_id")
-            selected_company1 = company1_id
-            selected_company2 = company2_id
-            cypher = """
-                MATCH (c1:Company {id: $company1_id})
-                MATCH (c2:Company {id: $company2_id})
-                MATCH (p1:Person)-[r1:employed|formerly_employed]-(c1)
-                MATCH (p2:Person)-[r2:employed|formerly_employed]-(c2)
-                MATCH path = shortestPath((p1)-[:knows|works_with*0..6]-(p2))
-                WHERE all(n IN nodes(path)[1..-2] WHERE "Person" IN labels(n))
-                RETURN
-                    [{id: c1.id, label: coalesce(c1.name, c1.id), group: head(labels(c1)), title: coalesce(c1.title, c1.name, c1.id)}] +
-                    [n IN nodes(path) | {id: n.id, label: coalesce(n.name, n.id), group: head(labels(n)), title: coalesce(n.title, n.name, n.id)}] +
-                    [{id: c2.id, label: coalesce(c2.name, c2.id), group: head(labels(c2)), title: coalesce(c2.title, c2.name, c2.id)}] AS Path_Nodes,
-                    [{from: p1.id, to: c1.id, label: type(r1), title: coalesce(r1.notes, '')}] +
-                    [r IN relationships(path) | {from: startNode(r).id, to: endNode(r).id, label: type(r), title: coalesce(r.notes, '')}] +
-                    [{from: p2.id, to: c2.id, label: type(r2), title: coalesce(r2.notes, '')}] AS Path_Edges
-            """
-            params = {"company1_id": company1_id, "company2_id": company2_id}
-
-        elif analysis_type == "gov_gov":
-            government1_id = request.form.get("government1_id")
-            government2_id = request.form.get("government2_id")
-            selected_gov1 = government1_id
-            selected_gov2 = government2_id
-            cypher = """
-                MATCH (g1:`Government Body` {id: $government1_id})
-                MATCH (g2:`Government Body` {id: $government2_id})
-                MATCH (p1:Person)-[r1:employed|formerly_employed]-(g1)
-                MATCH (p2:Person)-[r2:employed|formerly_employed]-(g2)
-                MATCH path = shortestPath((p1)-[:knows|works_with*0..6]-(p2))
-                WHERE all(n IN nodes(path)[1..-2] WHERE "Person" IN labels(n))
-                RETURN
-                    [{id: g1.id, label: coalesce(g1.name, g1.id), group: head(labels(g1)), title: coalesce(g1.title, g1.name, g1.id)}] +
-                    [n IN nodes(path) | {id: n.id, label: coalesce(n.name, n.id), group: head(labels(n)), title: coalesce(n.title, n.name, n.id)}] +
-                    [{id: g2.id, label: coalesce(g2.name, g2.id), group: head(labels(g2)), title: coalesce(g2.title, g2.name, g2.id)}] AS Path_Nodes,
-                    [{from: p1.id, to: g1.id, label: type(r1), title: coalesce(r1.notes, '')}] +
-                    [r IN relationships(path) | {from: startNode(r).id, to: endNode(r).id, label: type(r), title: coalesce(r.notes, '')}] +
-                    [{from: p2.id, to: g2.id, label: type(r2), title: coalesce(r2.notes, '')}] AS Path_Edges
-            """
-            params = {"government1_id": government1_id, "government2_id": government2_id}
-
-        elif analysis_type == "person_person":
-            person1_input = request.form.get("person1_name", "").strip()
-            person2_input = request.form.get("person2_name", "").strip()
-            selected_person1_name = person1_input
-            selected_person2_name = person2_input
-
-            def extract_id(val):
-                match = re.match(r".*\[([^\[\]]+)\]$", val)
-                if match:
-                    return match.group(1)
-                return None
+@app.route("/api/analytics/top")
+def api_analytics_top():
+    # /api/analytics/top?metric=pagerank&type=person&community=0&limit=20
+    results, status, error = analytics_results()
+    if error:
+        return error
+    metric = request.args.get("metric", "pagerank")
+    if metric not in ANALYTICS_METRICS:
+        return jsonify({"error": f"metric must be one of {', '.join(ANALYTICS_METRICS)}"}), 400
+    kind = request.args.get("type")
+    if kind and kind not in SEARCH_KINDS:
+        return jsonify({"error": "Unknown type"}), 400
+    label = SEARCH_KIND_LABELS[SEARCH_KINDS[kind]] if kind else None
+    community = request.args.get("community", type=int)
+    limit = analytics_limit()
+    nodes = results["nodes"]
+    rows = []
+    for node_id in results["ranked"][metric]:
+        node = nodes[node_id]
+        if (label is None or node["type"] == label) and (community is None or node["community"] == community):
+            rows.append(node)
+            if len(rows) == limit:
+                break
+    return jsonify({"status": status, "metric": metric, "results": rows})
 
-            person1_id = extract_id(person1_input)
-            person2_id = extract_id(person2_input)
+@app.route("/api/analytics/node")
+def api_analytics_node():
+    results, status, error = analytics_results()
+    if error:
+        return error
+    node = results["nodes"].get(request.args.get("id"))
+    if node is None:
+        return jsonify({"error": "Node not found"}), 404
+    return jsonify({"status": status, "node": node})
 
-            with driver.session() as session:
-                if not person1_id and person1_input:
-                    rec = session.run("MATCH (p:Person) WHERE p.name = $val OR p.id = $val RETURN p.id AS id", val=person1_input).single()
-                    person1_id = rec["id"] if rec else None
-                if not person2_id and person2_input:
-                    rec = session.run("MATCH (p:Person) WHERE p.name = $val OR p.id = $val RETURN p.id AS id", val=person2_input).single()
-                    person2_id = rec["id"] if rec else None
-
-            if person1_id and person2_id:
-                cypher = """
-                    MATCH (p1:Person {id: $person1_id})
-                    MATCH (p2:Person {id: $person2_id})
-                    MATCH path = shortestPath((p1)-[:knows|works_with*0..6]-(p2))
-                    WHERE all(n IN nodes(path)[1..-2] WHERE "Person" IN labels(n))
-                    RETURN
-                        [n IN nodes(path) | {id: n.id, label: coalesce(n.name, n.id), group: head(labels(n)), title: coalesce(n.title, n.name, n.id)}] AS Path_Nodes,
-                        [r IN relationships(path) | {from: startNode(r).id, to: endNode(r).id, label: type(r), title: coalesce(r.notes, '')}] AS Path_Edges
-                """
-                params = {"person1_id": person1_id, "person2_id": person2_id}
-            else:
-                results = [{"Error": "One or both persons not found."}]
-                columns = ["Error"]
+@app.route("/api/analytics/communities")
+def api_analytics_communities():
+    # Largest communities first, each with its size, label mix and top members by PageRank
+    results, status, error = analytics_results()
+    if error:
+        return error
+    nodes = results["nodes"]
+    rows = []
+    for community, members in sorted(results["communities"].items())[:analytics_limit()]:
+        types = {}
+        for node_id in members:
+            types[nodes[node_id]["type"]] = types.get(nodes[node_id]["type"], 0) + 1
+        rows.append({"community": community, "size": len(members), "types": types,
+                     "top": [nodes[node_id] for node_id in members[:5]]})
+    return jsonify({"status": status, "results": rows})
 
-        if cypher:
-            with driver.session() as session:
-                try:
-                    result = session.run(cypher, **params)
-                    results = [dict(record) for record in result]
-                    columns = ["Path_Nodes", "Path_Edges"]
-                except Exception as e:
-                    results = [{"Error": str(e)}]
-                    columns = ["Error"]
-
-    return render_template(
-        "network_analysis.html",
-        companies=companies,
-        governments=governments,
-        people=people,
-        results=results,
-        columns=columns,
-        analysis_type=analysis_type,
-        selected_company=selected_company,
-        selected_company1=selected_company1,
-        selected_company2=selected_company2,
-        selected_gov=selected_gov,
-        selected_gov1=selected_gov1,
-        selected_gov2=selected_gov2,
-        selected_person1_name=selected_person1_name,
-        selected_person2_name=selected_person2_name,
-        include_companies=include_companies,
-    )
+@app.route("/api/analytics/brokers")
+def api_analytics_brokers():
+    # People linked by employment to both a company and a government body, by betweenness
+    results, status, error = analytics_results()
+    if error:
+        return error
+    nodes = results["nodes"]
+    return jsonify({"status": status, "results": [nodes[node_id] for node_id in results["brokers"][:analytics_limit()]]})
 
 @app.route("/add", methods=["GET", "POST"])
 def add():
@@ -367,9 +3071,13 @@ def add():
                     cypher += ", title: $title"
                     params["title"] = title
                 cypher += "})"
-                with driver.session() as session:
-                    session.run(cypher, **params)
-                message = "Node added!"
+                try:
+                    write_query(cypher, **params)
+                except ConstraintError:
+                    message = f"A {node_type} with id {node_id} already exists."
+                else:
+                    graph_changed("node_added", id=node_id, type=node_type, name=name, title=params.get("title"))
+                    message = "Node added!"
         elif action == "relationship":
             from_id = request.form.get("from_id")
             to_id = request.form.get("to_id")
@@ -379,14 +3087,14 @@ def add():
                 message = "Missing required fields for relationship."
             else:
                 cypher = f"""
-                    MATCH (a{{id: $from_id}})
-                    MATCH (b{{id: $to_id}})
+                    {match_entity("a", "$from_id")}
+                    {match_entity("b", "$to_id")}
                     MERGE (a)-[r:`{rel_type}`]->(b)
                     SET r.notes = $notes
                 """
                 params = {"from_id": from_id, "to_id": to_id, "notes": notes}
-                with driver.session() as session:
-                    session.run(cypher, **params)
+                write_query(cypher, **params)
+                graph_changed("rel_added", from_id=from_id, to_id=to_id, rel_type=rel_type, notes=notes)
                 message = "Relationship added!"
     return render_template("add.html", message=message)
 
@@ -401,9 +3109,9 @@ def delete():
             if not node_id:
                 message = "Missing node ID."
             else:
-                cypher = "MATCH (n {id: $id}) DETACH DELETE n"
-                with driver.session() as session:
-                    session.run(cypher, id=node_id)
+                cypher = f"{match_entity('n', '$id')} DETACH DELETE n"
+                write_query(cypher, id=node_id)
+                graph_changed("node_deleted", id=node_id)
                 message = f"Node '{node_id}' and its relationships deleted (if they existed)."
         elif action == "relationship":
             from_id = request.form.get("from_id")
@@ -413,79 +3121,483 @@ def delete():
                 message = "Missing required fields for relationship."
             else:
                 cypher = f"""
-                    MATCH (a {{id: $from_id}})-[r:`{rel_type}`]->(b {{id: $to_id}})
+                    {match_entity("a", "$from_id")}
+                    MATCH (a)-[r:`{rel_type}`]->(b {{id: $to_id}})
                     DELETE r
                 """
-                with driver.session() as session:
-                    session.run(cypher, from_id=from_id, to_id=to_id)
+                write_query(cypher, from_id=from_id, to_id=to_id)
+                graph_changed("rel_deleted", from_id=from_id, to_id=to_id, rel_type=rel_type)
                 message = f"Relationship '{rel_type}' from '{from_id}' to '{to_id}' deleted."
     return render_template("delete.html", message=message)
 
+# Layout of the export_json() document: entity sections map to a node label, relationship
+# sections to the (id field, label) pair of each endpoint
+EXPORT_ENTITY_SECTIONS = {
+    "people": "Person",
+    "companies": "Company",
+    "government_bodies": "Government Body",
+}
+EXPORT_RELATIONSHIP_SECTIONS = {
+    "person_company": ("person_id", "Person", "company_id", "Company"),
+    "person_government": ("person_id", "Person", "government_id", "Government Body"),
+    "person_person": ("person_id_1", "Person", "person_id_2", "Person"),
+    "company_company": ("company_id_1", "Company", "company_id_2", "Company"),
+    "company_government": ("company_id", "Company", "government_id", "Government Body"),
+    "government_government": ("government_id_1", "Government Body", "government_id_2", "Government Body"),
+}
+EXPORT_QUERIES = [
+    ("entities", "people", "MATCH (p:Person) RETURN p.id AS id, p.name AS name, p.title AS title"),
+    ("entities", "companies", "MATCH (c:Company) RETURN c.id AS id, c.name AS name"),
+    ("entities", "government_bodies", "MATCH (g:`Government Body`) RETURN g.id AS id, g.name AS name"),
+    ("relationships", "person_company", """
+        MATCH (p:Person)-[r]->(c:Company)
+        RETURN p.id AS person_id, c.id AS company_id, type(r) AS type, r.notes AS notes
+    """),
+    ("relationships", "person_government", """
+        MATCH (p:Person)-[r]->(g:`Government Body`)
+        RETURN p.id AS person_id, g.id AS government_id, type(r) AS type, r.notes AS notes
+    """),
+    ("relationships", "person_person", """
+        MATCH (p1:Person)-[r]->(p2:Person)
+        RETURN p1.id AS person_id_1, p2.id AS person_id_2, type(r) AS type, r.notes AS notes
+    """),
+    ("relationships", "company_company", """
+        MATCH (c1:Company)-[r]->(c2:Company)
+        RETURN c1.id AS company_id_1, c2.id AS company_id_2, type(r) AS type, r.notes AS notes
+    """),
+    ("relationships", "company_government", """
+        MATCH (c:Company)-[r]->(g:`Government Body`)
+        RETURN c.id AS company_id, g.id AS government_id, type(r) AS type, r.notes AS notes
+    """),
+    ("relationships", "government_government", """
+        MATCH (g1:`Government Body`)-[r]->(g2:`Government Body`)
+        RETURN g1.id AS government_id_1, g2.id AS government_id_2, type(r) AS type, r.notes AS notes
+    """),
+]
+EXPORT_COLUMNS = ["section", "id", "name", "title", "from", "to", "type", "notes"]
+EXPORT_BATCH_ROWS = 10000
+
+def iter_export_sections(session):
+    # Yield (top, section, rows) per export query; rows are read lazily off the cursor
+    for top, section, cypher in EXPORT_QUERIES:
+        yield top, section, (dict(record) for record in session.run(cypher))
+
+def export_json_chunks(sections):
+    # Compact JSON in the export_json() layout, written section by section
+    current_top = None
+    for top, section, rows in sections:
+        if top != current_top:
+            yield ("{" if current_top is None else "}, ") + json.dumps(top) + ": {"
+            current_top, first_section = top, True
+        yield ("" if first_section else ", ") + json.dumps(section) + ": ["
+        first_section = False
+        first = True
+        for row in rows:
+            yield ("" if first else ",") + json.dumps(row)
+            first = False
+        yield "]"
+    yield "}}"
+
+def export_ndjson_chunks(rows):
+    # One {"section": ..., **row} object per line; accepted as-is by /api/import
+    for _, section, row in rows:
+        yield json.dumps({"section": section, **row}) + "\n"
+
+def export_columnar_rows(rows):
+    # Flatten every section onto the shared EXPORT_COLUMNS schema
+    for _, section, row in rows:
+        if section in EXPORT_RELATIONSHIP_SECTIONS:
+            from_field, _, to_field, _ = EXPORT_RELATIONSHIP_SECTIONS[section]
+            yield {"section": section, "from": row[from_field], "to": row[to_field],
+                   "type": row["type"], "notes": row["notes"]}
+        else:
+            yield {"section": section, **row}
+
+class ChunkSink:
+    # Write-only file object whose contents are drained as they are produced
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def export_arrow_chunks(rows, fmt):
+    # Arrow IPC stream or Parquet, written EXPORT_BATCH_ROWS rows at a time
+    schema = pa.schema([(column, pa.string()) for column in EXPORT_COLUMNS])
+    sink = ChunkSink()
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="zstd")
+        write = writer.write_table
+    else:
+        writer = pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema)
+        write = writer.write_batch
+    batch = []
+
+    def flush():
+        table = pa.Table.from_pylist(batch, schema=schema)
+        write(table if fmt == "parquet" else table.to_batches()[0])
+        batch.clear()
+
+    for row in export_columnar_rows(rows):
+        batch.append(row)
+        if len(batch) >= EXPORT_BATCH_ROWS:
+            flush()
+            yield sink.drain()
+    if batch:
+        flush()
+    writer.close()
+    yield sink.drain()
+
+EXPORT_FORMATS = {
+    "json": ("application/json", "export.json"),
+    "ndjson": ("application/x-ndjson", "export.ndjson"),
+    "arrow": ("application/vnd.apache.arrow.stream", "export.arrows"),
+    "parquet": ("application/vnd.apache.parquet", "export.parquet"),
+}
+
+def compress_chunks(chunks, encoding):
+    # Incrementally gzip or zstd encode a stream of byte chunks
+    if encoding == "gzip":
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        finish = compressor.flush
+    else:
+        compressor = zstandard.ZstdCompressor().compressobj()
+        finish = compressor.flush
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield finish()
+
+def negotiate_encoding(requested, accept_encodings):
+    # Explicit ?compress= wins; otherwise prefer zstd, then gzip, from Accept-Encoding
+    available = ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+    if requested:
+        return requested if requested in available else None
+    for encoding in available:
+        if encoding in accept_encodings:
+            return encoding
+    return None
+
+def parse_export_args(args, accept_encodings):
+    # (format, encoding, error) from the /export-json query string
+    fmt = args.get("format", "json")
+    if fmt not in EXPORT_FORMATS:
+        return fmt, None, "Unsupported format"
+    if fmt in ("arrow", "parquet") and pa is None:
+        return fmt, None, f"{fmt} export needs pyarrow installed"
+    requested = args.get("compress")
+    encoding = None if requested == "none" else negotiate_encoding(requested, accept_encodings)
+    if requested not in (None, "none") and encoding is None:
+        return fmt, None, "Unsupported compression"
+    # Parquet compresses its own pages
+    if fmt == "parquet" and not requested:
+        encoding = None
+    return fmt, encoding, None
+
+def export_body(fmt, encoding, sections):
+    # Encoded, optionally compressed, export bytes for (top, section, rows) sections
+    if fmt == "json":
+        chunks = (chunk.encode() for chunk in buffered(export_json_chunks(sections)))
+    else:
+        rows = ((top, section, row) for top, section, section_rows in sections for row in section_rows)
+        if fmt == "ndjson":
+            chunks = (chunk.encode() for chunk in buffered(export_ndjson_chunks(rows)))
+        else:
+            chunks = export_arrow_chunks(rows, fmt)
+    return compress_chunks(chunks, encoding) if encoding else chunks
+
+def export_headers(fmt, encoding):
+    mimetype, filename = EXPORT_FORMATS[fmt]
+    headers = {"Content-Disposition": f"attachment;filename={filename}", "Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return mimetype, headers
+
 @app.route("/export-json")
 def export_json():
-    # Export the entire graph as JSON
-    data = {
-        "entities": {
-            "people": [],
-            "companies": [],
-            "government_bodies": []
-        },
-        "relationships": {
-            "person_company": [],
-            "person_government": [],
-            "person_person": [],
-            "company_company": [],
-            "company_government": [],
-            "government_government": []
-        }
-    }
-    with driver.session() as session:
-        # People
-        people = session.run("MATCH (p:Person) RETURN p.id AS id, p.name AS name, p.title AS title")
-        data["entities"]["people"] = [dict(record) for record in people]
-        # Companies
-        companies = session.run("MATCH (c:Company) RETURN c.id AS id, c.name AS name")
-        data["entities"]["companies"] = [dict(record) for record in companies]
-        # Government Bodies
-        govs = session.run("MATCH (g:`Government Body`) RETURN g.id AS id, g.name AS name")
-        data["entities"]["government_bodies"] = [dict(record) for record in govs]
-        # Relationships
-        pc = session.run("""
-            MATCH (p:Person)-[r]->(c:Company)
-            RETURN p.id AS person_id, c.id AS company_id, type(r) AS type, r.notes AS notes
-        """)
-        data["relationships"]["person_company"] = [dict(record) for record in pc]
-        pg = session.run("""
-            MATCH (p:Person)-[r]->(g:`Government Body`)
-            RETURN p.id AS person_id, g.id AS government_id, type(r) AS type, r.notes AS notes
-        """)
-        data["relationships"]["person_government"] = [dict(record) for record in pg]
-        pp = session.run("""
-            MATCH (p1:Person)-[r]->(p2:Person)
-            RETURN p1.id AS person_id_1, p2.id AS person_id_2, type(r) AS type, r.notes AS notes
-        """)
-        data["relationships"]["person_person"] = [dict(record) for record in pp]
-        cc = session.run("""
-            MATCH (c1:Company)-[r]->(c2:Company)
-            RETURN c1.id AS company_id_1, c2.id AS company_id_2, type(r) AS type, r.notes AS notes
-        """)
-        data["relationships"]["company_company"] = [dict(record) for record in cc]
-        cg = session.run("""
-            MATCH (c:Company)-[r]->(g:`Government Body`)
-            RETURN c.id AS company_id, g.id AS government_id, type(r) AS type, r.notes AS notes
-        """)
-        data["relationships"]["company_government"] = [dict(record) for record in cg]
-        gg = session.run("""
-            MATCH (g1:`Government Body`)-[r]->(g2:`Government Body`)
-            RETURN g1.id AS government_id_1, g2.id AS government_id_2, type(r) AS type, r.notes AS notes
-        """)
-        data["relationships"]["government_government"] = [dict(record) for record in gg]
+    # Export the entire graph, streamed while the export queries are consumed.
+    # ?format=json (default), ndjson, or arrow/parquet when pyarrow is installed;
+    # ?compress=gzip|zstd|none, otherwise negotiated from Accept-Encoding
+    fmt, encoding, error = parse_export_args(request.args, request.accept_encodings)
+    if error:
+        return jsonify({"error": error}), 400
+
+    def generate():
+        with read_session() as session:
+            yield from export_body(fmt, encoding, iter_export_sections(session))
+
+    mimetype, headers = export_headers(fmt, encoding)
+    return Response(generate(), mimetype=mimetype, headers=headers)
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+REL_TYPE_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+def iter_export_document(stream):
+    # Yield (section, row) from an export_json() document. With ijson installed the file
+    # is parsed incrementally; otherwise it is loaded whole
+    if ijson is None:
+        data = json.load(stream)
+        for top in ("entities", "relationships"):
+            for section, rows in data.get(top, {}).items():
+                for row in rows:
+                    yield section, row
+        return
+    builder = None
+    item_prefix = section = None
+    for prefix, event, value in ijson.parse(stream):
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == item_prefix and event == "end_map":
+                yield section, builder.value
+                builder = None
+        elif event == "start_map" and prefix.endswith(".item") and prefix.count(".") == 2:
+            item_prefix = prefix
+            section = prefix.split(".")[1]
+            builder = ijson.ObjectBuilder()
+            builder.event(event, value)
+
+def iter_ndjson(stream):
+    for line in io.TextIOWrapper(stream, encoding="utf-8"):
+        if line.strip():
+            yield json.loads(line)
+
+def iter_csv(stream):
+    for row in csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8", newline="")):
+        yield {key: value for key, value in row.items() if value not in (None, "")}
+
+def normalise_import_row(row, section=None):
+    # Map any accepted row shape onto {"kind": "node"|"relationship", ...}. Rows either
+    # carry "kind" themselves or come from (or name) an export_json() section
+    section = section or row.get("section")
+    if section in EXPORT_ENTITY_SECTIONS:
+        row = dict(row, kind="node", type=EXPORT_ENTITY_SECTIONS[section])
+    elif section in EXPORT_RELATIONSHIP_SECTIONS:
+        from_field, from_type, to_field, to_type = EXPORT_RELATIONSHIP_SECTIONS[section]
+        row = dict(row, kind="relationship", **{"from": row.get(from_field), "to": row.get(to_field)},
+                   from_type=from_type, to_type=to_type)
+    elif section is not None:
+        raise ValueError(f"Unknown section '{section}'")
+
+    if row.get("kind") == "node":
+        if row.get("type") not in GRAPH_GROUPS or not row.get("id"):
+            raise ValueError("Node rows need an id and a type of Person, Company or Government Body")
+        props = {"name": row.get("name")}
+        if row.get("title") is not None:
+            props["title"] = row["title"]
+        return {"kind": "node", "type": row["type"], "id": row["id"], "props": props}
+    if row.get("kind") == "relationship":
+        if not row.get("from") or not row.get("to") or not REL_TYPE_PATTERN.match(row.get("type") or ""):
+            raise ValueError("Relationship rows need from, to and a valid type")
+        for side in ("from_type", "to_type"):
+            if row.get(side) not in (None, *GRAPH_GROUPS):
+                raise ValueError(f"Unknown {side} '{row[side]}'")
+        return {"kind": "relationship", "type": row["type"], "from": row["from"], "to": row["to"],
+                "from_type": row.get("from_type"), "to_type": row.get("to_type"), "notes": row.get("notes")}
+    raise ValueError("Row has no kind or section")
+
+def iter_import_rows(stream, fmt):
+    # Yield rows in input order as normalised dicts, or ValueError instances for bad rows
+    if fmt == "json":
+        source = iter_export_document(stream)
+    elif fmt == "ndjson":
+        source = ((None, row) for row in iter_ndjson(stream))
+    elif fmt == "csv":
+        source = ((None, row) for row in iter_csv(stream))
+    else:
+        raise ValueError(f"Unsupported import format '{fmt}'")
+    for section, row in source:
+        try:
+            yield normalise_import_row(row, section)
+        except ValueError as e:
+            yield e
 
-    return Response(
-        json.dumps(data, indent=2),
-        mimetype="application/json",
-        headers={"Content-Disposition": "attachment;filename=export.json"}
+def match_import_node(var, label, key):
+    if label:
+        return f"MATCH ({var}:`{label}` {{id: {key}}})"
+    return match_entity(var, key, ["row"])
+
+def write_import_batch(tx, batch):
+    # Apply one batch inside a managed write transaction: nodes first, grouped by label,
+    # then relationships grouped by type and endpoint labels, one UNWIND statement per group
+    nodes, rels = {}, {}
+    for row in batch:
+        if row["kind"] == "node":
+            nodes.setdefault(row["type"], []).append({"id": row["id"], "props": row["props"]})
+        else:
+            key = (row["type"], row["from_type"], row["to_type"])
+            rels.setdefault(key, []).append({"from": row["from"], "to": row["to"], "notes": row["notes"]})
+    for label, rows in nodes.items():
+        tx.run(f"""
+            UNWIND $rows AS row
+            MERGE (n:`{label}` {{id: row.id}})
+            SET n += row.props
+        """, rows=rows).consume()
+    for (rel_type, from_type, to_type), rows in rels.items():
+        tx.run(f"""
+            UNWIND $rows AS row
+            {match_import_node("a", from_type, "row.from")}
+            {match_import_node("b", to_type, "row.to")}
+            MERGE (a)-[r:`{rel_type}`]->(b)
+            SET r.notes = row.notes
+        """, rows=rows).consume()
+
+class ImportFailed(Exception):
+    def __init__(self, cause, stats):
+        super().__init__(str(cause))
+        self.cause = cause
+        self.stats = stats
+
+def bulk_import(stream, fmt, batch_size=IMPORT_BATCH_SIZE, resume_from=0, on_batch=None):
+    # Stream rows from the input into batched write transactions. The first resume_from
+    # rows are skipped (they were committed by an earlier run); on_batch(stats) is called
+    # after every commit so callers can checkpoint stats["committed_rows"]
+    stats = {"committed_rows": resume_from, "imported": 0, "rejected": 0, "errors": [], "batches": 0}
+    started = time.monotonic()
+
+    def finish():
+        elapsed = time.monotonic() - started
+        stats["seconds"] = round(elapsed, 3)
+        stats["rows_per_sec"] = round(stats["imported"] / elapsed, 1) if elapsed else None
+        return stats
+
+    batch = []
+    position = 0
+    try:
+        with driver.session() as session:
+            def flush():
+                if batch:
+                    session.execute_write(write_import_batch, batch)
+                    stats["imported"] += len(batch)
+                    stats["batches"] += 1
+                stats["committed_rows"] = position
+                batch.clear()
+                if on_batch:
+                    on_batch(finish())
+
+            for row in iter_import_rows(stream, fmt):
+                position += 1
+                if position <= resume_from:
+                    continue
+                if isinstance(row, ValueError):
+                    stats["rejected"] += 1
+                    if len(stats["errors"]) < 20:
+                        stats["errors"].append(f"row {position}: {row}")
+                else:
+                    batch.append(row)
+                if len(batch) >= batch_size:
+                    flush()
+            if batch or position > stats["committed_rows"]:
+                flush()
+    except Exception as e:
+        raise ImportFailed(e, finish()) from e
+    finally:
+        if stats["imported"]:
+            graph_changed("bulk")
+    return finish()
+
+def detect_import_format(filename, mimetype):
+    filename = (filename or "").lower()
+    if filename.endswith((".ndjson", ".jsonl")) or "ndjson" in (mimetype or ""):
+        return "ndjson"
+    if filename.endswith(".csv") or "csv" in (mimetype or ""):
+        return "csv"
+    return "json"
+
+@app.route("/api/import", methods=["POST"])
+def api_import():
+    # API endpoint for bulk loading an export_json() document, NDJSON or CSV, either as an
+    # uploaded "file" or as the raw request body. After a failure, repeat the request with
+    # ?resume_from=<committed_rows> to continue where the last committed batch ended
+    upload = request.files.get("file")
+    # Buffered: ijson probes with read(0), which the raw request stream treats as a disconnect
+    stream = upload.stream if upload else io.BufferedReader(request.stream)
+    fmt = request.args.get("format") or detect_import_format(
+        upload.filename if upload else None, upload.mimetype if upload else request.mimetype
     )
+    batch_size = max(1, request.args.get("batch_size", IMPORT_BATCH_SIZE, type=int))
+    resume_from = max(0, request.args.get("resume_from", 0, type=int))
+    try:
+        stats = bulk_import(stream, fmt, batch_size=batch_size, resume_from=resume_from)
+    except ImportFailed as e:
+        return jsonify({"success": False, "error": str(e.cause), **e.stats}), 500
+    return jsonify({"success": True, **stats})
+
+EDIT_VIEW_QUERY = """
+    OPTIONAL MATCH (n:`{node_type}` {{id: $id}})
+    OPTIONAL MATCH (n)-[r]->(b)
+    RETURN n.id AS id, n.name AS name, n.title AS title,
+           collect(CASE WHEN r IS NULL THEN null ELSE
+               {{rel_id: id(r), type: type(r), target_id: b.id, target_name: b.name, notes: r.notes}} END) AS relationships
+"""
+
+def apply_edit(tx, node_id, node_type, props, note_rows, delete_rows, new_rel):
+    # Apply a whole /edit submission in one transaction, one statement per kind of change.
+    # Only values that differ from the stored ones are written; returns (node changed,
+    # relationship rows whose notes changed, relationship rows deleted)
+    match_node = f"MATCH (a:`{node_type}` {{id: $id}})" if node_type else match_entity("a", "$id")
+    node_changed = False
+    if props:
+        node_changed = tx.run(f"""
+            {match_node}
+            WITH a WHERE any(key IN keys($props) WHERE coalesce(a[key], '') <> $props[key])
+            SET a += $props
+            RETURN count(a) AS changed
+        """, id=node_id, props=props).single()["changed"] > 0
+    changed_rows = []
+    if note_rows:
+        changed_rows = [dict(record) for record in tx.run(f"""
+            {match_node}
+            UNWIND $rows AS row
+            MATCH (a)-[r]->(b {{id: row.to_id}})
+            WHERE type(r) = row.type AND coalesce(r.notes, '') <> row.notes
+            SET r.notes = row.notes
+            RETURN DISTINCT row.type AS type, row.to_id AS to_id, row.notes AS notes
+        """, id=node_id, rows=note_rows)]
+    deleted_rows = []
+    if delete_rows:
+        deleted_rows = [dict(record) for record in tx.run(f"""
+            {match_node}
+            UNWIND $rows AS row
+            MATCH (a)-[r]->(b {{id: row.to_id}})
+            WHERE type(r) = row.type
+            DELETE r
+            RETURN DISTINCT row.type AS type, row.to_id AS to_id
+        """, id=node_id, rows=delete_rows)]
+    if new_rel:
+        tx.run(f"""
+            {match_node}
+            {match_entity("b", "$to_id")}
+            MERGE (a)-[r:`{new_rel["type"]}`]->(b)
+            SET r.notes = $notes
+        """, id=node_id, to_id=new_rel["to_id"], notes=new_rel["notes"]).consume()
+    return node_changed, changed_rows, deleted_rows
+
+def load_edit_view(node_id, node_type):
+    # Node, its outgoing relationships and the candidate targets for new relationships;
+    # one query plus the cached node catalog
+    rows = read_query(EDIT_VIEW_QUERY.format(node_type=node_type), id=node_id)
+    record = rows[0] if rows else None
+    node = None
+    relationships = []
+    if record and record["id"] is not None:
+        node = {"id": record["id"], "name": record["name"], "title": record["title"]}
+        relationships = record["relationships"]
+    all_nodes = [row for row in entity_catalog("nodes")[0] if row["id"] != node_id]
+    return node, relationships, all_nodes
 
 @app.route("/edit", methods=["GET", "POST"])
 def edit():
@@ -499,106 +3611,65 @@ def edit():
         node_type = request.form.get("node_type")
         name = request.form.get("name")
         title = request.form.get("title", "")
-        # Update node properties
+        # Node properties
+        props = None
         if not node_id or not node_type or not name:
             message = "Missing required fields."
         else:
-            cypher = f"""
-                MATCH (n:`{node_type}` {{id: $id}})
-                SET n.name = $name
-                {', n.title = $title' if node_type == 'Person' else ''}
-            """
-            params = {"id": node_id, "name": name}
+            props = {"name": name}
             if node_type == "Person":
-                params["title"] = title
-            with driver.session() as session:
-                session.run(cypher, **params)
+                props["title"] = title
             message = "Node updated!"
 
-        # Update relationship notes
+        # Relationship notes
         rel_ids = request.form.getlist("rel_id")
         rel_notes = request.form.getlist("rel_notes")
         rel_types = request.form.getlist("rel_type")
         rel_targets = request.form.getlist("rel_target")
-        for rid, rtype, rtarget, rnotes in zip(rel_ids, rel_types, rel_targets, rel_notes):
-            with driver.session() as session:
-                session.run(
-                    f"""
-                    MATCH (a {{id: $from_id}})-[r:`{rtype}`]->(b {{id: $to_id}})
-                    SET r.notes = $notes
-                    """,
-                    {"from_id": node_id, "to_id": rtarget, "notes": rnotes}
-                )
+        note_rows = [
+            {"type": rtype, "to_id": rtarget, "notes": rnotes}
+            for rid, rtype, rtarget, rnotes in zip(rel_ids, rel_types, rel_targets, rel_notes)
+        ]
 
-        # Delete relationships
-        del_rels = request.form.getlist("delete_rel")
-        for del_rel in del_rels:
+        # Relationships to delete
+        delete_rows = []
+        for del_rel in request.form.getlist("delete_rel"):
             rtype, rtarget = del_rel.split("||")
-            with driver.session() as session:
-                session.run(
-                    f"""
-                    MATCH (a {{id: $from_id}})-[r:`{rtype}`]->(b {{id: $to_id}})
-                    DELETE r
-                    """,
-                    {"from_id": node_id, "to_id": rtarget}
-                )
+            delete_rows.append({"type": rtype, "to_id": rtarget})
 
-        # Add new relationship
+        # New relationship
+        new_rel = None
         new_rel_type = request.form.get("new_rel_type")
         new_rel_target = request.form.get("new_rel_target")
         new_rel_notes = request.form.get("new_rel_notes")
         if new_rel_type and new_rel_target:
-            with driver.session() as session:
-                session.run(
-                    f"""
-                    MATCH (a {{id: $from_id}})
-                    MATCH (b {{id: $to_id}})
-                    MERGE (a)-[r:`{new_rel_type}`]->(b)
-                    SET r.notes = $notes
-                    """,
-                    {"from_id": node_id, "to_id": new_rel_target, "notes": new_rel_notes or ""}
-                )
+            new_rel = {"type": new_rel_type, "to_id": new_rel_target, "notes": new_rel_notes or ""}
             message = "Node and relationships updated!"
 
-        # Fetch updated node and relationships for display
+        # Managed transaction: the driver retries it on transient errors. Rows that match
+        # what is stored are not reported, so saving an unchanged form records no changes
         with driver.session() as session:
-            node = session.run(
-                f"MATCH (n:`{node_type}` {{id: $id}}) RETURN n.id AS id, n.name AS name, n.title AS title",
-                id=node_id
-            ).single()
-            rels = session.run(
-                """
-                MATCH (a {id: $id})-[r]->(b)
-                RETURN id(r) AS rel_id, type(r) AS type, b.id AS target_id, b.name AS target_name, r.notes AS notes
-                """,
-                id=node_id
+            node_changed, note_rows, delete_rows = session.execute_write(
+                apply_edit, node_id, node_type, props, note_rows, delete_rows, new_rel
             )
-            relationships = [dict(record) for record in rels]
-            # For adding new relationships, get all other nodes
-            all_nodes = session.run(
-                "MATCH (n) WHERE n.id <> $id RETURN n.id AS id, n.name AS name, labels(n)[0] AS type", id=node_id
-            ).data()
+
+        if node_changed:
+            graph_changed("node_updated", id=node_id, type=node_type, name=name, title=props.get("title"))
+        for row in note_rows:
+            graph_changed("rel_updated", from_id=node_id, to_id=row["to_id"], rel_type=row["type"], notes=row["notes"])
+        for row in delete_rows:
+            graph_changed("rel_deleted", from_id=node_id, to_id=row["to_id"], rel_type=row["type"])
+        if new_rel:
+            graph_changed("rel_added", from_id=node_id, to_id=new_rel["to_id"], rel_type=new_rel["type"], notes=new_rel["notes"])
+
+        # Fetch updated node and relationships for display
+        node, relationships, all_nodes = load_edit_view(node_id, node_type)
     else:
         # GET: fetch node and relationships
         node_id = request.args.get("id")
         node_type = request.args.get("node_type")
         if node_id and node_type:
-            with driver.session() as session:
-                node = session.run(
-                    f"MATCH (n:`{node_type}` {{id: $id}}) RETURN n.id AS id, n.name AS name, n.title AS title",
-                    id=node_id
-                ).single()
-                rels = session.run(
-                    """
-                    MATCH (a {id: $id})-[r]->(b)
-                    RETURN id(r) AS rel_id, type(r) AS type, b.id AS target_id, b.name AS target_name, r.notes AS notes
-                    """,
-                    id=node_id
-                )
-                relationships = [dict(record) for record in rels]
-                all_nodes = session.run(
-                    "MATCH (n) WHERE n.id <> $id RETURN n.id AS id, n.name AS name, labels(n)[0] AS type", id=node_id
-                ).data()
+            node, relationships, all_nodes = load_edit_view(node_id, node_type)
     return render_template("edit.html", node=node, message=message, relationships=relationships, all_nodes=all_nodes)
 
 from flask import request, jsonify
@@ -608,13 +3679,19 @@ def api_get_node():
     # API endpoint to get a node's details
     node_id = request.args.get("id")
     node_type = request.args.get("node_type")
-    with driver.session() as session:
-        node = session.run(
-            f"MATCH (n:`{node_type}` {{id: $id}}) RETURN n.id AS id, n.name AS name, n.title AS title",
-            id=node_id
-        ).single()
-    if node:
-        return jsonify(dict(node))
+    snapshot = current_snapshot() if node_type in ENTITY_LABELS else None
+    if snapshot is not None:
+        i = snapshot.find(node_id)
+        node = snapshot.node(i) if i is not None else None
+        if node is None or node.label != node_type:
+            return jsonify({"error": "Node not found"}), 404
+        return jsonify({"id": node.id, "name": node.name, "title": node.title})
+    rows = read_query(
+        f"MATCH (n:`{node_type}` {{id: $id}}) RETURN n.id AS id, n.name AS name, n.title AS title",
+        id=node_id
+    )
+    if rows:
+        return jsonify(rows[0])
     return jsonify({"error": "Node not found"}), 404
 
 @app.route("/api/node", methods=["POST"])
@@ -634,8 +3711,8 @@ def api_update_node():
     params = {"id": node_id, "name": name}
     if node_type == "Person":
         params["title"] = title
-    with driver.session() as session:
-        session.run(cypher, **params)
+    write_query(cypher, **params)
+    graph_changed("node_updated", id=node_id, type=node_type, name=name, title=params.get("title"))
     return jsonify({"success": True})
 
 @app.route("/api/relationship", methods=["POST"])
@@ -649,57 +3726,78 @@ def api_update_relationship():
     if not from_id or not to_id or not old_type or not new_type:
         return jsonify({"success": False, "error": "Missing fields"})
     with driver.session() as session:
-        if old_type == new_type:
-            # Only update notes
-            session.run(
-                f"""
-                MATCH (a {{id: $from_id}})-[r:`{old_type}`]->(b {{id: $to_id}})
-                SET r.notes = $notes
-                """,
-                {"from_id": from_id, "to_id": to_id, "notes": notes}
-            )
-        else:
-            # Change type: delete old, create new with notes
-            session.run(
-                f"""
-                MATCH (a {{id: $from_id}})-[r:`{old_type}`]->(b {{id: $to_id}})
-                DELETE r
-                """,
-                {"from_id": from_id, "to_id": to_id}
-            )
-            session.run(
-                f"""
-                MATCH (a {{id: $from_id}}), (b {{id: $to_id}})
-                MERGE (a)-[r:`{new_type}`]->(b)
-                SET r.notes = $notes
-                """,
-                {"from_id": from_id, "to_id": to_id, "notes": notes}
-            )
+        session.execute_write(update_relationship, from_id, to_id, old_type, new_type, notes)
+    if old_type == new_type:
+        graph_changed("rel_updated", from_id=from_id, to_id=to_id, rel_type=new_type, notes=notes)
+    else:
+        graph_changed("rel_deleted", from_id=from_id, to_id=to_id, rel_type=old_type)
+        graph_changed("rel_added", from_id=from_id, to_id=to_id, rel_type=new_type, notes=notes)
     return jsonify({"success": True})
 
+def update_relationship(tx, from_id, to_id, old_type, new_type, notes):
+    if old_type == new_type:
+        # Only update notes
+        tx.run(
+            f"""
+            {match_entity("a", "$from_id")}
+            MATCH (a)-[r:`{old_type}`]->(b {{id: $to_id}})
+            SET r.notes = $notes
+            """,
+            {"from_id": from_id, "to_id": to_id, "notes": notes}
+        ).consume()
+    else:
+        # Change type: delete old, create new with notes, in the same transaction
+        tx.run(
+            f"""
+            {match_entity("a", "$from_id")}
+            MATCH (a)-[r:`{old_type}`]->(b {{id: $to_id}})
+            DELETE r
+            """,
+            {"from_id": from_id, "to_id": to_id}
+        ).consume()
+        tx.run(
+            f"""
+            {match_entity("a", "$from_id")}
+            {match_entity("b", "$to_id")}
+            MERGE (a)-[r:`{new_type}`]->(b)
+            SET r.notes = $notes
+            """,
+            {"from_id": from_id, "to_id": to_id, "notes": notes}
+        ).consume()
+
 @app.route("/api/relationship-types")
 def api_relationship_types():
     # API endpoint to get all relationship types in the database
-    with driver.session() as session:
-        result = session.run("CALL db.relationshipTypes()")
-        types = [record["relationshipType"] for record in result]
+    types = [record["relationshipType"] for record in read_query("CALL db.relationshipTypes()")]
     return jsonify(types)
 
 @app.route("/api/person-names")
 def api_person_names():
     # API endpoint to get all person names and IDs
-    with driver.session() as session:
-        result = session.run("MATCH (p:Person) RETURN p.name AS name, p.id AS id")
-        names = [{"name": record["name"], "id": record["id"]} for record in result]
-    return jsonify(names)
+    return catalog_response("people", ("name", "id"))
 
 @app.route("/api/company-names")
 def api_company_names():
     # API endpoint to get all company names and IDs
-    with driver.session() as session:
-        result = session.run("MATCH (c:Company) RETURN c.name AS name, c.id AS id")
-        names = [{"name": record["name"], "id": record["id"]} for record in result]
-    return jsonify(names)
+    return catalog_response("companies", ("name", "id"))
+
+@app.route("/api/search")
+def api_search():
+    # API endpoint for ranked typeahead matches on name or ID.
+    # ?q=<text>&type=person|company|government (default: all)&limit=<k>
+    query = request.args.get("q", "").strip()
+    kind = request.args.get("type")
+    limit = max(1, min(request.args.get("limit", 10, type=int), SEARCH_MAX_LIMIT))
+    if kind and kind not in SEARCH_KINDS:
+        return jsonify({"error": "Unknown type"}), 400
+    if not query:
+        return jsonify([])
+    kinds = [SEARCH_KINDS[kind]] if kind else list(SEARCH_KINDS.values())
+    matches = []
+    for catalog_kind in kinds:
+        matches.extend(search_index(catalog_kind).search(query, limit))
+    matches.sort(key=lambda match: (-match["score"], len(match["name"]), match["name"]))
+    return jsonify(matches[:limit])
 
 @app.route("/api/add-node", methods=["POST"])
 def api_add_node():
@@ -716,8 +3814,12 @@ def api_add_node():
         cypher += ", title: $title"
         params["title"] = title
     cypher += "})"
-    with driver.session() as session:
-        session.run(cypher, **params)
+    try:
+        write_query(cypher, **params)
+    except ConstraintError:
+        # Id uniqueness constraints come from the schema bootstrap
+        return jsonify({"success": False, "error": f"A {node_type} with id {node_id} already exists"}), 409
+    graph_changed("node_added", id=node_id, type=node_type, name=name, title=params.get("title"))
     return jsonify({"success": True})
 
 @app.route("/api/add-relationship", methods=["POST"])
@@ -730,23 +3832,20 @@ def api_add_relationship():
     if not from_id or not to_id or not rel_type:
         return jsonify({"success": False, "error": "Missing required fields"})
     cypher = f"""
-        MATCH (a{{id: $from_id}})
-        MATCH (b{{id: $to_id}})
+        {match_entity("a", "$from_id")}
+        {match_entity("b", "$to_id")}
         MERGE (a)-[r:`{rel_type}`]->(b)
         SET r.notes = $notes
     """
     params = {"from_id": from_id, "to_id": to_id, "notes": notes}
-    with driver.session() as session:
-        session.run(cypher, **params)
+    write_query(cypher, **params)
+    graph_changed("rel_added", from_id=from_id, to_id=to_id, rel_type=rel_type, notes=notes)
     return jsonify({"success": True})
 
 @app.route("/api/node-ids")
 def api_node_ids():
     # API endpoint to get all node IDs, names, and types
-    with driver.session() as session:
-        result = session.run("MATCH (n) RETURN n.id AS id, n.name AS name, labels(n)[0] AS type")
-        nodes = [{"id": record["id"], "name": record["name"], "type": record["type"]} for record in result]
-    return jsonify(nodes)
+    return catalog_response("nodes", ("id", "name", "type"))
 
 @app.route("/api/node-relations")
 def api_node_relations():
@@ -754,13 +3853,854 @@ def api_node_relations():
     node_id = request.args.get("id")
     if not node_id:
         return {"error": "Missing id"}, 400
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (n {id: $id})-[r]-(m)
-            RETURN type(r) AS rel_type, r.notes AS notes, m.id AS other_id, m.name AS other_name, labels(m)[0] AS other_type, startNode(r).id AS from_id, endNode(r).id AS to_id
-        """, id=node_id)
-        relations = [dict(record) for record in result]
+    snapshot = current_snapshot()
+    if snapshot is not None:
+        i = snapshot.find(node_id)
+        return jsonify(snapshot.relations(i) if i is not None else [])
+    relations = read_query(f"""
+        {match_entity("n", "$id")}
+        MATCH (n)-[r]-(m)
+        RETURN type(r) AS rel_type, r.notes AS notes, m.id AS other_id, m.name AS other_name, labels(m)[0] AS other_type, startNode(r).id AS from_id, endNode(r).id AS to_id
+    """, id=node_id)
     return jsonify(relations)
 
+# Operators that mean a query starts from every node, or every node with a label,
+# instead of an index seek
+SCAN_OPERATORS = ("AllNodesScan", "NodeByLabelScan")
+
+def find_scans(plan):
+    scans = []
+    operator = plan.get("operatorType", "")
+    if any(scan in operator for scan in SCAN_OPERATORS):
+        scans.append({"operator": operator, "details": plan.get("args", {}).get("Details")})
+    for child in plan.get("children", []):
+        scans.extend(find_scans(child))
+    return scans
+
+# Internal queries checked alongside QUERIES: (cypher, EXPLAIN parameters)
+PLANNED_STATEMENTS = {
+    "full_graph_first_page": (FULL_GRAPH_FIRST_PAGE_QUERY, {"after": None, "limit": 1}),
+    "full_graph_page": (FULL_GRAPH_PAGE_QUERY, {"after": "", "limit": 1}),
+}
+
+@app.route("/api/query-plans")
+def api_query_plans():
+    # API endpoint reporting QUERIES and PLANNED_STATEMENTS entries whose EXPLAIN plan
+    # contains a node scan
+    report = {}
+    planned = [(query_id, query_info["cypher"], dict.fromkeys(query_info["params"], ""))
+               for query_id, query_info in QUERIES.items()]
+    planned += [(query_id, cypher, params) for query_id, (cypher, params) in PLANNED_STATEMENTS.items()]
+    with read_session() as session:
+        for query_id, cypher, params in planned:
+            try:
+                plan = session.run("EXPLAIN " + cypher, **params).consume().plan
+            except Exception as e:
+                report[query_id] = {"ok": False, "error": str(e)}
+                continue
+            scans = find_scans(plan or {})
+            report[query_id] = {"ok": not scans, "scans": scans}
+    return jsonify(report)
+
+SUBGRAPH_MAX_DEPTH = 3
+SUBGRAPH_MAX_LIMIT = int(os.getenv("SUBGRAPH_MAX_LIMIT", "2000"))
+
+SUBGRAPH_SEED_QUERY = f"""
+    {match_entity("n", "$id")}
+    RETURN n.id AS id, n.name AS name, n.title AS title, labels(n) AS labels, COUNT {{ (n)--() }} AS degree
+"""
+# One BFS layer: every relationship touching the frontier, with the far node's total degree
+SUBGRAPH_LAYER_QUERY = f"""
+    UNWIND $frontier AS fid
+    {match_entity("a", "fid", ["fid"])}
+    MATCH (a)-[r]-(b)
+    RETURN a.id AS src, startNode(r) = a AS outgoing, type(r) AS rel_type, r.notes AS notes,
+           b.id AS id, b.name AS name, b.title AS title, labels(b) AS labels, COUNT {{ (b)--() }} AS degree
+    LIMIT $row_cap
+"""
+
+def collapse_leaves(seed_id, nodes, edges, leaf_degree, min_cluster):
+    # Replace groups of low-degree leaves hanging off the same parent with one cluster stub
+    # per (parent, group); the stub carries what the client needs to expand it later
+    parents = {}
+    for edge in edges:
+        for leaf, other in ((edge["from"], edge["to"]), (edge["to"], edge["from"])):
+            if leaf != seed_id and nodes[leaf]["degree"] <= leaf_degree:
+                parents.setdefault(leaf, set()).add(other)
+    buckets = {}
+    for leaf, leaf_parents in parents.items():
+        if len(leaf_parents) == 1:
+            parent = next(iter(leaf_parents))
+            buckets.setdefault((parent, nodes[leaf]["group"]), []).append(leaf)
+
+    collapsed = set()
+    stubs = []
+    for (parent, group), leaves in buckets.items():
+        if len(leaves) < min_cluster:
+            continue
+        collapsed.update(leaves)
+        stubs.append({
+            "id": f"cluster:{parent}:{group}",
+            "label": f"{len(leaves)} {group}",
+            "group": group,
+            "title": f"{len(leaves)} more {group} connected to {nodes[parent]['label']}",
+            "hops": nodes[parent]["hops"] + 1,
+            "degree": 1,
+            "cluster": {"parent": parent, "group": group, "count": len(leaves)},
+        })
+
+    out_nodes = [node for node_id, node in nodes.items() if node_id not in collapsed] + stubs
+    out_edges = [edge for edge in edges if edge["from"] not in collapsed and edge["to"] not in collapsed]
+    for stub in stubs:
+        out_edges.append(vis_edge(stub["cluster"]["parent"], stub["id"], "cluster", stub["title"]))
+    return out_nodes, out_edges
+
+@app.route("/api/subgraph")
+def api_subgraph():
+    # API endpoint returning the k-hop neighbourhood of a seed node, capped at a node budget.
+    # Low-degree leaves are collapsed into per-group cluster stubs unless collapse=0;
+    # a stub is expanded with ?id=<parent>&depth=1&group=<group>&collapse=0
+    seed_id = request.args.get("id")
+    if not seed_id:
+        return {"error": "Missing id"}, 400
+    depth = max(1, min(request.args.get("depth", 2, type=int), SUBGRAPH_MAX_DEPTH))
+    limit = max(1, min(request.args.get("limit", 300, type=int), SUBGRAPH_MAX_LIMIT))
+    group_filter = request.args.get("group")
+    collapse = request.args.get("collapse", "1") != "0"
+    leaf_degree = request.args.get("leaf_degree", 1, type=int)
+    min_cluster = max(2, request.args.get("min_cluster", 3, type=int))
+
+    nodes = {}
+    edges = {}
+    truncated = False
+    with read_session() as session:
+        seed = session.run(SUBGRAPH_SEED_QUERY, id=seed_id).single()
+        if not seed:
+            return jsonify({"error": "Node not found"}), 404
+        seed_node = vis_node(seed["id"], seed["name"], seed["title"], primary_label(seed["labels"]))
+        seed_node.update(hops=0, degree=seed["degree"])
+        nodes[seed_id] = seed_node
+
+        frontier = [seed_id]
+        for hops in range(1, depth + 1):
+            if not frontier:
+                break
+            next_frontier = []
+            row_cap = limit * 4
+            rows = 0
+            for record in session.run(SUBGRAPH_LAYER_QUERY, frontier=frontier, row_cap=row_cap):
+                rows += 1
+                other = record["id"]
+                if other not in nodes:
+                    node = vis_node(other, record["name"], record["title"], primary_label(record["labels"]))
+                    if group_filter and node["group"] != group_filter:
+                        continue
+                    if len(nodes) >= limit:
+                        truncated = True
+                        continue
+                    node.update(hops=hops, degree=record["degree"])
+                    nodes[other] = node
+                    next_frontier.append(other)
+                if record["outgoing"]:
+                    key = (record["src"], other, record["rel_type"])
+                else:
+                    key = (other, record["src"], record["rel_type"])
+                edges[key] = vis_edge(key[0], key[1], key[2], record["notes"])
+            if rows >= row_cap:
+                truncated = True
+            frontier = next_frontier
+
+    edge_list = list(edges.values())
+    if collapse:
+        node_list, edge_list = collapse_leaves(seed_id, nodes, edge_list, leaf_degree, min_cluster)
+    else:
+        node_list = list(nodes.values())
+    return jsonify({"seed": seed_id, "nodes": node_list, "edges": edge_list, "truncated": truncated})
+
+# Ego networks: up to EGO_MAX_DEPTH hops around a node in one query. Each expanded node
+# contributes at most `max_degree` neighbours (the first by id), so hubs cannot blow up the
+# payload, and each hop expands at most EGO_MAX_NODES // max_degree of the nodes it reached.
+# Results go through the predefined-query cache, so often expanded neighbourhoods are
+# served without a round trip until the next write
+EGO_MAX_DEPTH = 3
+EGO_MAX_DEGREE = int(os.getenv("EGO_MAX_DEGREE", "25"))
+EGO_MAX_DEGREE_LIMIT = 100
+EGO_MAX_NODES = int(os.getenv("EGO_MAX_NODES", "2000"))
+
+def ego_cypher(depth):
+    # One CALL per hop; the found nodes, sampled relationships and frontier are carried as
+    # lists, so an empty hop leaves the row (and the later hops) in place
+    parts = [f"""
+        {match_entity("n0", "$id")}
+        WITH [n0] AS seen, [{{node: n0, degree: COUNT {{ (n0)--() }}, hops: 0}}] AS found,
+             [n0] AS frontier, [] AS rels, false AS truncated
+    """]
+    for hops in range(1, depth + 1):
+        cut = "truncated OR size(new) > $max_frontier" if hops < depth else "truncated"
+        parts.append(f"""
+        CALL {{
+            WITH frontier
+            UNWIND frontier AS a
+            CALL {{
+                WITH a
+                MATCH (a)-[r]-(m)
+                RETURN r, m ORDER BY m.id LIMIT $max_degree
+            }}
+            WITH r, m, COUNT {{ (m)--() }} AS degree
+            RETURN collect(r) AS hop_rels, collect(DISTINCT {{node: m, degree: degree}}) AS reached
+        }}
+        WITH seen, found, rels + hop_rels AS rels, truncated, [x IN reached WHERE NOT x.node IN seen] AS new
+        WITH seen + [x IN new | x.node] AS seen, found + [x IN new | {{node: x.node, degree: x.degree, hops: {hops}}}] AS found,
+             [x IN new | x.node][..$max_frontier] AS frontier, rels,
+             {cut} AS truncated
+        """)
+    parts.append("""
+        RETURN [f IN found | {id: f.node.id, name: f.node.name, title: f.node.title, labels: labels(f.node),
+                              degree: f.degree, hops: f.hops}] AS nodes,
+               [r IN rels | {from: startNode(r).id, to: endNode(r).id, rel_type: type(r), notes: r.notes}] AS edges,
+               truncated
+    """)
+    return "".join(parts)
+
+EGO_QUERIES = {depth: ego_cypher(depth) for depth in range(1, EGO_MAX_DEPTH + 1)}
+
+def ego_payload(seed_id, row):
+    # The vis.js payload of an ego row. Relationships sampled from both ends appear once;
+    # "hidden" counts the relationships of each node that the payload leaves out
+    edges = {}
+    for edge in row["edges"]:
+        edges[(edge["from"], edge["to"], edge["rel_type"])] = vis_edge(edge["from"], edge["to"], edge["rel_type"],
+                                                                       edge["notes"])
+    shown = Counter()
+    for from_id, to_id, _ in edges:
+        shown[from_id] += 1
+        shown[to_id] += 1
+    nodes = []
+    for record in row["nodes"]:
+        node = vis_node(record["id"], record["name"], record["title"], primary_label(record["labels"]))
+        node.update(hops=record["hops"], degree=record["degree"],
+                    hidden=max(record["degree"] - shown[record["id"]], 0))
+        nodes.append(node)
+    return {"seed": seed_id, "nodes": nodes, "edges": list(edges.values()), "truncated": row["truncated"]}
+
+@app.route("/api/ego")
+def api_ego():
+    # API endpoint returning the neighbourhood of a node up to ?depth= hops (default 2),
+    # taking at most ?max_degree= neighbours of every node it expands
+    seed_id = request.args.get("id")
+    if not seed_id:
+        return {"error": "Missing id"}, 400
+    depth = max(1, min(request.args.get("depth", 2, type=int), EGO_MAX_DEPTH))
+    max_degree = max(1, min(request.args.get("max_degree", EGO_MAX_DEGREE, type=int), EGO_MAX_DEGREE_LIMIT))
+    params = {"id": seed_id, "max_degree": max_degree, "max_frontier": max(1, EGO_MAX_NODES // max_degree)}
+
+    snapshot = current_snapshot()
+    if snapshot is not None:
+        i = snapshot.find(seed_id)
+        rows = [snapshot.ego(i, depth, max_degree, params["max_frontier"])] if i is not None else []
+    else:
+        key, cached = query_cache.get(f"ego:{depth}", params)
+        if cached is not None:
+            _, rows = cached
+        else:
+            columns, rows = read_table(EGO_QUERIES[depth], **params)
+            query_cache.put(key, columns, rows)
+    if not rows:
+        return jsonify({"error": "Node not found"}), 404
+    return jsonify(ego_payload(seed_id, rows[0]))
+
+# Change feed: every graph_changed() call is appended to a versioned log so clients can
+# patch their copy of the graph instead of reloading it. By default the log is a SQLite
+# file in the temp directory, shared by all workers on the host; CHANGE_LOG_PATH= (empty)
+# keeps a per-worker log in memory instead, which is only consistent with one worker.
+# Each log has a random id, so a client that switches to a different log (another host,
+# a fresh file) can tell and reload.
+CHANGE_LOG_PATH = os.getenv("CHANGE_LOG_PATH", os.path.join(tempfile.gettempdir(), "graph-changes.sqlite"))
+CHANGE_LOG_SIZE = int(os.getenv("CHANGE_LOG_SIZE", "10000"))
+CHANGES_MAX_LIMIT = 1000
+# An SSE stream ends after this long and the browser reconnects with Last-Event-ID
+CHANGE_STREAM_SECONDS = int(os.getenv("CHANGE_STREAM_SECONDS", "300"))
+CHANGE_STREAM_HEARTBEAT = 15
+
+class ChangeLog:
+    # The last `size` changes of this worker, numbered from 1
+    def __init__(self, size):
+        self.log_id = os.urandom(8).hex()
+        self.entries = deque(maxlen=size)
+        self.version = 0
+        self.condition = threading.Condition()
+
+    def on_change(self, change):
+        with self.condition:
+            self.version += 1
+            self.entries.append((self.version, time.time(), change))
+            self.condition.notify_all()
+
+    def latest(self):
+        return self.version
+
+    def read(self, since, limit):
+        # ([(version, at, change)] after `since`, oldest version still held)
+        with self.condition:
+            oldest = self.entries[0][0] if self.entries else self.version + 1
+            start = max(since - oldest + 1, 0)
+            return list(islice(self.entries, start, start + limit)), oldest
+
+    def wait(self, since, timeout):
+        # True once there is a change after `since`, False on timeout
+        with self.condition:
+            return self.condition.wait_for(lambda: self.version > since, timeout)
+
+class SharedChangeLog(SQLiteStore):
+    # The ChangeLog interface on a SQLite file. Waiting polls the file, since the write
+    # may come from another process
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS changes (version INTEGER PRIMARY KEY AUTOINCREMENT, at REAL, change TEXT)",
+        "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)",
+        f"INSERT OR IGNORE INTO meta VALUES ('change_log_id', '{os.urandom(8).hex()}')",
+    )
+
+    def __init__(self, path, size):
+        super().__init__(path)
+        self.size = size
+        # str(): the meta column has integer affinity, so an all-digit id comes back as a number
+        self.log_id = str(self.connection().execute("SELECT value FROM meta WHERE name = 'change_log_id'").fetchone()[0])
+
+    def on_change(self, change):
+        conn = self.connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            version = conn.execute("INSERT INTO changes (at, change) VALUES (?, ?)",
+                                   (time.time(), json.dumps(change, default=str))).lastrowid
+            conn.execute("DELETE FROM changes WHERE version <= ?", (version - self.size,))
+
+    def latest(self):
+        # The AUTOINCREMENT counter, which survives the log being trimmed to nothing
+        row = self.connection().execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+        return row[0] if row else 0
+
+    def read(self, since, limit):
+        conn = self.connection()
+        oldest = conn.execute("SELECT MIN(version) FROM changes").fetchone()[0]
+        rows = conn.execute("SELECT version, at, change FROM changes WHERE version > ? ORDER BY version LIMIT ?",
+                            (since, limit)).fetchall()
+        return [(version, at, json.loads(change)) for version, at, change in rows], oldest or self.latest() + 1
+
+    def wait(self, since, timeout):
+        deadline = time.monotonic() + timeout
+        while self.latest() <= since:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.5)
+        return True
+
+change_log = SharedChangeLog(CHANGE_LOG_PATH, CHANGE_LOG_SIZE) if CHANGE_LOG_PATH else ChangeLog(CHANGE_LOG_SIZE)
+GRAPH_LISTENERS.append(change_log.on_change)
+
+def change_entry(version, at, change):
+    # A log entry plus the vis.js items a client needs to patch its DataSets; edge ids
+    # follow the "<from>|<type>|<to>" convention of the graph page
+    entry = dict(change, version=version, at=datetime.fromtimestamp(at, timezone.utc).isoformat(timespec="seconds"))
+    op = change["op"]
+    if op in ("node_added", "node_updated"):
+        entry["node"] = vis_node(change["id"], change["name"], change.get("title"), change["type"])
+    elif op in ("rel_added", "rel_updated", "rel_deleted"):
+        entry["edge_id"] = f"{change['from_id']}|{change['rel_type']}|{change['to_id']}"
+        if op != "rel_deleted":
+            edge = vis_edge(change["from_id"], change["to_id"], change["rel_type"], change.get("notes"))
+            entry["edge"] = dict(edge, id=entry["edge_id"])
+    return entry
+
+def changes_reset(since, log_id, oldest):
+    # Whether a client at `since` has missed changes the log no longer holds
+    return (log_id is not None and log_id != change_log.log_id) or since < oldest - 1 or since > change_log.latest()
+
+@app.route("/api/changes")
+def api_changes():
+    # Changes after ?since=<version>, oldest first, up to ?limit= per call ("more" says
+    # whether to call again). Without since, just the current version to start from.
+    # "reset" means changes the client needs are gone from the log: reload in full.
+    # An op of "bulk" (an import) cannot be patched either and also calls for a reload
+    since = request.args.get("since", type=int)
+    log_id = request.args.get("log")
+    if since is None:
+        return jsonify({"log": change_log.log_id, "version": change_log.latest(), "changes": [], "more": False,
+                        "reset": False})
+    limit = max(1, min(request.args.get("limit", 500, type=int), CHANGES_MAX_LIMIT))
+    rows, oldest = change_log.read(since, limit + 1)
+    if changes_reset(since, log_id, oldest):
+        return jsonify({"log": change_log.log_id, "version": change_log.latest(), "changes": [], "more": False,
+                        "reset": True})
+    changes = [change_entry(*row) for row in rows[:limit]]
+    return jsonify({
+        "log": change_log.log_id,
+        "version": changes[-1]["version"] if changes else since,
+        "changes": changes,
+        "more": len(rows) > limit,
+        "reset": False,
+    })
+
+@app.route("/api/changes/stream")
+def api_changes_stream():
+    # The same entries as Server-Sent Events ("change" events with the version as id, a
+    # "reset" event when the client must reload). Each stream holds a worker thread, so
+    # use it with a threaded or async server rather than the default sync workers
+    since = request.headers.get("Last-Event-ID", type=int)
+    if since is None:
+        since = request.args.get("since", change_log.latest(), type=int)
+    log_id = request.args.get("log")
+
+    def generate():
+        position = since
+        deadline = time.monotonic() + CHANGE_STREAM_SECONDS
+        yield "retry: 2000\n\n"
+        while time.monotonic() < deadline:
+            rows, oldest = change_log.read(position, CHANGES_MAX_LIMIT)
+            if changes_reset(position, log_id, oldest):
+                yield f"event: reset\ndata: {json.dumps({'log': change_log.log_id, 'version': change_log.latest()})}\n\n"
+                return
+            for row in rows:
+                position = row[0]
+                yield f"id: {position}\nevent: change\ndata: {json.dumps(change_entry(*row))}\n\n"
+            wait = min(CHANGE_STREAM_HEARTBEAT, max(deadline - time.monotonic(), 0))
+            if not rows and not change_log.wait(position, wait):
+                yield ": keepalive\n\n"
+
+    return Response(generate(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Snapshot mode: read routes answered from a read-only copy of the graph in a
+# memory-mapped file, so they skip Neo4j entirely. Strings are interned into one table
+# and nodes, edges and adjacency are flat int32 arrays, so every worker on the host maps
+# the same pages. The file records the change-log version it was built at: a route only
+# uses it while that is still the latest version, and otherwise falls back to Neo4j and
+# schedules a rebuild. Rebuilds write a new file and rename it over the old one, and
+# workers remap it on their next request. Staleness checks need the shared change log.
+SNAPSHOT_ENABLED = os.getenv("SNAPSHOT", "0") == "1" and bool(CHANGE_LOG_PATH)
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", os.path.join(tempfile.gettempdir(), "graph-snapshot.bin"))
+SNAPSHOT_TTL = int(os.getenv("SNAPSHOT_TTL", "300"))
+SNAPSHOT_MAGIC = b"GRAPHSN1"
+# magic, change log id, built at (epoch seconds), change version, nodes, edges, strings, string bytes
+SNAPSHOT_HEADER = struct.Struct("<8s32sdqqqqq")
+if os.getenv("SNAPSHOT", "0") == "1" and not SNAPSHOT_ENABLED:
+    app.logger.warning("SNAPSHOT=1 needs the shared change log (CHANGE_LOG_PATH); snapshot mode is off")
+
+class SnapshotNode:
+    __slots__ = ("id", "name", "title", "label")
+
+    def __init__(self, node_id, name, title, label):
+        self.id = node_id
+        self.name = name
+        self.title = title
+        self.label = label
+
+def snapshot_sections(n, m, strings, string_bytes):
+    # (attribute, typecode, length) of the arrays after the header, in file order
+    return [
+        ("string_offsets", "q", strings + 1),
+        ("string_data", "B", string_bytes),
+        ("node_ids", "i", n),
+        ("node_names", "i", n),
+        ("node_titles", "i", n),
+        ("node_labels", "i", n),
+        ("name_order", "i", n),
+        ("out_offsets", "i", n + 1),
+        ("edge_src", "i", m),
+        ("edge_dst", "i", m),
+        ("edge_types", "i", m),
+        ("edge_notes", "i", m),
+        ("in_offsets", "i", n + 1),
+        ("in_edges", "i", m),
+    ]
+
+def write_snapshot(path, log_id, change_version):
+    # Read the graph from Neo4j and atomically replace the snapshot file; returns (nodes, edges)
+    strings = {}
+
+    def intern(value):
+        if value is None:
+            return -1
+        return strings.setdefault(str(value), len(strings))
+
+    with read_session() as session:
+        nodes = {}
+        for label, cypher in FULL_GRAPH_NODE_QUERIES:
+            for record in session.run(cypher):
+                nodes.setdefault(str(record["id"]), (record["name"], record["title"], label))
+        ids = sorted(nodes)
+        index = {node_id: i for i, node_id in enumerate(ids)}
+        edges = []
+        for record in session.run(FULL_GRAPH_EDGE_QUERY):
+            a, b = index.get(str(record["from_id"])), index.get(str(record["to_id"]))
+            if a is not None and b is not None:
+                edges.append((a, b, intern(record["label"]), intern(record["title"])))
+    n, m = len(ids), len(edges)
+    # Edges grouped by source node for the outgoing adjacency; in_edges lists them by target
+    edges.sort(key=lambda edge: edge[:2])
+    out_offsets = array("i", [0]) * (n + 1)
+    in_offsets = array("i", [0]) * (n + 1)
+    for a, b, _, _ in edges:
+        out_offsets[a + 1] += 1
+        in_offsets[b + 1] += 1
+    for i in range(n):
+        out_offsets[i + 1] += out_offsets[i]
+        in_offsets[i + 1] += in_offsets[i]
+    in_edges = array("i", sorted(range(m), key=lambda e: edges[e][1]))
+
+    arrays = {
+        "node_ids": array("i", (intern(node_id) for node_id in ids)),
+        "node_names": array("i", (intern(nodes[node_id][0]) for node_id in ids)),
+        "node_titles": array("i", (intern(nodes[node_id][1]) for node_id in ids)),
+        "node_labels": array("i", (intern(nodes[node_id][2]) for node_id in ids)),
+        "name_order": array("i", sorted(range(n), key=lambda i: nodes[ids[i]][0] or "")),
+        "out_offsets": out_offsets,
+        "edge_src": array("i", (edge[0] for edge in edges)),
+        "edge_dst": array("i", (edge[1] for edge in edges)),
+        "edge_types": array("i", (edge[2] for edge in edges)),
+        "edge_notes": array("i", (edge[3] for edge in edges)),
+        "in_offsets": in_offsets,
+        "in_edges": in_edges,
+    }
+    encoded = [value.encode() for value in strings]
+    string_offsets = array("q", [0])
+    for value in encoded:
+        string_offsets.append(string_offsets[-1] + len(value))
+    arrays["string_offsets"] = string_offsets
+    arrays["string_data"] = b"".join(encoded)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(dir=directory, prefix=".graph-snapshot-", delete=False) as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, log_id.encode(), time.time(), change_version, n, m,
+                                     len(encoded), len(arrays["string_data"])))
+        for name, _, _ in snapshot_sections(n, m, len(encoded), len(arrays["string_data"])):
+            data = bytes(arrays[name])
+            # Every section starts on an 8-byte boundary
+            f.write(data + bytes(-len(data) % 8))
+    os.replace(f.name, path)
+    return n, m
+
+class MappedGraph:
+    # Read-only view of one snapshot file. Nodes are numbered in id order and edges in
+    # source order; strings are decoded from the shared table on access
+    def __init__(self, f):
+        stat = os.fstat(f.fileno())
+        self.stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, log_id, self.built_at, self.change_version, self.n, self.m, strings, string_bytes = \
+            SNAPSHOT_HEADER.unpack_from(self.buffer)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError("Not a graph snapshot file")
+        self.log_id = log_id.rstrip(b"\0").decode()
+        view = memoryview(self.buffer)
+        position = SNAPSHOT_HEADER.size
+        for name, typecode, length in snapshot_sections(self.n, self.m, strings, string_bytes):
+            size = length * struct.calcsize(typecode)
+            setattr(self, name, view[position:position + size].cast(typecode))
+            position += size + (-size % 8)
+
+    def string(self, i):
+        if i < 0:
+            return None
+        return str(self.string_data[self.string_offsets[i]:self.string_offsets[i + 1]], "utf-8")
+
+    def node(self, i):
+        return SnapshotNode(self.string(self.node_ids[i]), self.string(self.node_names[i]),
+                            self.string(self.node_titles[i]), self.string(self.node_labels[i]))
+
+    def find(self, node_id):
+        # Position of the node with this id, or None
+        i = bisect_left(range(self.n), node_id, key=lambda i: self.string(self.node_ids[i]))
+        if i < self.n and self.string(self.node_ids[i]) == node_id:
+            return i
+        return None
+
+    def find_name(self, name):
+        order = self.name_order
+        start = bisect_left(range(self.n), name, key=lambda k: self.string(self.node_names[order[k]]) or "")
+        matches = []
+        for k in range(start, self.n):
+            i = order[k]
+            node_name = self.string(self.node_names[i])
+            if (node_name or "") != name:
+                break
+            if node_name is not None:
+                matches.append(i)
+        return matches
+
+    def incident(self, i):
+        # (edge, other node, outgoing) for every relationship of node i
+        for e in range(self.out_offsets[i], self.out_offsets[i + 1]):
+            yield e, self.edge_dst[e], True
+        for k in range(self.in_offsets[i], self.in_offsets[i + 1]):
+            e = self.in_edges[k]
+            yield e, self.edge_src[e], False
+
+    def vis_node(self, i):
+        node = self.node(i)
+        return vis_node(node.id, node.name, node.title, node.label)
+
+    def vis_edge(self, e):
+        return vis_edge(self.string(self.node_ids[self.edge_src[e]]), self.string(self.node_ids[self.edge_dst[e]]),
+                        self.string(self.edge_types[e]), self.string(self.edge_notes[e]))
+
+    def items(self):
+        # The /full-graph items: every node, then every edge
+        for i in range(self.n):
+            yield "node", self.vis_node(i)
+        for e in range(self.m):
+            yield "edge", self.vis_edge(e)
+
+    def page_items(self, after, limit, cursor):
+        # One keyset page as in full_graph_page_items: nodes with ids after `after`, then
+        # their outgoing edges
+        start = 0
+        if after is not None:
+            start = bisect_left(range(self.n), after, key=lambda i: self.string(self.node_ids[i]))
+            if start < self.n and self.string(self.node_ids[start]) == after:
+                start += 1
+        stop = min(start + limit, self.n)
+        for i in range(start, stop):
+            yield "node", self.vis_node(i)
+        for e in range(self.out_offsets[start], self.out_offsets[stop]):
+            yield "edge", self.vis_edge(e)
+        if stop - start == limit:
+            cursor["next"] = self.string(self.node_ids[stop - 1])
+
+    def relations(self, i):
+        # The /api/node-relations rows of node i
+        node_id = self.string(self.node_ids[i])
+        rows = []
+        for e, j, outgoing in self.incident(i):
+            other = self.node(j)
+            rows.append({
+                "rel_type": self.string(self.edge_types[e]),
+                "notes": self.string(self.edge_notes[e]),
+                "other_id": other.id,
+                "other_name": other.name,
+                "other_type": other.label,
+                "from_id": node_id if outgoing else other.id,
+                "to_id": other.id if outgoing else node_id,
+            })
+        return rows
+
+    def ego_node(self, i, degree, hops):
+        node = self.node(i)
+        return {"id": node.id, "name": node.name, "title": node.title, "labels": [node.label],
+                "degree": degree, "hops": hops}
+
+    def ego(self, i, depth, max_degree, max_frontier):
+        # The /api/ego row of node i, sampled as ego_cypher does: the first `max_degree`
+        # neighbours (in id order, which is node order) of every expanded node
+        degree = lambda j: self.out_offsets[j + 1] - self.out_offsets[j] + self.in_offsets[j + 1] - self.in_offsets[j]
+        seen = {i}
+        nodes = [self.ego_node(i, degree(i), 0)]
+        edges = []
+        frontier = [i]
+        truncated = False
+        for hops in range(1, depth + 1):
+            new = []
+            for a in frontier:
+                for e, j, _ in sorted(self.incident(a), key=lambda item: item[1])[:max_degree]:
+                    edges.append({"from": self.string(self.node_ids[self.edge_src[e]]),
+                                  "to": self.string(self.node_ids[self.edge_dst[e]]),
+                                  "rel_type": self.string(self.edge_types[e]), "notes": self.string(self.edge_notes[e])})
+                    if j not in seen:
+                        seen.add(j)
+                        new.append(j)
+                        nodes.append(self.ego_node(j, degree(j), hops))
+            truncated = truncated or (hops < depth and len(new) > max_frontier)
+            frontier = new[:max_frontier]
+        return {"nodes": nodes, "edges": edges, "truncated": truncated}
+
+    def query_rows(self, spec, identifier):
+        # Rows of a QUERIES "snapshot" lookup, ordered like its order_by (other node's
+        # name, then the relationship)
+        matched = set(self.find_name(identifier))
+        i = self.find(identifier)
+        if i is not None:
+            matched.add(i)
+        found = []
+        for i in matched:
+            if self.string(self.node_labels[i]) != spec["label"]:
+                continue
+            for e, j, _ in self.incident(i):
+                if self.string(self.edge_types[e]) in spec["rel_types"] and \
+                        self.string(self.node_labels[j]) == spec["other"]:
+                    found.append((self.node(j), e))
+        found.sort(key=lambda item: (item[0].name is None, item[0].name or "", item[1]))
+        rows = []
+        for other, e in found:
+            fields = {"id": other.id, "name": other.name, "title": other.title,
+                      "notes": self.string(self.edge_notes[e])}
+            rows.append({column: fields[field] for column, field in spec["columns"].items()})
+        return rows
+
+class SnapshotStore:
+    # Maps the snapshot file in this worker and rebuilds it in a background thread when
+    # it falls behind the change log or is older than SNAPSHOT_TTL
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.graph = None
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.served = 0
+        self.fallbacks = 0
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def mapped(self):
+        # The graph in the file now at self.path, remapped when the file was replaced
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        with self.lock:
+            if self.graph is None or self.graph.stamp != (stat.st_ino, stat.st_mtime_ns, stat.st_size):
+                with open(self.path, "rb") as f:
+                    self.graph = MappedGraph(f)
+            return self.graph
+
+    def current(self):
+        # The mapped graph when it includes every change in the change log, else None
+        self.start()
+        try:
+            graph = self.mapped()
+            fresh = graph is not None and graph.log_id == change_log.log_id and \
+                graph.change_version == change_log.latest()
+        except (OSError, ValueError, struct.error, sqlite3.Error) as e:
+            app.logger.warning("Graph snapshot unavailable: %s", e)
+            graph, fresh = None, False
+        if not fresh or time.time() - graph.built_at > SNAPSHOT_TTL:
+            self.wakeup.set()
+        if not fresh:
+            self.fallbacks += 1
+            return None
+        self.served += 1
+        return graph
+
+    def on_change(self, change):
+        self.wakeup.set()
+
+    def run(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            try:
+                self.refresh()
+            except Exception:
+                app.logger.exception("Graph snapshot rebuild failed")
+            # Coalesce bursts of writes into one rebuild
+            time.sleep(1)
+
+    def refresh(self):
+        # Workers that want a rebuild at the same time queue on a lock file; the later
+        # ones find the file current and stop
+        with open(self.path + ".lock", "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            log_id, version = change_log.log_id, change_log.latest()
+            graph = self.mapped()
+            if graph is not None and graph.log_id == log_id and graph.change_version == version and \
+                    time.time() - graph.built_at <= SNAPSHOT_TTL:
+                return
+            started = time.monotonic()
+            n, m = write_snapshot(self.path, log_id, version)
+        app.logger.info("Graph snapshot at change %s: %d nodes, %d edges, %.1fs",
+                        version, n, m, time.monotonic() - started)
+
+    def metric_lines(self):
+        graph = self.graph
+        return [
+            "# HELP graph_snapshot_requests_total Snapshot-mode reads by whether the snapshot was current",
+            "# TYPE graph_snapshot_requests_total counter",
+            f'graph_snapshot_requests_total{{result="served"}} {self.served}',
+            f'graph_snapshot_requests_total{{result="fallback"}} {self.fallbacks}',
+            "# HELP graph_snapshot_age_seconds Age of the mapped snapshot",
+            "# TYPE graph_snapshot_age_seconds gauge",
+            f"graph_snapshot_age_seconds {time.time() - graph.built_at if graph else 0:.1f}",
+        ]
+
+snapshot_store = SnapshotStore(SNAPSHOT_PATH)
+if SNAPSHOT_ENABLED:
+    GRAPH_LISTENERS.append(snapshot_store.on_change)
+    METRICS_COLLECTORS.append(snapshot_store.metric_lines)
+
+def current_snapshot():
+    return snapshot_store.current() if SNAPSHOT_ENABLED else None
+
+def snapshot_query_table(query_info, params):
+    # (columns, rows) of a predefined query from the snapshot, or None when it has to run
+    # on Neo4j; honours the skip/limit of paged_cypher
+    spec = query_info.get("snapshot")
+    identifier = params.get("identifier")
+    if spec is None or not isinstance(identifier, str):
+        return None
+    graph = current_snapshot()
+    if graph is None:
+        return None
+    rows = graph.query_rows(spec, identifier)
+    skip = params.get("skip", 0)
+    if "limit" in params:
+        rows = rows[skip:skip + params["limit"]]
+    else:
+        rows = rows[skip:]
+    return list(spec["columns"]), rows
+
+@app.cli.command("init-schema")
+def init_schema_command():
+    # Create the id constraints and name indexes, e.g. as a deploy/migration step
+    for line in ensure_schema():
+        click.echo(line)
+
+@app.cli.command("compute-analytics")
+@click.option("--write-back/--no-write-back", default=True, show_default=True,
+              help="Store degree, pagerank, betweenness and community on the nodes.")
+def compute_analytics_command(write_back):
+    # Compute the graph analytics once and write them back, e.g. from a scheduled job
+    if np is None:
+        raise click.ClickException("numpy is required for the analytics")
+    summary = graph_analytics.refresh(write_back=write_back)
+    click.echo(f"{summary['nodes']} nodes, {summary['edges']} edges, {summary['communities']} communities "
+               f"in {summary['seconds']}s (betweenness from {summary['betweenness_sources']} sources)")
+
+@app.cli.command("import-graph")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(["json", "ndjson", "csv"]), help="Defaults to the file extension.")
+@click.option("--batch-size", default=IMPORT_BATCH_SIZE, show_default=True)
+@click.option("--checkpoint", type=click.Path(dir_okay=False), help="File recording the rows committed so far.")
+@click.option("--resume", is_flag=True, help="Skip the rows recorded in --checkpoint.")
+def import_graph_command(path, fmt, batch_size, checkpoint, resume):
+    # Bulk load a file into Neo4j, e.g. `flask import-graph export.json --checkpoint import.ckpt`
+    resume_from = 0
+    if resume:
+        if not checkpoint or not os.path.exists(checkpoint):
+            raise click.UsageError("--resume needs an existing --checkpoint file")
+        with open(checkpoint) as f:
+            resume_from = int(f.read().strip() or 0)
+
+    def on_batch(stats):
+        if checkpoint:
+            with open(checkpoint, "w") as f:
+                f.write(str(stats["committed_rows"]))
+        click.echo(f"{stats['committed_rows']} rows committed ({stats['rows_per_sec']} rows/sec)")
+
+    with open(path, "rb") as stream:
+        try:
+            stats = bulk_import(stream, fmt or detect_import_format(path, None), batch_size=batch_size,
+                                resume_from=resume_from, on_batch=on_batch)
+        except ImportFailed as e:
+            raise click.ClickException(
+                f"{e.cause} after {e.stats['committed_rows']} rows; rerun with --resume to continue"
+            )
+    click.echo(f"Imported {stats['imported']} rows in {stats['seconds']}s ({stats['rows_per_sec']} rows/sec), "
+               f"rejected {stats['rejected']}")
+    for error in stats["errors"]:
+        click.echo(f"  {error}")
+
 if __name__ == "__main__":
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
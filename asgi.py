@@ -0,0 +1,242 @@
+import asyncio
+import os
+import time
+
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from neo4j import READ_ACCESS, AsyncGraphDatabase, unit_of_work
+from neo4j.exceptions import Neo4jError
+from quart import Quart, Response, jsonify, render_template, request, stream_template, stream_with_context
+
+import app as wsgi
+
+# Async serving mode: `hypercorn asgi:application`. The read routes that fan out to several
+# Neo4j queries are served by a Quart app on the async driver, with their independent
+# queries run concurrently; every other route falls through to the Flask app, which runs
+# on the event loop's thread pool. Both share the catalog cache, path index and metrics
+# of app.py, so writes made through the Flask routes invalidate what the async ones read.
+ASYNC_PATHS = {"/network-analysis", "/full-graph", "/export-json", "/query", "/api/query"}
+# The thread-pool fallback buffers request bodies, so this also caps /api/import uploads
+ASGI_MAX_BODY = int(os.getenv("ASGI_MAX_BODY", str(256 * 1024 * 1024)))
+
+quart_app = Quart(__name__)
+async_driver = AsyncGraphDatabase.driver(wsgi.NEO4J_URI, auth=(wsgi.NEO4J_USER, wsgi.NEO4J_PASSWORD),
+                                         **wsgi.driver_config())
+
+async def run_read(query, params=None, timeout=None):
+    # Run one statement in its own session and read transaction, aborted by Neo4j after
+    # `timeout` seconds when one is given; returns (keys, rows)
+    key = wsgi.metrics.fingerprint(query)
+    stats = wsgi.request_stats.get()
+    if stats is not None:
+        stats["round_trips"] += 1
+
+    async def work(tx):
+        result = await tx.run(query, params or {})
+        return await result.keys(), [dict(record) async for record in result]
+
+    if timeout is not None:
+        work = unit_of_work(timeout=timeout)(work)
+    started = time.perf_counter()
+    try:
+        async with async_driver.session(database=wsgi.NEO4J_DATABASE) as session:
+            keys, rows = await session.execute_read(work)
+    except Exception:
+        wsgi.metrics.observe_query(key, query, time.perf_counter() - started, 0, True)
+        raise
+    wsgi.metrics.observe_query(key, query, time.perf_counter() - started, len(rows), False)
+    return keys, rows
+
+async def fetch(query, **params):
+    _, rows = await run_read(query, params)
+    return rows
+
+async def search_paths(analysis_type, cypher, params):
+    # As wsgi.search_paths, with the two endpoint lists read concurrently
+    search = wsgi.PathSearch(analysis_type, cypher, params)
+    try:
+        endpoints = [rows for _, rows in await asyncio.gather(
+            *(run_read(query, query_params, search.timeout()) for query, query_params in search.endpoint_queries())
+        )]
+        for query, query_params in search.batches(endpoints):
+            if not search.running():
+                break
+            _, rows = await run_read(query, query_params, search.timeout())
+            search.add(rows)
+    except Neo4jError as e:
+        if not wsgi.is_timeout(e):
+            raise
+        search.timed_out()
+    return search.finish()
+
+async def entity_catalog(kind):
+    entry = wsgi.catalog_cache.get(kind)
+    if entry is not None:
+        return entry
+    version = wsgi.catalog_versions[kind]
+    return wsgi.store_catalog(kind, version, await fetch(wsgi.CATALOG_QUERIES[kind]))
+
+async def encoded(chunks):
+    for chunk in chunks:
+        yield chunk.encode() if isinstance(chunk, str) else chunk
+
+@quart_app.before_request
+async def start_request_timer():
+    wsgi.start_request_timer()
+
+@quart_app.after_request
+async def record_request(response):
+    # Unlike the Flask hook, streamed bodies are timed only until their first byte is ready
+    stats = wsgi.request_stats.get()
+    if stats is not None:
+        wsgi.metrics.observe_request(request.endpoint or "unmatched", request.method, response.status_code,
+                                     time.perf_counter() - stats["started"], stats["round_trips"])
+    return response
+
+@quart_app.after_serving
+async def close_driver():
+    await async_driver.close()
+
+@quart_app.route("/query", methods=["GET", "POST"])
+async def run_query():
+    values = await request.values
+    query_info, params, error = wsgi.plan_query(values)
+    if error:
+        return error, 400
+    if values.get("stream") == "1":
+        return await stream_query_results(query_info, params, values)
+    page, page_size, error = wsgi.parse_query_page(values)
+    if error:
+        return error, 400
+    page_params = dict(params, skip=(page - 1) * page_size, limit=page_size + 1)
+    try:
+        key, cached = wsgi.query_lookup(values["query_id"], query_info, page_params)
+        if cached is not None:
+            columns, results = cached
+        else:
+            columns, results = await run_read(wsgi.paged_cypher(query_info), page_params)
+            wsgi.query_cache.put(key, columns, results)
+    except Exception as e:
+        return await render_template("results.html", **wsgi.query_error_context(e))
+    return await render_template("results.html", **wsgi.query_page_context(query_info, values, columns, results,
+                                                                           page, page_size))
+
+async def stream_query_results(query_info, params, values):
+    # As in app.py, rendered while rows come off the async cursor
+    @stream_with_context
+    async def generate():
+        async with async_driver.session(database=wsgi.NEO4J_DATABASE, default_access_mode=READ_ACCESS) as session:
+            result = await session.run(wsgi.streamed_cypher(query_info), dict(params, limit=wsgi.QUERY_STREAM_LIMIT))
+            rows = (record.data() async for record in result)
+            chunks = await stream_template("results.html", title=query_info["description"], columns=await result.keys(),
+                                           results=rows, streamed=True, **wsgi.query_links(values))
+            buf = []
+            size = 0
+            async for chunk in chunks:
+                buf.append(chunk)
+                size += len(chunk)
+                if size >= 65536:
+                    yield "".join(buf).encode()
+                    buf = []
+                    size = 0
+            if buf:
+                yield "".join(buf).encode()
+
+    return Response(generate(), mimetype="text/html")
+
+@quart_app.route("/api/query", methods=["POST"])
+async def api_query():
+    # Unlike the Flask route, the cache misses run concurrently, each in its own session
+    planned, errors = wsgi.plan_query_batch(await request.get_json(silent=True))
+    if errors:
+        return jsonify({"errors": errors}), 400
+    lookups = [wsgi.query_lookup(query_id, query_info, params) for query_id, query_info, params in planned]
+    misses = [item for item, (_, cached) in zip(planned, lookups) if cached is None]
+    try:
+        fetched = iter(await asyncio.gather(
+            *(run_read(wsgi.paged_cypher(query_info), params) for _, query_info, params in misses)
+        ))
+    except Exception as e:
+        return jsonify({"errors": [str(e)]}), 500
+    results = []
+    for (query_id, _, params), (key, cached) in zip(planned, lookups):
+        if cached is None:
+            cached = next(fetched)
+            wsgi.query_cache.put(key, *cached)
+        results.append(wsgi.query_batch_result(query_id, params, *cached))
+    return jsonify({"results": results})
+
+@quart_app.route("/network-analysis", methods=["GET", "POST"])
+async def network_analysis():
+    form = await request.form if request.method == "POST" else {}
+    # The dropdown catalogs (and the people catalog behind name lookups) load concurrently
+    kinds = ["companies", "governments"]
+    if form.get("analysis_type") == "person_person":
+        kinds.append("people")
+    catalogs = await asyncio.gather(*(entity_catalog(kind) for kind in kinds))
+    (companies, _), (governments, _) = catalogs[:2]
+    context, cypher, params = wsgi.plan_network_analysis(form)
+
+    if request.method == "POST" and cypher:
+        # The path index may need a (blocking) rebuild, so it runs off the event loop
+        indexed = await asyncio.to_thread(wsgi.indexed_paths, context["analysis_type"], params)
+        if indexed is not None:
+            context["results"], context["columns"] = indexed
+        else:
+            try:
+                context["results"], context["partial"] = await search_paths(context["analysis_type"], cypher, params)
+                context["columns"] = ["Path_Nodes", "Path_Edges"]
+            except Exception as e:
+                context["results"] = [{"Error": str(e)}]
+                context["columns"] = ["Error"]
+        wsgi.compact_analysis_results(context)
+
+    return await render_template("network_analysis.html", companies=companies, governments=governments, **context)
+
+@quart_app.route("/full-graph")
+async def full_graph():
+    # The node and edge queries run concurrently, so the graph is read in full before
+    # encoding starts rather than streamed off a single cursor
+    fmt, after, limit, error = wsgi.parse_full_graph_args(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    cached = wsgi.cached_full_graph(fmt, after, limit, request)
+    if cached is not None:
+        return cached
+    changes = wsgi.change_position()
+    snapshot = wsgi.current_snapshot()
+    if snapshot is not None:
+        cursor = {"next": None} if limit is not None else None
+        items = snapshot.items() if cursor is None else snapshot.page_items(after, limit, cursor)
+    elif limit is None:
+        cursor = None
+        labels = [label for label, _ in wsgi.FULL_GRAPH_NODE_QUERIES]
+        *node_rows, edge_rows = await asyncio.gather(
+            *(fetch(cypher) for _, cypher in wsgi.FULL_GRAPH_NODE_QUERIES), fetch(wsgi.FULL_GRAPH_EDGE_QUERY)
+        )
+        items = wsgi.full_graph_items(zip(labels, node_rows), edge_rows)
+    else:
+        cursor = {"next": None}
+        records = await fetch(wsgi.full_graph_page_cypher(after), after=after, limit=limit)
+        items = wsgi.full_graph_page_items(records, limit, cursor)
+    items, layout = wsgi.full_graph_layout(items)
+    return Response(encoded(wsgi.full_graph_body(fmt, items, cursor, layout, changes)),
+                    mimetype=wsgi.FULL_GRAPH_MIMETYPES[fmt])
+
+@quart_app.route("/export-json")
+async def export_json():
+    # All export queries run concurrently; sections are then encoded in their usual order
+    fmt, encoding, error = wsgi.parse_export_args(request.args, request.accept_encodings)
+    if error:
+        return jsonify({"error": error}), 400
+    section_rows = await asyncio.gather(*(fetch(cypher) for _, _, cypher in wsgi.EXPORT_QUERIES))
+    sections = [(top, section, rows) for (top, section, _), rows in zip(wsgi.EXPORT_QUERIES, section_rows)]
+    mimetype, headers = wsgi.export_headers(fmt, encoding)
+    return Response(encoded(wsgi.export_body(fmt, encoding, sections)), mimetype=mimetype, headers=headers)
+
+wsgi_fallback = AsyncioWSGIMiddleware(wsgi.app, max_body_size=ASGI_MAX_BODY)
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan" or (scope["type"] == "http" and scope["path"] in ASYNC_PATHS):
+        await quart_app(scope, receive, send)
+    else:
+        await wsgi_fallback(scope, receive, send)
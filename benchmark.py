@@ -0,0 +1,475 @@
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from array import array
+from bisect import bisect_right
+from collections import Counter, defaultdict
+
+import click
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Benchmark harness for the Flask routes. It generates a synthetic Person/Company/Government
+# Body graph, loads it into Neo4j through bulk_import() (or into an in-process stand-in that
+# answers the app's fixed read queries), drives the routes through the Flask test client and
+# writes latency percentiles, peak RSS and Neo4j rows/sec to a JSON results file.
+#
+#   python benchmark.py run --scale 10000 --backend standin --output before.json
+#   python benchmark.py run --scale 10000 --backend neo4j --reset --output after.json
+#   python benchmark.py compare before.json after.json
+
+TITLES = ["Director", "Manager", "Analyst", "Engineer", "Adviser", "Minister", "Secretary", "Consultant"]
+REL_NOTES = [None, None, None, "met at conference", "board member", "former colleague"]
+
+def graph_sizes(nodes):
+    governments = max(1, nodes // 50)
+    companies = max(1, nodes // 10)
+    return nodes - companies - governments, companies, governments
+
+def generate_graph(nodes, seed=42, knows_per_person=3):
+    # Yields import rows (the NDJSON format of /api/import). `knows` edges follow
+    # preferential attachment, so person degree is power-law distributed; organisation
+    # sizes are skewed the same way through a squared uniform draw
+    rng = random.Random(seed)
+    people, companies, governments = graph_sizes(nodes)
+    person_ids = [f"p{i:07d}" for i in range(people)]
+    org_ids = [f"c{i:06d}" for i in range(companies)] + [f"g{i:05d}" for i in range(governments)]
+
+    for i, person_id in enumerate(person_ids):
+        yield {"kind": "node", "type": "Person", "id": person_id, "name": f"Person {i}", "title": rng.choice(TITLES)}
+    for i in range(companies):
+        yield {"kind": "node", "type": "Company", "id": org_ids[i], "name": f"Company {i}"}
+    for i in range(governments):
+        yield {"kind": "node", "type": "Government Body", "id": org_ids[companies + i], "name": f"Government Body {i}"}
+
+    # Each endpoint appears once per incident edge plus once for itself, so sampling it
+    # uniformly picks people proportionally to degree + 1
+    endpoints = array("i")
+    for i in range(people):
+        targets = {endpoints[rng.randrange(len(endpoints))] for _ in range(knows_per_person)} if endpoints else set()
+        for j in targets:
+            yield {"kind": "relationship", "type": "knows", "from": person_ids[i], "to": person_ids[j],
+                   "notes": rng.choice(REL_NOTES)}
+            endpoints.append(j)
+        endpoints.extend([i] * (len(targets) + 1))
+
+    for _ in range(people // 5):
+        a, b = rng.randrange(people), rng.randrange(people)
+        if a != b:
+            yield {"kind": "relationship", "type": "works_with", "from": person_ids[a], "to": person_ids[b],
+                   "notes": rng.choice(REL_NOTES)}
+
+    for person_id in person_ids:
+        employer = org_ids[int(len(org_ids) * rng.random() ** 2)]
+        yield {"kind": "relationship", "type": "employed", "from": person_id, "to": employer, "notes": None}
+        if rng.random() < 0.3:
+            former = org_ids[int(len(org_ids) * rng.random() ** 2)]
+            if former != employer:
+                yield {"kind": "relationship", "type": "formerly_employed", "from": person_id, "to": former,
+                       "notes": rng.choice(REL_NOTES)}
+
+# --- In-process stand-in ---
+# Answers the fixed read queries behind the catalog, /full-graph, /export-json and the
+# path index from memory. It measures the app's own cost (serialisation, path search,
+# templates) with no database time; any other statement returns no rows and is counted
+# as unsupported in the results.
+
+class StandInRecord(dict):
+    def data(self):
+        return dict(self)
+
+class StandInResult:
+    def __init__(self, rows):
+        self.rows = [StandInRecord(row) for row in rows]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def keys(self):
+        return list(self.rows[0].keys()) if self.rows else []
+
+    def single(self, strict=False):
+        return self.rows[0] if self.rows else None
+
+    def data(self):
+        return [dict(row) for row in self.rows]
+
+    def consume(self):
+        return None
+
+class StandInSession:
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def close(self):
+        pass
+
+    def run(self, query, parameters=None, **kwargs):
+        params = dict(parameters or {}, **kwargs)
+        return StandInResult(self.graph.answer(getattr(query, "text", query), params))
+
+    def execute_read(self, fn, *args, **kwargs):
+        return fn(self, *args, **kwargs)
+
+    execute_write = execute_read
+
+class StandInDriver:
+    def __init__(self, graph):
+        self.graph = graph
+
+    def session(self, **kwargs):
+        return StandInSession(self.graph)
+
+    def close(self):
+        pass
+
+class StandInGraph:
+    def __init__(self, rows, app_module):
+        self.nodes = {}
+        self.rels = []
+        for row in rows:
+            if row["kind"] == "node":
+                self.nodes[row["id"]] = (row["type"], row["name"], row.get("title"))
+            else:
+                self.rels.append((row["from"], row["to"], row["type"], row.get("notes")))
+        self.sorted_ids = sorted(self.nodes)
+        self.out = defaultdict(list)
+        for rel in self.rels:
+            self.out[rel[0]].append(rel)
+        self.unsupported = Counter()
+        self.handlers = {}
+        self.register(app_module)
+
+    def register(self, app_module):
+        def add(text, handler):
+            self.handlers.setdefault(" ".join(text.split()), handler)
+
+        for kind, label in app_module.SEARCH_KIND_LABELS.items():
+            add(app_module.CATALOG_QUERIES[kind], lambda p, label=label: self.entity_rows(label, ("id", "name")))
+        add(app_module.CATALOG_QUERIES["nodes"], lambda p: (
+            {"id": node_id, "name": name, "type": label} for node_id, (label, name, _) in self.nodes.items()
+        ))
+        for label, text in app_module.FULL_GRAPH_NODE_QUERIES:
+            add(text, lambda p, label=label: self.entity_rows(label, ("id", "name", "title")))
+        add(app_module.FULL_GRAPH_EDGE_QUERY, lambda p: (
+            {"from_id": a, "to_id": b, "label": rel_type, "title": notes} for a, b, rel_type, notes in self.rels
+        ))
+        add(app_module.FULL_GRAPH_PAGE_QUERY, self.full_graph_page)
+        add(app_module.FULL_GRAPH_FIRST_PAGE_QUERY, self.full_graph_page)
+        for _, section, text in app_module.EXPORT_QUERIES:
+            if section in app_module.EXPORT_ENTITY_SECTIONS:
+                label = app_module.EXPORT_ENTITY_SECTIONS[section]
+                fields = ("id", "name", "title") if label == "Person" else ("id", "name")
+                add(text, lambda p, label=label, fields=fields: self.entity_rows(label, fields))
+            else:
+                add(text, lambda p, spec=app_module.EXPORT_RELATIONSHIP_SECTIONS[section]: self.export_rels(spec))
+        add(app_module.PATH_INDEX_ORGS_QUERY, lambda p: (
+            {"id": node_id, "name": name, "title": title, "labels": [label]}
+            for node_id, (label, name, title) in self.nodes.items() if label != "Person"
+        ))
+        add(app_module.PATH_INDEX_SOCIAL_QUERY, lambda p: (
+            {"from_id": a, "to_id": b, "type": rel_type, "notes": notes}
+            for a, b, rel_type, notes in self.rels if rel_type in app_module.SOCIAL_REL_TYPES
+            and self.label(a) == "Person" and self.label(b) == "Person"
+        ))
+        add(app_module.PATH_INDEX_EMPLOYMENT_QUERY, lambda p: self.employment(app_module.EMPLOYMENT_REL_TYPES))
+
+    def label(self, node_id):
+        node = self.nodes.get(node_id)
+        return node[0] if node else None
+
+    def answer(self, text, params):
+        handler = self.handlers.get(" ".join(text.split()))
+        if handler is None:
+            self.unsupported[" ".join(text.split())[:80]] += 1
+            return []
+        return handler(params)
+
+    def entity_rows(self, label, fields):
+        for node_id, (node_label, name, title) in self.nodes.items():
+            if node_label == label:
+                yield dict(zip(fields, (node_id, name, title)))
+
+    def export_rels(self, spec):
+        from_field, from_label, to_field, to_label = spec
+        for a, b, rel_type, notes in self.rels:
+            if self.label(a) == from_label and self.label(b) == to_label:
+                yield {from_field: a, to_field: b, "type": rel_type, "notes": notes}
+
+    def employment(self, rel_types):
+        for a, b, rel_type, notes in self.rels:
+            if rel_type not in rel_types:
+                continue
+            if self.label(a) == "Person" and self.label(b) not in (None, "Person"):
+                yield {"person_id": a, "org_id": b, "type": rel_type, "notes": notes}
+            elif self.label(b) == "Person" and self.label(a) not in (None, "Person"):
+                yield {"person_id": b, "org_id": a, "type": rel_type, "notes": notes}
+
+    def full_graph_page(self, params):
+        after, limit = params.get("after"), params["limit"]
+        start = bisect_right(self.sorted_ids, after) if after is not None else 0
+        for node_id in self.sorted_ids[start:start + limit]:
+            label, name, title = self.nodes[node_id]
+            yield {"id": node_id, "name": name, "title": title, "labels": [label],
+                   "out": [{"to_id": b, "label": rel_type, "title": notes} for _, b, rel_type, notes in self.out[node_id]]}
+
+# --- Routes ---
+# (name, method, path, form data); "{person}", "{company}" and "{government}" are filled
+# from a seeded sample of the generated ids. Routes marked neo4j_only run statements the
+# stand-in does not answer, so they are skipped on that backend.
+
+ROUTES = [
+    {"name": "index", "method": "GET", "path": "/"},
+    {"name": "query_former_employees", "method": "POST", "path": "/query", "neo4j_only": True,
+     "data": {"query_id": "former_employees", "company_identifier": "{company}"}},
+    {"name": "query_people_who_know", "method": "POST", "path": "/query", "neo4j_only": True,
+     "data": {"query_id": "people_who_know", "person_identifier": "{person}"}},
+    {"name": "full_graph", "method": "GET", "path": "/full-graph"},
+    {"name": "full_graph_ndjson", "method": "GET", "path": "/full-graph?format=ndjson"},
+    {"name": "full_graph_page", "method": "GET", "path": "/full-graph?limit=1000"},
+    {"name": "network_gov_company", "method": "POST", "path": "/network-analysis",
+     "data": {"analysis_type": "gov_company", "government_id": "{government}", "company_id": "{company}"}},
+    {"name": "network_company_company", "method": "POST", "path": "/network-analysis",
+     "data": {"analysis_type": "company_company", "company1_id": "{company}", "company2_id": "{company2}"}},
+    {"name": "network_person_person", "method": "POST", "path": "/network-analysis",
+     "data": {"analysis_type": "person_person", "person1_name": "x [{person}]", "person2_name": "y [{person2}]"}},
+    {"name": "export_json", "method": "GET", "path": "/export-json?compress=none"},
+    {"name": "export_json_gzip", "method": "GET", "path": "/export-json?compress=gzip"},
+    {"name": "export_ndjson", "method": "GET", "path": "/export-json?format=ndjson&compress=none"},
+    {"name": "api_search", "method": "GET", "path": "/api/search?q={prefix}"},
+    {"name": "api_node_ids", "method": "GET", "path": "/api/node-ids"},
+    {"name": "api_subgraph", "method": "GET", "path": "/api/subgraph?id={person}", "neo4j_only": True},
+]
+
+def sample_ids(rows, seed, count=50):
+    rng = random.Random(seed + 1)
+    ids = defaultdict(list)
+    for row in rows:
+        if row["kind"] == "node":
+            ids[row["type"]].append(row["id"])
+    return {label: rng.sample(values, min(count, len(values))) for label, values in ids.items()}
+
+def fill(template, samples, i):
+    people, companies, governments = samples["Person"], samples["Company"], samples["Government Body"]
+    values = {
+        "person": people[i % len(people)],
+        "person2": people[(i * 7 + 3) % len(people)],
+        "company": companies[i % len(companies)],
+        "company2": companies[(i * 7 + 3) % len(companies)],
+        "government": governments[i % len(governments)],
+        "prefix": f"Person {i % 10}",
+    }
+    if isinstance(template, dict):
+        return {key: value.format(**values) for key, value in template.items()}
+    return template.format(**values)
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (k - lower)
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def query_rows_total(app_module):
+    with app_module.metrics.lock:
+        return sum(app_module.metrics.query_rows.values())
+
+def bench_route(app_module, client, route, samples, iterations, warmup):
+    latencies, sizes, statuses = [], 0, Counter()
+    cold_ms = None
+    rows_before = query_rows_total(app_module)
+    started = time.perf_counter()
+    for i in range(warmup + iterations):
+        path = fill(route["path"], samples, i)
+        data = fill(route["data"], samples, i) if "data" in route else None
+        t0 = time.perf_counter()
+        response = client.open(path, method=route["method"], data=data)
+        body = response.get_data()
+        response.close()
+        elapsed = (time.perf_counter() - t0) * 1000
+        if i == 0:
+            cold_ms = round(elapsed, 3)
+        if i >= warmup:
+            latencies.append(elapsed)
+            sizes += len(body)
+            statuses[response.status_code] += 1
+    seconds = time.perf_counter() - started
+    rows = query_rows_total(app_module) - rows_before
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "cold_ms": cold_ms,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3),
+        "rows": rows,
+        "rows_per_sec": round(rows / seconds, 1) if seconds else None,
+        "bytes_per_request": sizes // iterations,
+        "statuses": {str(code): count for code, count in statuses.items()},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def load_neo4j(app_module, nodes, seed, reset, batch_size):
+    with app_module.driver.session() as session:
+        existing = session.run("MATCH (n) RETURN count(n) AS nodes").single()["nodes"]
+        if existing and not reset:
+            raise click.ClickException(f"The database already holds {existing} nodes; pass --reset to wipe it first")
+        if existing:
+            session.run("MATCH (n) CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS").consume()
+    app_module.ensure_schema()
+    with tempfile.TemporaryFile() as stream:
+        for row in generate_graph(nodes, seed):
+            stream.write(json.dumps(row).encode() + b"\n")
+        stream.seek(0)
+        return app_module.bulk_import(stream, "ndjson", batch_size=batch_size)
+
+@click.group()
+def cli():
+    pass
+
+@cli.command("generate")
+@click.option("--scale", default=1000, show_default=True, help="Total number of nodes")
+@click.option("--seed", default=42, show_default=True)
+@click.option("--output", type=click.Path(dir_okay=False), required=True, help="NDJSON file for /api/import")
+def generate_command(scale, seed, output):
+    count = 0
+    with open(output, "w") as f:
+        for row in generate_graph(scale, seed):
+            f.write(json.dumps(row) + "\n")
+            count += 1
+    click.echo(f"Wrote {count} rows to {output}")
+
+@cli.command("run")
+@click.option("--scale", default=1000, show_default=True, help="Total number of nodes (1k to 1M)")
+@click.option("--seed", default=42, show_default=True)
+@click.option("--backend", type=click.Choice(["standin", "neo4j"]), default="standin", show_default=True)
+@click.option("--reset", is_flag=True, help="Wipe a non-empty Neo4j database before loading")
+@click.option("--skip-load", is_flag=True, help="Benchmark the data already in Neo4j (generated with the same scale and seed)")
+@click.option("--iterations", default=20, show_default=True)
+@click.option("--warmup", default=2, show_default=True)
+@click.option("--routes", default="", help="Comma-separated route names (default: all)")
+@click.option("--batch-size", default=5000, show_default=True)
+@click.option("--output", type=click.Path(dir_okay=False), default="benchmark-results.json", show_default=True)
+def run_command(scale, seed, backend, reset, skip_load, iterations, warmup, routes, batch_size, output):
+    os.environ["METRICS"] = "1"
+    if backend == "standin":
+        # Live shortestPath Cypher has no stand-in, so paths come from the in-process engine
+        os.environ.setdefault("PATH_ENGINE", "1")
+        os.environ["SCHEMA_BOOTSTRAP"] = "0"
+    import app as app_module
+
+    load = None
+    load_started = time.perf_counter()
+    if backend == "standin":
+        graph = StandInGraph(generate_graph(scale, seed), app_module)
+        app_module.driver = app_module.InstrumentedDriver(StandInDriver(graph))
+    elif not skip_load:
+        try:
+            load = load_neo4j(app_module, scale, seed, reset, batch_size)
+        except app_module.ImportFailed as e:
+            raise click.ClickException(f"Load failed: {e} ({json.dumps(e.stats)})")
+    load_seconds = round(time.perf_counter() - load_started, 3)
+    samples = sample_ids(generate_graph(scale, seed), seed)
+
+    selected = [name for name in routes.split(",") if name]
+    client = app_module.app.test_client()
+    results = {}
+    for route in ROUTES:
+        if selected and route["name"] not in selected:
+            continue
+        if backend == "standin" and route.get("neo4j_only"):
+            continue
+        click.echo(f"{route['name']}...", nl=False)
+        results[route["name"]] = bench_route(app_module, client, route, samples, iterations, warmup)
+        click.echo(f" p50 {results[route['name']]['p50_ms']} ms, p95 {results[route['name']]['p95_ms']} ms")
+
+    people, companies, governments = graph_sizes(scale)
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": backend,
+            "scale": scale,
+            "seed": seed,
+            "people": people,
+            "companies": companies,
+            "governments": governments,
+            "iterations": iterations,
+            "warmup": warmup,
+            "load_seconds": load_seconds,
+            "load": load,
+            "env": {key: os.environ[key] for key in ("PATH_ENGINE", "ORG_CONNECTIVITY") if key in os.environ},
+        },
+        "routes": results,
+    }
+    if backend == "standin":
+        report["meta"]["unsupported_queries"] = dict(graph.unsupported)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    click.echo(f"Results written to {output}")
+
+@cli.command("compare")
+@click.argument("baseline", type=click.Path(exists=True, dir_okay=False))
+@click.argument("candidate", type=click.Path(exists=True, dir_okay=False))
+@click.option("--threshold", default=10.0, show_default=True, help="p95 increase (%) reported as a regression")
+def compare_command(baseline, candidate, threshold):
+    with open(baseline) as f:
+        old = json.load(f)
+    with open(candidate) as f:
+        new = json.load(f)
+    for key in ("backend", "scale", "seed"):
+        if old["meta"].get(key) != new["meta"].get(key):
+            click.echo(f"warning: {key} differs ({old['meta'].get(key)} vs {new['meta'].get(key)})")
+
+    def change(a, b):
+        return f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+
+    regressions = []
+    click.echo(f"{'route':28} {'p50 ms':>20} {'p95 ms':>20} {'p99 ms':>20} {'rows/sec':>22}")
+    for name, before in old["routes"].items():
+        after = new["routes"].get(name)
+        if after is None:
+            continue
+        cells = [f"{before[k]:.1f}->{after[k]:.1f} {change(before[k], after[k]):>7}" for k in ("p50_ms", "p95_ms", "p99_ms")]
+        rate = f"{before['rows_per_sec'] or 0:.0f}->{after['rows_per_sec'] or 0:.0f}"
+        click.echo(f"{name:28} {cells[0]:>20} {cells[1]:>20} {cells[2]:>20} {rate:>22}")
+        if before["p95_ms"] and (after["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 > threshold:
+            regressions.append(name)
+    if regressions:
+        click.echo(f"p95 regressions over {threshold}%: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    cli()
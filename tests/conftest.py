@@ -0,0 +1,11 @@
+import os
+import sys
+
+# app.py reads its configuration at import time: no schema bootstrap against a server,
+# an in-memory change log, and no background layout, analytics or full-graph cache
+os.environ.setdefault("SCHEMA_BOOTSTRAP", "0")
+os.environ.setdefault("CHANGE_LOG_PATH", "")
+os.environ.setdefault("LAYOUT", "0")
+os.environ.setdefault("ANALYTICS", "0")
+os.environ.setdefault("FULL_GRAPH_CACHE", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,28 @@
+import pytest
+from neo4j.exceptions import ConstraintError
+
+import app
+
+FORM = {"node_type": "Person", "id": "p1", "name": "Ada"}
+
+@pytest.fixture
+def changes(monkeypatch):
+    # Every write hits the id uniqueness constraint
+    def write_query(query, **params):
+        raise ConstraintError("Node already exists with label `Person` and property `id` = 'p1'")
+    changes = []
+    monkeypatch.setattr(app, "write_query", write_query)
+    monkeypatch.setattr(app, "graph_changed", lambda op, **change: changes.append(op))
+    return changes
+
+def test_api_add_node_duplicate_id(changes):
+    response = app.app.test_client().post("/api/add-node", data=FORM)
+    assert response.status_code == 409
+    assert response.get_json()["success"] is False
+    assert not changes
+
+def test_add_form_duplicate_id(changes):
+    response = app.app.test_client().post("/add", data=dict(FORM, action="node"))
+    assert response.status_code == 200
+    assert b"already exists" in response.data
+    assert not changes
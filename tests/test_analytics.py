@@ -0,0 +1,57 @@
+import pytest
+
+import app
+
+# numpy is optional for the app, and the analytics are off without it
+np = pytest.importorskip("numpy")
+
+def adjacency(n, edges):
+    src = np.array([a for a, _ in edges], dtype=np.int64)
+    dst = np.array([b for _, b in edges], dtype=np.int64)
+    low, high = app.undirected_pairs(n, src, dst)
+    return src, dst, low, high, app.csr_adjacency(n, low, high)
+
+def test_pagerank_on_a_cycle_and_a_sink():
+    rank = app.pagerank(3, np.array([0, 1, 2]), np.array([1, 2, 0]))
+    assert rank == pytest.approx([1 / 3] * 3)
+    # 2 has no out-edges; its rank is spread evenly, so the total stays 1
+    rank = app.pagerank(3, np.array([0, 1]), np.array([2, 2]))
+    assert rank.sum() == pytest.approx(1)
+    assert rank[2] > rank[0] == pytest.approx(rank[1])
+
+def test_betweenness_on_a_path_and_a_star():
+    *_, (offsets, targets) = adjacency(5, [(0, 1), (1, 2), (2, 3), (3, 4)])
+    values, sources = app.betweenness(offsets, targets, samples=256)
+    assert sources == 5
+    assert values == pytest.approx([0, 0.5, 2 / 3, 0.5, 0])
+    *_, (offsets, targets) = adjacency(4, [(0, 1), (0, 2), (3, 0)])
+    values, _ = app.betweenness(offsets, targets, samples=256)
+    assert values == pytest.approx([1, 0, 0, 0])
+
+def test_betweenness_counts_parallel_shortest_paths():
+    # A square: 0 and 2 are joined through 1 and through 3, each carrying half
+    *_, (offsets, targets) = adjacency(4, [(0, 1), (1, 2), (2, 3), (3, 0)])
+    values, _ = app.betweenness(offsets, targets, samples=256)
+    assert values == pytest.approx([1 / 6] * 4)
+
+def test_label_propagation_separates_components():
+    *_, low, high, _ = adjacency(7, [(0, 1), (1, 2), (2, 0), (3, 4), (4, 5), (5, 3), (5, 6)])
+    community = app.label_propagation(7, low, high)
+    assert len(set(community[:3])) == 1 and len(set(community[3:])) == 1
+    assert community[0] != community[3]
+    # Numbered by size: the four-node component is community 0
+    assert community[3] == 0
+
+def test_graph_metrics_degrees_and_brokers():
+    ids = ["c1", "g1", "p1", "p2"]
+    labels = ["Company", "Government Body", "Person", "Person"]
+    names = ["Acme", "Ministry", "Ann", "Bob"]
+    src = np.array([2, 2, 3], dtype=np.int64)
+    dst = np.array([0, 1, 2], dtype=np.int64)
+    nodes, ranked, brokers, summary = app.graph_metrics(ids, labels, names, src, dst,
+                                                        ["employed", "formerly_employed", "knows"])
+    assert nodes["p1"]["degree"] == 3 and nodes["p1"]["out_degree"] == 2 and nodes["p1"]["in_degree"] == 1
+    assert nodes["p1"]["companies"] == 1 and nodes["p1"]["government_bodies"] == 1
+    assert brokers == ["p1"]
+    assert ranked["degree"][0] == "p1" and ranked["betweenness"][0] == "p1"
+    assert summary["nodes"] == 4 and summary["edges"] == 3 and summary["betweenness_exact"]
@@ -0,0 +1,56 @@
+import pytest
+
+import app
+
+def node_change(node_id):
+    return {"op": "node_added", "id": node_id, "type": "Person", "name": node_id.upper(), "title": None}
+
+@pytest.fixture(params=["memory", "sqlite"])
+def change_log(request, tmp_path, monkeypatch):
+    # A log keeping the last 3 changes, served by /api/changes
+    if request.param == "memory":
+        log = app.ChangeLog(3)
+    else:
+        log = app.SharedChangeLog(str(tmp_path / "changes.sqlite"), 3)
+    monkeypatch.setattr(app, "change_log", log)
+    return log
+
+def changes(**args):
+    response = app.app.test_client().get("/api/changes", query_string=args)
+    assert response.status_code == 200
+    return response.get_json()
+
+def test_start_position(change_log):
+    change_log.on_change(node_change("a"))
+    data = changes()
+    assert data["log"] == change_log.log_id
+    assert data["version"] == 1 and data["changes"] == [] and not data["reset"]
+
+def test_changes_since_in_order_with_paging(change_log):
+    change_log.on_change(node_change("a"))
+    change_log.on_change({"op": "rel_added", "from_id": "a", "to_id": "b", "rel_type": "knows", "notes": "n"})
+    data = changes(since=0, log=change_log.log_id)
+    assert [entry["version"] for entry in data["changes"]] == [1, 2]
+    assert data["changes"][0]["node"]["id"] == "a"
+    assert data["changes"][1]["edge"]["id"] == "a|knows|b"
+    assert data["version"] == 2 and not data["more"] and not data["reset"]
+    data = changes(since=0, limit=1)
+    assert [entry["version"] for entry in data["changes"]] == [1]
+    assert data["version"] == 1 and data["more"]
+    data = changes(since=2)
+    assert data["changes"] == [] and data["version"] == 2 and not data["reset"]
+
+def test_reset_once_changes_are_trimmed(change_log):
+    for node_id in "abcde":
+        change_log.on_change(node_change(node_id))
+    # Versions 3 to 5 are kept: a client at 2 can catch up, one at 1 cannot
+    data = changes(since=2)
+    assert [entry["id"] for entry in data["changes"]] == ["c", "d", "e"] and not data["reset"]
+    data = changes(since=1)
+    assert data["reset"] and data["changes"] == [] and data["version"] == 5
+
+def test_reset_for_another_log_or_a_future_version(change_log):
+    change_log.on_change(node_change("a"))
+    assert changes(since=1, log="other")["reset"]
+    assert changes(since=7)["reset"]
+    assert not changes(since=1, log=change_log.log_id)["reset"]
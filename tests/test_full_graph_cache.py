@@ -0,0 +1,75 @@
+import pytest
+
+import app
+
+KEY = ("json", None, None)
+
+@pytest.fixture
+def cache(monkeypatch):
+    # A cache rebuilt by calling refresh() directly, with its state and bodies under test control
+    cache = app.FullGraphCache(budget=10000, ttl=300)
+    cache.current = ("log", 1, None)
+    cache.body = '{"nodes": []}'
+    monkeypatch.setattr(cache, "start", lambda: None)
+    monkeypatch.setattr(cache, "state", lambda: cache.current)
+    monkeypatch.setattr(app, "full_graph_chunks", lambda fmt, after, limit: [cache.body])
+    return cache
+
+def test_first_request_misses_then_hits(cache):
+    assert cache.get(KEY) is None
+    assert cache.pending == {KEY}
+    cache.refresh()
+    entry = cache.get(KEY)
+    assert entry["bodies"][None] == b'{"nodes": []}'
+    assert "gzip" in entry["bodies"]
+    assert cache.results == {"hit": 1, "stale": 0, "miss": 1}
+    assert not cache.pending
+
+def test_change_serves_stale_body_until_rebuilt(cache):
+    cache.get(KEY)
+    cache.refresh()
+    old = cache.get(KEY)
+    cache.current = ("log", 2, None)
+    cache.body = '{"nodes": [1]}'
+    assert cache.get(KEY) is old
+    assert cache.results["stale"] == 1 and cache.pending == {KEY}
+    cache.refresh()
+    entry = cache.get(KEY)
+    assert entry["bodies"][None] == b'{"nodes": [1]}' and entry["digest"] != old["digest"]
+
+def test_expired_body_is_rebuilt(cache):
+    cache.get(KEY)
+    cache.refresh()
+    cache.entries[KEY]["built"] -= cache.ttl + 1
+    assert cache.get(KEY) is not None
+    assert cache.results["stale"] == 1 and cache.pending == {KEY}
+
+def test_unrequested_and_paged_variants_are_not_built(cache):
+    assert cache.get(("json", "p1", 50)) is None
+    cache.current = ("log", 2, None)
+    cache.refresh()
+    assert not cache.pending and not cache.entries
+
+def test_body_over_budget_is_not_kept(cache):
+    cache.budget = 10
+    cache.get(KEY)
+    cache.refresh()
+    assert cache.get(KEY) is None and cache.size == 0
+    # Not retried until the graph changes
+    assert not cache.pending
+    cache.current = ("log", 2, None)
+    cache.get(KEY)
+    assert cache.pending == {KEY}
+
+def test_conditional_get(cache, monkeypatch):
+    monkeypatch.setattr(app, "full_graph_cache", cache)
+    monkeypatch.setattr(app, "FULL_GRAPH_CACHE_ENABLED", True)
+    cache.get(KEY)
+    cache.refresh()
+    with app.app.test_request_context("/full-graph", headers={"Accept-Encoding": "gzip"}):
+        body, status, headers = app.cached_full_graph("json", None, None, app.request)
+    assert status == 200 and headers["Content-Encoding"] == "gzip"
+    with app.app.test_request_context("/full-graph", headers={"Accept-Encoding": "gzip",
+                                                              "If-None-Match": headers["ETag"]}):
+        _, status, _ = app.cached_full_graph("json", None, None, app.request)
+    assert status == 304
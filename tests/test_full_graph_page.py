@@ -0,0 +1,50 @@
+import json
+import re
+
+import app
+
+class Session:
+    # Answers the keyset page queries from a sorted id list, recording each statement
+    def __init__(self, ids, runs):
+        self.ids = ids
+        self.runs = runs
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, cypher, after=None, limit=None, **params):
+        self.runs.append((cypher, after))
+        ids = [node_id for node_id in self.ids if after is None or node_id > after][:limit]
+        return [{"id": node_id, "name": node_id, "title": None, "labels": ["Company"], "out": []} for node_id in ids]
+
+def test_pages_seek_each_label(monkeypatch):
+    runs = []
+    monkeypatch.setattr(app, "read_session", lambda: Session(["c1", "c2", "c3"], runs))
+    monkeypatch.setattr(app, "current_snapshot", lambda: None)
+    client = app.app.test_client()
+    first = json.loads(client.get("/full-graph?limit=2").data)
+    rest = json.loads(client.get(f"/full-graph?limit=2&after={first['next']}").data)
+    assert [node["id"] for node in first["nodes"] + rest["nodes"]] == ["c1", "c2", "c3"]
+    assert [cypher for cypher, _ in runs] == [app.FULL_GRAPH_FIRST_PAGE_QUERY, app.FULL_GRAPH_PAGE_QUERY]
+    for cypher, _ in runs:
+        assert not re.search(r"(?<!OPTIONAL )MATCH \(n\)", cypher)
+        assert all(f"MATCH (n:`{label}`)" in cypher for label in app.ENTITY_LABELS)
+
+def test_query_plans_cover_page_queries(monkeypatch):
+    class Explained:
+        def __init__(self, cypher):
+            self.plan = {"operatorType": "ProduceResults", "children": [{"operatorType": "NodeIndexSeekByRange"}]}
+
+        def consume(self):
+            return self
+
+    class PlanSession(Session):
+        def run(self, cypher, **params):
+            return Explained(cypher)
+
+    monkeypatch.setattr(app, "read_session", lambda: PlanSession([], []))
+    report = app.app.test_client().get("/api/query-plans").get_json()
+    assert report["full_graph_first_page"]["ok"] and report["full_graph_page"]["ok"]
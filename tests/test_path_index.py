@@ -0,0 +1,96 @@
+import app
+from app import PathIndex
+
+PEOPLE = [{"id": person_id, "name": person_id.upper(), "title": None} for person_id in "abcde"]
+ORGS = [
+    {"id": "o1", "name": "Org 1", "title": None, "labels": ["Company"]},
+    {"id": "o2", "name": "Org 2", "title": None, "labels": ["Government Body"]},
+]
+# a - b - c - e, with a second two-hop route a - d - c
+SOCIAL = [
+    {"from_id": "a", "to_id": "b", "type": "knows", "notes": None},
+    {"from_id": "b", "to_id": "c", "type": "works_with", "notes": "w"},
+    {"from_id": "a", "to_id": "d", "type": "knows", "notes": None},
+    {"from_id": "d", "to_id": "c", "type": "knows", "notes": None},
+    {"from_id": "c", "to_id": "e", "type": "knows", "notes": None},
+]
+EMPLOYMENT = [
+    {"person_id": "a", "org_id": "o1", "type": "employed", "notes": None},
+    {"person_id": "e", "org_id": "o2", "type": "formerly_employed", "notes": None},
+]
+
+class Session:
+    # Answers the path index queries from fixed rows; `during` runs once the people are read
+    def __init__(self, during=None):
+        self.during = during
+
+    def run(self, query):
+        if query == app.PATH_INDEX_PEOPLE_QUERY:
+            return iter(PEOPLE)
+        if query == app.PATH_INDEX_ORGS_QUERY:
+            return iter(ORGS)
+        if query == app.PATH_INDEX_SOCIAL_QUERY:
+            if self.during:
+                self.during()
+            return iter(SOCIAL)
+        if query == app.PATH_INDEX_EMPLOYMENT_QUERY:
+            return iter(EMPLOYMENT)
+        raise AssertionError(query)
+
+def built_index():
+    index = PathIndex()
+    index.build(Session())
+    return index
+
+def ids(index, nodes):
+    return [index.person_ids[i] for i in nodes]
+
+def test_connect_returns_one_shortest_path_per_pair():
+    index = built_index()
+    paths = index.connect([index.index["a"]], [index.index["c"]])
+    assert len(paths) == 1
+    nodes, edges = paths[0]
+    assert ids(index, nodes)[0] == "a" and ids(index, nodes)[-1] == "c"
+    assert len(nodes) == 3 and len(edges) == 2
+
+def test_connect_same_person_and_hop_limit():
+    index = built_index()
+    a, e = index.index["a"], index.index["e"]
+    assert index.connect([a], [a]) == [([a], [])]
+    assert len(index.connect([a], [e])[0][1]) == 3
+    assert index.connect([a], [e], max_hops=2) == []
+
+def test_connect_multi_source_keeps_each_pair():
+    index = built_index()
+    paths = index.connect([index.index["b"], index.index["d"]], [index.index["e"]])
+    assert sorted(ids(index, nodes)[0] for nodes, _ in paths) == ["b", "d"]
+    assert all(len(edges) == 2 for _, edges in paths)
+
+def test_overlay_changes():
+    index = built_index()
+    a, c, e = index.index["a"], index.index["c"], index.index["e"]
+    index.apply_change({"op": "node_deleted", "id": "b"})
+    index.apply_change({"op": "node_deleted", "id": "d"})
+    assert index.connect([a], [c]) == []
+    index.apply_change({"op": "rel_added", "from_id": "a", "to_id": "e", "rel_type": "knows", "notes": None})
+    nodes, edges = index.connect([a], [e])[0]
+    assert ids(index, nodes) == ["a", "e"] and len(edges) == 1
+    index.apply_change({"op": "rel_deleted", "from_id": "a", "to_id": "e", "rel_type": "knows"})
+    assert index.connect([a], [e]) == []
+
+def test_org_rows_wrap_the_employee_path():
+    index = built_index()
+    rows = index.org_rows("o1", "o2")
+    assert len(rows) == 1
+    labels = [node["id"] for node in rows[0]["Path_Nodes"]]
+    assert labels[0] == "o1" and labels[-1] == "o2"
+    assert len(rows[0]["Path_Edges"]) == len(labels) - 1
+    assert index.org_rows("o1", "missing") == []
+
+def test_changes_during_a_rebuild_are_replayed():
+    index = built_index()
+    change = {"op": "rel_added", "from_id": "a", "to_id": "e", "rel_type": "knows", "notes": None}
+    index.build(Session(during=lambda: index.apply_change(change)))
+    assert index.building is None
+    nodes, _ = index.connect([index.index["a"]], [index.index["e"]])[0]
+    assert ids(index, nodes) == ["a", "e"]
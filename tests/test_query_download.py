@@ -0,0 +1,35 @@
+import app
+
+class Result(list):
+    def __init__(self, columns, rows):
+        super().__init__(rows)
+        self.columns = columns
+
+    def keys(self):
+        return self.columns
+
+class Session:
+    def __init__(self, result):
+        self.result = result
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, cypher, params):
+        return self.result
+
+def download(monkeypatch, rows):
+    monkeypatch.setattr(app, "read_session", lambda: Session(Result(["name", "title"], rows)))
+    return app.app.test_client().get("/query/download?query_id=former_employees&company_identifier=c1")
+
+def test_csv_without_rows_keeps_header(monkeypatch):
+    response = download(monkeypatch, [])
+    assert response.status_code == 200
+    assert response.data == b"name,title\r\n"
+
+def test_csv_rows_follow_header(monkeypatch):
+    response = download(monkeypatch, [{"name": "Ada", "title": "CEO"}])
+    assert response.data == b"name,title\r\nAda,CEO\r\n"